@@ -1,10 +1,10 @@
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, request, jsonify, send_from_directory, send_file, Response
 from flask_cors import CORS
 from flask_sock import Sock
 import requests
 import os
-import tempfile
 import base64
+import binascii
 import json
 from twilio.twiml.voice_response import VoiceResponse
 from twilio.rest import Client
@@ -19,8 +19,24 @@ import io
 import threading
 import queue
 import wave
-import struct
 import time
+import re
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from vad import crear_motor_vad
+from mulaw import mulaw_a_pcm
+from transcoder import mp3_a_mulaw, mp3_a_mulaw_stream, frames_mulaw
+from outbound_player import ReproductorSaliente, BYTES_POR_MENSAJE
+from phrase_library import BibliotecaFrases
+from partial_asr import TranscriptorIncremental
+from endpointing import Endpointer
+from utterance_buffer import BufferVoz, frames_a_entregar
+from turn_scheduler import PlanificadorTurnos, Turno
+from serving import modo_servidor, ejecutar_cpu
+from campaign import MarcadorCampanas, MedidorHolgura
+from call_registry import RegistroLlamadas
+from metrics import TrazaTurno, cronometrar_frases, etapas_turno, peticiones_servicio
+import metrics
+import http_clients
 
 load_dotenv()
 
@@ -48,75 +64,158 @@ print = functools.partial(print, flush=True)
 # ============================================
 SAMPLE_RATE = 8000  # Twilio usa 8kHz
 CHUNK_SIZE = 160  # 20ms de audio a 8kHz
-SILENCE_THRESHOLD = 700  # Umbral de silencio
-SILENCE_DURATION = 1.8  # Segundos de silencio para considerar que terminó de hablar
+SILENCE_THRESHOLD = 700  # Umbral de silencio inicial (luego se calibra con el ruido de la línea)
+SILENCE_DURATION = 1.8  # Segundos de silencio para considerar que terminó de hablar (respuestas normales)
+VAD_BACKEND = os.getenv('VAD_BACKEND', 'energia')  # 'energia' (más barato) o 'hibrido' (más preciso)
+TTS_FORMATO = 'mulaw'  # Gemini TTS devuelve mulaw 8kHz crudo, sin transcodificar
+LLM_STREAMING = os.getenv('LLM_STREAMING', '1') == '1'  # Enviar cada frase del LLM apenas se genera
+TTS_TIMEOUT = 10  # Segundos máximos por chunk de TTS
+TTS_PREFETCH = int(os.getenv('TTS_PREFETCH', '3'))  # Chunks sintetizados por delante del que se envía
+TTS_WORKERS = int(os.getenv('TTS_WORKERS', '16'))  # Peticiones TTS simultáneas en todo el proceso
+
+FRAMES_BARGE_IN = 10  # 200ms de voz seguida mientras el bot habla = interrupción
+ASR_INCREMENTAL = os.getenv('ASR_INCREMENTAL', '1') == '1'  # Transcribir por segmentos mientras el usuario habla
+ASR_WORKERS = int(os.getenv('ASR_WORKERS', '8'))  # Segmentos de ASR en segundo plano en todo el proceso
+TURN_WORKERS = int(os.getenv('TURN_WORKERS', '32'))  # Turnos (ASR + LLM + envío) procesándose a la vez
+TURN_MAX_EN_COLA = int(os.getenv('TURN_MAX_EN_COLA', '64'))  # Turnos esperando trabajador antes de rechazar
+MAX_POR_PAGINA = 1000  # Empleados por página como máximo en /listar-empleados
+
+tts_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix='tts')
+asr_executor = ThreadPoolExecutor(max_workers=ASR_WORKERS, thread_name_prefix='asr')
+planificador_turnos = PlanificadorTurnos(max_trabajadores=TURN_WORKERS, max_en_cola=TURN_MAX_EN_COLA)
+
+# Campañas: solo se marca si Whisper, Ollama y TTS tienen margen y los turnos no hacen cola
+medidor_holgura = MedidorHolgura(http_clients.obtener_stats, planificador_turnos.obtener_stats)
+marcador_campanas = MarcadorCampanas(call_manager, medidor_holgura.hay_holgura)
+
+
+def liberar_llamada(call_sid):
+    """Borra el estado de una llamada terminada: conversación y turno pendiente"""
+    conversation_manager.finalizar_conversacion(call_sid)
+    planificador_turnos.cerrar_llamada(call_sid)
+
+
+# Ciclo de vida: status callbacks de Twilio + cierre del websocket + TTL
+registro_llamadas = RegistroLlamadas(
+    liberar_llamada,
+    medir_memoria=conversation_manager.memoria_retenida,
+    al_barrer=conversation_manager.almacen.purgar,
+    estado_compartido=conversation_manager.almacen.nombre != "memoria"
+)
+
+
+# ============================================
+# MEDIDORES PARA /metrics
+# ============================================
+def _seleccionar(obtener_stats, claves):
+    """Medidor con etiqueta a partir de algunas claves de un obtener_stats()"""
+    def medir():
+        stats = obtener_stats()
+        return {clave: stats[clave] for clave in claves}
+    return medir
+
+
+metrics.registro.medidor("llamadas", "Llamadas vivas en el proceso y cuántas tienen el stream abierto",
+                         _seleccionar(registro_llamadas.obtener_stats, ("llamadas_vivas", "con_socket")),
+                         etiqueta="estado")
+metrics.registro.medidor("turnos", "Turnos en curso y esperando trabajador",
+                         _seleccionar(planificador_turnos.obtener_stats, ("en_curso", "en_cola")),
+                         etiqueta="estado")
+metrics.registro.medidor("servicio_en_curso", "Peticiones en curso por servicio",
+                         lambda: {nombre: s["en_curso"] for nombre, s in http_clients.obtener_stats().items()},
+                         etiqueta="servicio")
+metrics.registro.medidor("servicio_errores_total", "Peticiones fallidas por servicio",
+                         lambda: {nombre: s["errores"] for nombre, s in http_clients.obtener_stats().items()},
+                         etiqueta="servicio", tipo="counter")
+metrics.registro.medidor("servicio_saturado_total", "Peticiones rechazadas por falta de cupo",
+                         lambda: {nombre: s["saturado"] for nombre, s in http_clients.obtener_stats().items()},
+                         etiqueta="servicio", tipo="counter")
+metrics.registro.medidor("faq_aciertos_total", "Preguntas contestadas por el índice de FAQ sin LLM",
+                         lambda: conversation_manager.indice_faq.obtener_stats()["aciertos"], tipo="counter")
 
 
 class AudioBuffer:
-    """Buffer de audio con detección de actividad de voz (VAD)"""
-    def __init__(self):
-        self.buffer = []
+    """
+    Buffer de audio con detección de actividad de voz (VAD) y fin de turno adaptativo.
+    Guarda los frames mulaw tal como llegan en un BufferVoz (pre-roll corto y
+    tope de duración): la conversión a PCM se hace una sola vez, al entregar
+    el audio al ASR, y sin el silencio final que hizo cortar el turno.
+    """
+    def __init__(self, motor_vad=None, obtener_etapa=None):
+        self.vad = motor_vad or crear_motor_vad(VAD_BACKEND, umbral=SILENCE_THRESHOLD)
+        self.endpointer = Endpointer(self.vad, obtener_etapa, silencio_base=SILENCE_DURATION)
+        self.buffer = BufferVoz()
         self.silent_chunks = 0
         self.is_speaking = False
+        self.frames_voz_seguidos = 0  # Frames con voz consecutivos (para barge-in)
         
     def add_chunk(self, audio_bytes):
-        """Agrega un chunk de audio y detecta actividad"""
-        self.buffer.append(audio_bytes)
-        
-        # Detectar si hay voz (VAD simple)
-        rms = self._calculate_rms(audio_bytes)
+        """Agrega un chunk de audio mulaw y detecta actividad"""
+        voz_cruda, voz = self.vad.procesar_mulaw(audio_bytes)
+        self.frames_voz_seguidos = self.frames_voz_seguidos + 1 if voz_cruda else 0
         
-        if rms > SILENCE_THRESHOLD:
+        if voz_cruda:
+            if not self.is_speaking:
+                # Inicio de voz: recuperar el audio previo (pre-roll)
+                self.buffer.iniciar_voz()
             self.is_speaking = True
             self.silent_chunks = 0
+        elif self.is_speaking:
+            self.silent_chunks += 1
+        
+        if self.is_speaking:
+            self.buffer.agregar(audio_bytes)
         else:
-            if self.is_speaking:
-                self.silent_chunks += 1
+            # Antes de que empiece a hablar solo guardamos un pre-roll corto
+            self.buffer.agregar_preroll(audio_bytes)
+        
+        self.endpointer.observar(voz_cruda, self.is_speaking)
                 
-        return self.is_speaking
+        return voz
     
     def is_finished_speaking(self):
-        """Detecta si la persona terminó de hablar"""
-        silence_chunks_needed = int((SILENCE_DURATION * SAMPLE_RATE) / CHUNK_SIZE)
-        return self.silent_chunks >= silence_chunks_needed
+        """Detecta si la persona terminó de hablar (silencio adaptativo o tope de duración)"""
+        return self.is_speaking and self.endpointer.turno_terminado(self.silent_chunks, len(self.buffer))
     
     def get_audio(self):
         """Obtiene todo el audio del buffer como WAV"""
         if not self.buffer:
             return None
             
-        # Combinar todos los chunks
-        audio_data = b''.join(self.buffer)
-        
-        # Crear WAV en memoria
-        wav_buffer = io.BytesIO()
-        with wave.open(wav_buffer, 'wb') as wav_file:
-            wav_file.setnchannels(1)
-            wav_file.setsampwidth(2)
-            wav_file.setframerate(SAMPLE_RATE)
-            wav_file.writeframes(audio_data)
-        
-        wav_buffer.seek(0)
-        return wav_buffer.getvalue()
+        # Pasar a PCM de una vez, sin el silencio final
+        fin = frames_a_entregar(len(self.buffer), self.silent_chunks)
+        return pcm_a_wav(mulaw_a_pcm(self.buffer.tramo(0, fin)))
     
     def clear(self):
         """Limpia el buffer"""
-        self.buffer = []
+        self.buffer.limpiar()
         self.silent_chunks = 0
         self.is_speaking = False
+        self.frames_voz_seguidos = 0
+        self.vad.reset()
+
+
+def pcm_a_wav(audio_data):
+    """Envuelve PCM 16-bit mono 8kHz en un WAV en memoria"""
+    wav_buffer = io.BytesIO()
+    with wave.open(wav_buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(audio_data)
     
-    @staticmethod
-    def _calculate_rms(audio_bytes):
-        """Calcula RMS (volumen) del audio"""
-        if len(audio_bytes) < 2:
-            return 0
-        try:
-            samples = struct.unpack(f'{len(audio_bytes)//2}h', audio_bytes)
-            sum_squares = sum(sample**2 for sample in samples)
-            rms = (sum_squares / len(samples)) ** 0.5
-            return rms
-        except:
-            return 0
+    return wav_buffer.getvalue()
+
+
+def transcribir_pcm(audio_pcm):
+    """Transcribe PCM 16-bit 8kHz con Whisper"""
+    return transcribir_audio(pcm_a_wav(audio_pcm))
+
+
+def transcribir_mulaw(audio_mulaw):
+    """Transcribe mulaw 8kHz con Whisper (se convierte a PCM en el hilo del ASR)"""
+    return transcribir_pcm(mulaw_a_pcm(audio_mulaw))
+
         
 def colgar_llamada(call_sid):
     """Finaliza una llamada de Twilio"""
@@ -146,20 +245,20 @@ def serve_static(filename):
 # ENDPOINTS DE LLAMADA
 # ============================================
 
-@app.route("/iniciar-llamada/<int:empleado_id>", methods=["POST"])
+@app.route("/iniciar-llamada/<empleado_id>", methods=["POST"])
 def iniciar_llamada(empleado_id):
-    """Inicia una llamada a un empleado específico"""
+    """Inicia una llamada a un empleado específico (por su ID estable)"""
     try:
-        empleados = call_manager.cargar_empleados()
+        empleado = call_manager.obtener_empleado(empleado_id)
         
-        if empleado_id >= len(empleados):
+        if not empleado:
             return jsonify({"error": "Empleado no encontrado"}), 404
         
-        empleado = empleados[empleado_id]
         call_sid = call_manager.iniciar_llamada(empleado)
         
         if call_sid:
             conversation_manager.iniciar_conversacion(call_sid, empleado)
+            registro_llamadas.registrar(call_sid)
             return jsonify({
                 "success": True,
                 "call_sid": call_sid,
@@ -217,9 +316,102 @@ def call_status():
     
     print(f"📊 Llamada {call_sid}: {call_status} (duración: {duration}s)")
     
+    # Si la llamada es de una campaña, avanza su progreso (reintentos, cupo)
+    referencia = request.args.get('referencia_campana')
+    if referencia:
+        marcador_campanas.actualizar_estado(referencia, call_status)
+    registro_llamadas.estado_twilio(call_sid, call_status)
+    
     return '', 200
 
 
+# ============================================
+# CAMPAÑAS DE LLAMADAS
+# ============================================
+
+def un_solo_worker(vista):
+    """
+    Las campañas (ritmo, cupo, reintentos) viven en la memoria del proceso que
+    las creó, y los status callbacks de Twilio pueden caer en cualquier worker.
+    Con varios workers no se podría seguir el resultado de las llamadas, así
+    que estas rutas se rechazan: el marcador corre con GUNICORN_WORKERS=1.
+    """
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        if int(os.getenv('WORKERS_SERVIDOR', '1')) > 1:
+            return jsonify({"error": "Las campañas requieren un solo worker (GUNICORN_WORKERS=1)"}), 409
+        return vista(*args, **kwargs)
+    return envoltura
+
+
+@app.route("/campanas", methods=["POST"])
+@un_solo_worker
+def crear_campana():
+    """
+    Crea una campaña de llamadas. Body JSON:
+    {"empleados": [ids]} o {"filtro": {"puesto": "...", "fecha_inicio": "..."}},
+    y opcionales nombre, llamadas_por_minuto, max_simultaneas, max_reintentos, espera_reintento
+    """
+    data = request.get_json(silent=True) or {}
+    
+    if data.get("empleados"):
+        empleados = [str(id_empleado) for id_empleado in data["empleados"]]
+    elif data.get("filtro"):
+        empleados = call_manager.empleados.filtrar(**data["filtro"])
+    else:
+        return jsonify({"error": "Indica 'empleados' o 'filtro'"}), 400
+    
+    if not empleados:
+        return jsonify({"error": "Ningún empleado coincide"}), 404
+    
+    opciones = {}
+    try:
+        for clave, tipo in (("nombre", str), ("llamadas_por_minuto", float), ("max_simultaneas", int),
+                            ("max_reintentos", int), ("espera_reintento", float)):
+            if data.get(clave) is not None:
+                opciones[clave] = tipo(data[clave])
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Opción inválida: {e}"}), 400
+    if opciones.get("llamadas_por_minuto", 1) <= 0 or opciones.get("max_simultaneas", 1) <= 0:
+        return jsonify({"error": "llamadas_por_minuto y max_simultaneas deben ser positivos"}), 400
+    
+    campana = marcador_campanas.crear_campana(empleados, **opciones)
+    return jsonify(campana.resumen()), 201
+
+
+@app.route("/campanas", methods=["GET"])
+@un_solo_worker
+def listar_campanas():
+    """Progreso de todas las campañas y holgura medida de los servicios"""
+    return jsonify({
+        "campanas": marcador_campanas.listar(),
+        "marcador": marcador_campanas.obtener_stats(),
+        "holgura": medidor_holgura.obtener_stats()
+    })
+
+
+@app.route("/campanas/<id_campana>", methods=["GET"])
+@un_solo_worker
+def ver_campana(id_campana):
+    """Progreso de una campaña (?detalle=1 incluye el estado de cada empleado)"""
+    campana = marcador_campanas.obtener(id_campana)
+    if not campana:
+        return jsonify({"error": "Campaña no encontrada"}), 404
+    return jsonify(campana.resumen(detalle=request.args.get('detalle') == '1'))
+
+
+@app.route("/campanas/<id_campana>/<accion>", methods=["POST"])
+@un_solo_worker
+def cambiar_campana(id_campana, accion):
+    """Pausa, reanuda o cancela una campaña"""
+    if accion not in ("pausar", "reanudar", "cancelar"):
+        return jsonify({"error": "Acción inválida"}), 400
+    campana = marcador_campanas.cambiar_estado(id_campana, accion)
+    if not campana:
+        return jsonify({"error": "Campaña no encontrada"}), 404
+    return jsonify(campana.resumen())
+
+
 # ============================================
 # WEBSOCKET - STREAMING EN TIEMPO REAL
 # ============================================
@@ -236,8 +428,13 @@ def media(ws):
     
     call_sid = None
     stream_sid = None
-    audio_buffer = AudioBuffer()
+    audio_buffer = AudioBuffer(
+        obtener_etapa=lambda: getattr(conversation_manager.obtener_conversacion(call_sid), "etapa", None)
+    )
     empleado = None
+    reproductor = None
+    turno_actual = None
+    transcriptor = TranscriptorIncremental(transcribir_mulaw, asr_executor) if ASR_INCREMENTAL else None
     
     try:
         while True:
@@ -247,8 +444,15 @@ def media(ws):
                 print("⚫ WebSocket cerrado")
                 break
             
-            data = json.loads(message)
-            event = data.get('event')
+            # Camino rápido: los eventos media (50 por segundo) no pasan por json.loads
+            audio_bytes = payload_media(message)
+            if audio_bytes is None:
+                data = json.loads(message)
+                event = data.get('event')
+                if event == "media":
+                    audio_bytes = base64.b64decode(data['media']['payload'])
+            else:
+                event = "media"
             
             # ============================================
             # EVENTO: START
@@ -266,46 +470,60 @@ def media(ws):
                 # Obtener empleado
                 empleado = call_manager.obtener_empleado_por_telefono(to_number)
                 if not empleado:
-                    empleado = call_manager.cargar_empleados()[0]
+                    empleado = call_manager.empleados.primero()
                 
                 # Iniciar conversación
                 conversation_manager.iniciar_conversacion(call_sid, empleado)
+                registro_llamadas.socket_abierto(call_sid, ws.close)
                 
                 # Mensaje inicial
                 mensaje_inicial = conversation_manager.obtener_mensaje_inicial(empleado)
                 
+                # Reproductor de audio saliente (ritmo de tiempo real + barge-in)
+                reproductor = ReproductorSaliente(ws, stream_sid)
+                turno_actual = Turno()
+                
                 # Enviar mensaje inicial en streaming
-                enviar_respuesta_streaming(ws, stream_sid, call_sid, mensaje_inicial)
+                enviar_respuesta_streaming(reproductor, call_sid, mensaje_inicial, turno_actual)
             
             # ============================================
             # EVENTO: MEDIA (Audio entrante)
             # ============================================
             elif event == "media":
-                payload = data['media']['payload']
+                # Agregar al buffer (mulaw: el VAD mide la energía sin pasar a PCM)
+                audio_buffer.add_chunk(audio_bytes)
                 
-                # Decodificar audio (viene en base64, formato mulaw)
-                audio_bytes = base64.b64decode(payload)
+                # Transcribir en segundo plano los segmentos ya cerrados
+                if transcriptor and audio_buffer.is_speaking:
+                    transcriptor.actualizar(audio_buffer.buffer, audio_buffer.silent_chunks)
                 
-                # Convertir mulaw a PCM
-                audio_pcm = mulaw_to_pcm(audio_bytes)
-                
-                # Agregar al buffer
-                audio_buffer.add_chunk(audio_pcm)
+                # Barge-in: el usuario habla mientras el bot está hablando
+                if (reproductor and audio_buffer.frames_voz_seguidos == FRAMES_BARGE_IN
+                        and reproductor.reproduciendo()):
+                    print("✋ Barge-in: el usuario interrumpió, cortando respuesta")
+                    reproductor.interrumpir()
+                    if turno_actual:
+                        turno_actual.cancelar()
                 
                 # Detectar si terminó de hablar
                 if audio_buffer.is_finished_speaking():
                     print("🎤 Usuario terminó de hablar, procesando...")
                     
-                    # Obtener audio completo
-                    wav_audio = audio_buffer.get_audio()
-                    
-                    if wav_audio:
-                        # Procesar en thread separado para no bloquear
-                        threading.Thread(
-                            target=procesar_audio_usuario,
-                            args=(ws, stream_sid, call_sid, wav_audio, empleado),
-                            daemon=True
-                        ).start()
+                    if audio_buffer.buffer:
+                        # Con ASR incremental solo queda transcribir la cola del turno
+                        if transcriptor:
+                            transcripcion = transcriptor.finalizar(audio_buffer.buffer, audio_buffer.silent_chunks)
+                        else:
+                            transcripcion = functools.partial(transcribir_audio, audio_buffer.get_audio())
+                        
+                        # Procesar en el pool de turnos (uno a la vez por llamada) para no bloquear
+                        turno_actual = Turno()
+                        traza = TrazaTurno(fin_de_voz=audio_buffer.silent_chunks * CHUNK_SIZE / SAMPLE_RATE)
+                        registro_llamadas.actividad(call_sid)
+                        planificador_turnos.enviar(
+                            call_sid, turno_actual, procesar_audio_usuario,
+                            reproductor, call_sid, transcripcion, empleado, turno_actual, traza
+                        )
                     
                     # Limpiar buffer
                     audio_buffer.clear()
@@ -329,23 +547,41 @@ def media(ws):
         import traceback
         traceback.print_exc()
     finally:
+        # Cancelar el trabajo pendiente del turno y detener el reproductor
+        if turno_actual:
+            turno_actual.cancelar()
+        if reproductor:
+            reproductor.cerrar()
+        resumen_endpointing = audio_buffer.endpointer.resumen()
+        metrics.observar_endpointing(resumen_endpointing)
+        print(f"📏 Endpointing {call_sid}: {resumen_endpointing}")
+        # Liberar conversación y turnos pendientes de la llamada
+        registro_llamadas.socket_cerrado(call_sid)
+        audio_buffer.clear()
+        if transcriptor:
+            transcriptor.reset()
         print(f"🏁 WebSocket cerrado - CallSid: {call_sid}")
 
 
-def procesar_audio_usuario(ws, stream_sid, call_sid, wav_audio, empleado):
+def procesar_audio_usuario(reproductor, call_sid, transcripcion, empleado, turno, traza=None):
     """
     Procesa el audio del usuario:
-    1. Transcribe con Whisper
+    1. Transcribe con Whisper (`transcripcion()` devuelve el texto del turno)
     2. Genera respuesta con LLM
     3. Envía audio de vuelta
+    Si el turno se cancela (barge-in), se abandona el trabajo pendiente.
+    Cada etapa queda registrada en la traza del turno (ver /metrics).
     """
+    traza = traza or TrazaTurno()
+    traza.marcar("cola_turno")
     try:
         # ============================================
         # 1. TRANSCRIPCIÓN (Whisper)
         # ============================================
         print("📝 Transcribiendo audio...")
         
-        texto_usuario = transcribir_audio(wav_audio)
+        with traza.span("whisper"):
+            texto_usuario = transcripcion()
         
         if not texto_usuario or len(texto_usuario.strip()) < 2:
             print("⚠️ No se detectó texto válido")
@@ -353,29 +589,39 @@ def procesar_audio_usuario(ws, stream_sid, call_sid, wav_audio, empleado):
         
         print(f"🎤 Usuario dijo: '{texto_usuario}'")
         
+        if not turno.activo:
+            print("⏭️ Turno cancelado antes de generar respuesta")
+            return
+        
         # ============================================
         # 2. GENERAR RESPUESTA (LLM)
         # ============================================
         print("🧠 Generando respuesta del LLM...")
         
-        respuesta_bot = conversation_manager.procesar_respuesta(call_sid, texto_usuario)
-        
-        print(f"🤖 Bot responde: {respuesta_bot}")
+        # En modo streaming las frases se generan mientras se envía el audio
+        if LLM_STREAMING:
+            respuesta_bot = cronometrar_frases(
+                conversation_manager.procesar_respuesta_streaming(
+                    call_sid, texto_usuario, turno.cancelado, functools.partial(traza.observar, "llm_total")
+                ),
+                traza
+            )
+        else:
+            with traza.span("llm_total"):
+                respuesta_bot = conversation_manager.procesar_respuesta(call_sid, texto_usuario)
         
         # ============================================
         # 3. ENVIAR RESPUESTA EN STREAMING
         # ============================================
-        tiempo_inicio_audio = time.time()
-        enviar_respuesta_streaming(ws, stream_sid, call_sid, respuesta_bot)
-        tiempo_audio = time.time() - tiempo_inicio_audio
+        enviar_respuesta_streaming(reproductor, call_sid, respuesta_bot, turno, traza)
 
-        if conversation_manager.conversaciones[call_sid]["etapa"] == "despedida":
-            tiempo_espera = max(3, tiempo_audio + 1)
-            print("👋 Despedida detectada, finalizando llamada en {tiempo_espera:.1f}...", flush=True)
-            
-            # Esperar a que termine el audio de despedida
+        conv = conversation_manager.obtener_conversacion(call_sid)
+        if conv and conv.etapa == "despedida":
+            print("👋 Despedida detectada, finalizando llamada al terminar el audio...", flush=True)
             
-            time.sleep(tiempo_espera)
+            # Esperar a que termine el audio de despedida (el reproductor va a tiempo real)
+            reproductor.esperar_fin(timeout=30)
+            time.sleep(1)
             
             # Colgar la llamada
             colgar_llamada(call_sid)
@@ -386,160 +632,273 @@ def procesar_audio_usuario(ws, stream_sid, call_sid, wav_audio, empleado):
         traceback.print_exc()
 
 
-def enviar_respuesta_streaming(ws, stream_sid, call_sid, texto):
+def dividir_en_chunks(texto):
+    """
+    Divide un texto en frases para sintetizarlas por separado.
+    Si una frase es muy larga (>150 caracteres), se divide por comas.
+    """
+    # Dividir por puntos, pero mantener frases completas
+    frases = re.split(r'(?<=[.!?])\s+', texto)
+    
+    chunks = []
+    for frase in frases:
+        if len(frase) > 150:
+            sub_frases = re.split(r'(?<=,)\s+', frase)
+            chunks.extend(sub_frases)
+        else:
+            chunks.append(frase)
+    
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def iterar_chunks(texto):
+    """Genera los chunks de un texto o de un iterable de frases, a medida que llegan"""
+    frases = [texto] if isinstance(texto, str) else texto
+    try:
+        for frase in frases:
+            print(f"🤖 Bot responde: {frase}")
+            yield from dividir_en_chunks(frase)
+    finally:
+        # Si se deja de consumir, cerrar también el generador del LLM
+        if hasattr(frases, 'close'):
+            frases.close()
+
+
+def sintetizar_chunk(chunk):
+    """
+    Devuelve el audio de un chunk como iterable de bloques mulaw 8kHz.
+    Si el chunk está en la biblioteca de frases no se llama al TTS.
+    Se ejecuta en el pool de TTS para poder pedir varios chunks en paralelo.
+    """
+    audio = biblioteca_frases.obtener(chunk)
+    if audio is not None:
+        return [audio]
+    return pedir_tts(chunk)
+
+
+def pedir_tts(chunk):
+    """Sintetiza un chunk con Gemini TTS y devuelve un iterable de bloques mulaw 8kHz"""
+    response = http_clients.gemini_tts.post(
+        "/synthesize",
+        json={"text": chunk, "format": TTS_FORMATO},
+        timeout=TTS_TIMEOUT  # Timeout más corto para chunks pequeños
+    )
+    
+    if response.status_code != 200:
+        raise RuntimeError(f"Gemini TTS respondió {response.status_code}")
+    
+    # Obtener audio: mulaw 8kHz listo para Twilio, o MP3 que se
+    # decodifica mientras se envía (servidores TTS sin negociación)
+    if response.headers.get('Content-Type', '').startswith('audio/basic'):
+        return [response.content]
+    if modo_servidor() == 'gevent':
+        # Bajo gevent el MP3 se decodifica entero en un hilo real para no frenar los websockets
+        inicio = time.monotonic()
+        mulaw = ejecutar_cpu(mp3_a_mulaw, response.content)
+        etapas_turno.observar("transcodificacion", time.monotonic() - inicio)
+        return [mulaw]
+    return mp3_a_mulaw_medido(response.content)
+
+
+def mp3_a_mulaw_medido(mp3_bytes):
+    """mp3_a_mulaw_stream registrando el tiempo total de decodificación"""
+    bloques = mp3_a_mulaw_stream(mp3_bytes)
+    total = 0.0
+    while True:
+        inicio = time.monotonic()
+        bloque = next(bloques, None)
+        total += time.monotonic() - inicio
+        if bloque is None:
+            break
+        yield bloque
+    etapas_turno.observar("transcodificacion", total)
+
+
+def enviar_respuesta_streaming(reproductor, call_sid, texto, turno=None, traza=None):
     """
     Convierte texto a audio y lo envía en streaming a Twilio.
     Divide textos largos en chunks para reducir latencia.
+    `texto` puede ser un str o un iterable de frases (por ejemplo el
+    generador streaming del LLM): cada frase se sintetiza y envía
+    en cuanto llega, sin esperar la respuesta completa.
+    
+    Los chunks siguientes se sintetizan en paralelo (hasta TTS_PREFETCH
+    por delante) mientras se envía el actual; el envío siempre respeta
+    el orden original y un chunk fallido se salta sin frenar al resto.
+    
+    El audio se entrega al reproductor de la llamada, que lo envía a ritmo
+    de tiempo real. Si el turno se cancela (barge-in) se deja de generar.
+    Con `traza` se registran el primer byte de TTS, el primer frame enviado y
+    el tiempo que el LLM esperó lugar en la cola de TTS.
     """
+    # Cola acotada de (índice, chunk, futuro) en orden de reproducción
+    pendientes = queue.Queue(maxsize=TTS_PREFETCH)
+    detener = threading.Event()
+    
+    def cancelado():
+        return detener.is_set() or (turno is not None and not turno.activo)
+    
+    espera_cola = [0.0]  # Segundos que el productor pasó bloqueado con la cola llena
+    
+    def encolar(item):
+        inicio = time.monotonic()
+        try:
+            while not cancelado():
+                try:
+                    pendientes.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            espera_cola[0] += time.monotonic() - inicio
+    
+    def productor():
+        chunks = iterar_chunks(texto)
+        try:
+            for i, chunk in enumerate(chunks):
+                if cancelado():
+                    break
+                print(f"🎤 Chunk {i+1}: '{chunk[:40]}...'")
+                futuro = tts_executor.submit(sintetizar_chunk, chunk)
+                if not encolar((i, chunk, futuro, time.monotonic())):
+                    futuro.cancel()
+                    break
+        except Exception as e:
+            print(f"❌ Error generando chunks: {e}")
+        finally:
+            chunks.close()
+            if traza:
+                # Contrapresión de la cola de TTS: no es tiempo del LLM (ver llm_total)
+                traza.observar("espera_cola_tts", espera_cola[0])
+            if not cancelado():
+                encolar(None)
+    
+    threading.Thread(target=productor, daemon=True).start()
+    
     try:
-        print(f"🎤 Generando TTS para: '{texto[:50]}...'")
-        
         # ============================================
-        # DIVIDIR TEXTO LARGO EN FRASES
+        # ENVIAR CADA CHUNK EN ORDEN
         # ============================================
-        import re
-        
-        # Dividir por puntos, pero mantener frases completas
-        frases = re.split(r'(?<=[.!?])\s+', texto)
-        
-        # Si una frase es muy larga (>150 caracteres), dividirla por comas
-        chunks = []
-        for frase in frases:
-            if len(frase) > 150:
-                sub_frases = re.split(r'(?<=,)\s+', frase)
-                chunks.extend(sub_frases)
-            else:
-                chunks.append(frase)
-        
-        print(f"📊 Dividido en {len(chunks)} chunks")
-        
-        # ============================================
-        # GENERAR Y ENVIAR CADA CHUNK
-        # ============================================
-        for i, chunk in enumerate(chunks):
-            if not chunk.strip():
+        while not cancelado():
+            try:
+                item = pendientes.get(timeout=0.5)
+            except queue.Empty:
                 continue
-                
-            print(f"🎤 Chunk {i+1}/{len(chunks)}: '{chunk[:40]}...'")
+            if item is None:
+                break
+            
+            i, chunk, futuro, pedido = item
             
-            # Generar audio para este chunk
             try:
-                response = requests.post(
-                    "http://gemini-tts:5003/synthesize",
-                    json={"text": chunk},
-                    timeout=10  # Timeout más corto para chunks pequeños
-                )
-                
-                if response.status_code != 200:
-                    print(f"❌ Error en Gemini TTS chunk {i+1}: {response.status_code}")
-                    continue
+                bloques_mulaw = futuro.result(timeout=TTS_TIMEOUT)
                 
-                # Obtener audio (MP3)
-                audio_mp3 = response.content
+                al_enviar = None
+                if traza and i == 0:
+                    traza.observar("tts_primer_byte", time.monotonic() - pedido)
+                    al_enviar = functools.partial(traza.marcar, "primer_frame")
                 
-                # Convertir a mulaw
-                audio_mulaw = mp3_to_mulaw(audio_mp3)
+                for audio_chunk in frames_mulaw(bloques_mulaw, BYTES_POR_MENSAJE):
+                    if cancelado():
+                        break
+                    reproductor.encolar_audio(audio_chunk, al_enviar)
+                    al_enviar = None
                 
-                # Enviar en chunks a Twilio
-                chunk_size = 160  # 20ms de audio
+                print(f"✅ Chunk {i+1} encolado")
                 
-                for j in range(0, len(audio_mulaw), chunk_size):
-                    audio_chunk = audio_mulaw[j:j + chunk_size]
-                    
-                    payload = base64.b64encode(audio_chunk).decode('utf-8')
-                    
-                    message = {
-                        "event": "media",
-                        "streamSid": stream_sid,
-                        "media": {
-                            "payload": payload
-                        }
-                    }
-                    
-                    ws.send(json.dumps(message))
-                
-                print(f"✅ Chunk {i+1} enviado")
-                
-            except requests.Timeout:
+            except (requests.Timeout, FuturesTimeoutError):
                 print(f"⏱️ Timeout en chunk {i+1}, saltando...")
+                futuro.cancel()
+                continue
+            except Exception as e:
+                print(f"❌ Error en chunk {i+1}: {e}, saltando...")
                 continue
         
+        if cancelado():
+            print("✋ Respuesta cancelada, TTS pendiente descartado")
+            return
+        
         # Marca de finalización
-        mark_message = {
-            "event": "mark",
-            "streamSid": stream_sid,
-            "mark": {
-                "name": f"finished_{call_sid}"
-            }
-        }
-        ws.send(json.dumps(mark_message))
+        reproductor.encolar_marca(f"finished_{call_sid}")
         
-        print("✅ Audio completo enviado")
+        print("✅ Audio completo encolado")
         
     except Exception as e:
         print(f"❌ Error enviando audio: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        detener.set()
+        # Cancelar los chunks que aún no empezaron a sintetizarse
+        while True:
+            try:
+                item = pendientes.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[2].cancel()
+
+
+# ============================================
+# BIBLIOTECA DE FRASES PRE-RENDERIZADAS
+# ============================================
+
+def crear_biblioteca_frases():
+    """
+    Registra las frases fijas y plantillas del ConversationManager
+    y las pre-renderiza en segundo plano.
+    """
+    biblioteca = BibliotecaFrases(
+        sintetizar=lambda texto: b''.join(pedir_tts(texto)),
+        dividir=dividir_en_chunks
+    )
+    for frase in conversation_manager.frases_fijas():
+        biblioteca.registrar_frase(frase)
+    for plantilla in conversation_manager.plantillas():
+        biblioteca.registrar_plantilla(plantilla)
+    
+    threading.Thread(target=biblioteca.precargar, daemon=True).start()
+    return biblioteca
+
+
+biblioteca_frases = crear_biblioteca_frases()
 
 
 # ============================================
 # FUNCIONES DE CONVERSIÓN DE AUDIO
 # ============================================
 
+# Comienzo de un evento media tal como lo serializa Twilio (con o sin espacios)
+PREFIJOS_MEDIA = ('{"event":"media"', '{"event": "media"')
+
+
+def payload_media(mensaje):
+    """
+    Audio mulaw de un evento media sin parsear todo el JSON. Devuelve None
+    si el mensaje no empieza como un evento media, y entonces se usa json.loads.
+    """
+    if not isinstance(mensaje, str) or not mensaje.startswith(PREFIJOS_MEDIA):
+        return None
+    inicio = mensaje.find('"payload"')
+    if inicio < 0:
+        return None
+    inicio = mensaje.find('"', inicio + 9) + 1
+    fin = mensaje.find('"', inicio)
+    if inicio == 0 or fin < 0:
+        return None
+    # a2b_base64 ignora caracteres fuera del alfabeto, como un "\/" escapado
+    return binascii.a2b_base64(mensaje[inicio:fin])
+
+
 def mulaw_to_pcm(mulaw_bytes):
     """Convierte audio mulaw a PCM 16-bit"""
-    try:
-        import audioop
-        return audioop.ulaw2lin(mulaw_bytes, 2)
-    except Exception as e:
-        print(f"Error en mulaw_to_pcm: {e}")
-        return mulaw_bytes
+    return mulaw_a_pcm(mulaw_bytes)
 
 
 def mp3_to_mulaw(mp3_bytes):
-    """Convierte MP3 a mulaw para Twilio"""
+    """Convierte MP3 a mulaw para Twilio (en memoria, sin ffmpeg)"""
     try:
-        # Guardar MP3 temporal
-        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_mp3:
-            temp_mp3.write(mp3_bytes)
-            temp_mp3_path = temp_mp3.name
-        
-        # Convertir con ffmpeg
-        temp_wav_path = temp_mp3_path.replace('.mp3', '.wav')
-        temp_mulaw_path = temp_mp3_path.replace('.mp3', '.mulaw')
-        
-        import subprocess
-        
-        # MP3 → WAV (8kHz, mono)
-        subprocess.run([
-            'ffmpeg', '-i', temp_mp3_path,
-            '-ar', '8000',
-            '-ac', '1',
-            '-y',
-            temp_wav_path
-        ], check=True, capture_output=True)
-        
-        # WAV → MULAW
-        subprocess.run([
-            'ffmpeg', '-i', temp_wav_path,
-            '-ar', '8000',
-            '-ac', '1',
-            '-f', 'mulaw',
-            '-y',
-            temp_mulaw_path
-        ], check=True, capture_output=True)
-        
-        # Leer mulaw
-        with open(temp_mulaw_path, 'rb') as f:
-            mulaw_data = f.read()
-        
-        # Limpiar archivos temporales
-        os.unlink(temp_mp3_path)
-        os.unlink(temp_wav_path)
-        os.unlink(temp_mulaw_path)
-        
-        return mulaw_data
-        
+        return mp3_a_mulaw(mp3_bytes)
     except Exception as e:
         print(f"❌ Error en mp3_to_mulaw: {e}")
         import traceback
@@ -550,32 +909,22 @@ def mp3_to_mulaw(mp3_bytes):
 def transcribir_audio(wav_bytes):
     """Transcribe audio usando Whisper"""
     try:
-        # Guardar WAV temporal
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_wav:
-            temp_wav.write(wav_bytes)
-            temp_wav_path = temp_wav.name
+        # Enviar a Whisper directamente desde memoria
+        files = {
+            'audio_file': ('audio.wav', wav_bytes, 'audio/wav')
+        }
         
-        # Enviar a Whisper
-        with open(temp_wav_path, 'rb') as f:
-            files = {
-                'audio_file': ('audio.wav', f, 'audio/wav')
-            }
-            
-            params = {
-                'task': 'transcribe',
-                'language': 'es',
-                'output': 'json'
-            }
-            
-            response = requests.post(
-                "http://whisper:9000/asr",
-                files=files,
-                params=params,
-                timeout=30
-            )
+        params = {
+            'task': 'transcribe',
+            'language': 'es',
+            'output': 'json'
+        }
         
-        # Limpiar
-        os.unlink(temp_wav_path)
+        response = http_clients.whisper.post(
+            "/asr",
+            files=files,
+            params=params
+        )
         
         if response.status_code == 200:
             transcription = response.json()
@@ -611,14 +960,13 @@ def chat():
     messages_history = data.get("messages", [])
     
     try:
-        response = requests.post(
-            "http://ollama:11434/api/chat",
+        response = http_clients.ollama.post(
+            "/api/chat",
             json={
                 "model": "phi4-mini",
                 "messages": messages_history,
                 "stream": False
-            },
-            timeout=60
+            }
         )
         
         respuesta_json = response.json()
@@ -629,12 +977,55 @@ def chat():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/stats/servicios", methods=["GET"])
+def stats_servicios():
+    """Latencia y reutilización de conexiones hacia Whisper, Ollama y TTS, y cola de turnos"""
+    return jsonify(dict(http_clients.obtener_stats(), turnos=planificador_turnos.obtener_stats()))
+
+
+@app.route("/stats/llamadas", methods=["GET"])
+def stats_llamadas():
+    """Llamadas vivas, memoria retenida por sus conversaciones y liberaciones"""
+    return jsonify(dict(registro_llamadas.obtener_stats(), conversaciones=conversation_manager.contar_conversaciones()))
+
+
+@app.route("/stats/llm", methods=["GET"])
+def stats_llm():
+    """Tokens de prompt que Ollama evalúa por turno, lo ahorrado con el prefijo y con el índice de FAQ"""
+    return jsonify(dict(conversation_manager.metricas_prompt.obtener_stats(),
+                        faq=conversation_manager.indice_faq.obtener_stats()))
+
+
+@app.route("/stats/etapas", methods=["GET"])
+def stats_etapas():
+    """Muestras, media, p50 y p95 de cada etapa del turno, de cada servicio y del endpointing por llamada"""
+    return jsonify({"etapas": etapas_turno.resumen(), "servicios": peticiones_servicio.resumen(),
+                    "endpointing": dict(metrics.endpointing_llamadas.resumen(),
+                                        cortes=metrics.cortes_endpointing())})
+
+
+@app.route("/metrics", methods=["GET"])
+def exportar_metricas():
+    """Métricas en formato de texto de Prometheus (histogramas por etapa y servicio, llamadas y colas)"""
+    return Response(metrics.registro.exponer(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/listar-empleados", methods=["GET"])
 def listar_empleados():
-    """Lista todos los empleados"""
-    empleados = call_manager.cargar_empleados()
-    return jsonify({"empleados": empleados})
+    """Lista los empleados por páginas (?pagina=1&por_pagina=100)"""
+    pagina = max(1, request.args.get('pagina', 1, type=int))
+    por_pagina = min(MAX_POR_PAGINA, max(1, request.args.get('por_pagina', 100, type=int)))
+    
+    empleados, total = call_manager.listar_empleados((pagina - 1) * por_pagina, por_pagina)
+    return jsonify({
+        "empleados": empleados,
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "total": total,
+        "siguiente": pagina + 1 if pagina * por_pagina < total else None
+    })
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Solo para desarrollo; en producción: gunicorn -c gunicorn.conf.py app:app
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('FLASK_DEBUG', '1') == '1')
\ No newline at end of file
@@ -0,0 +1,214 @@
+"""
+Costo por turno de cada almacén de estado de conversaciones.
+
+    python bench/bench_estado.py --llamadas 200 --turnos 10 --procesos 1 2 4
+    python bench/bench_estado.py --gevent --llamadas 50 --turnos 10 --escritores 3
+
+Cada turno hace lo mismo que el pipeline real contra el almacén: leer la
+etapa (endpointing), agregar el mensaje del usuario, leer la conversación
+para armar el prompt, agregar la respuesta y, en el primer turno, avanzar
+la etapa. Con varios procesos todos comparten el mismo archivo SQLite,
+como los workers de gunicorn de un nodo. "sqlite+cache" es lo que usa la
+app: el SQLite detrás de la copia local del worker (AlmacenCacheado).
+
+Con --gevent se mide como en un worker gevent: las llamadas corren a la vez
+como greenlets, cada una con un bucle de 20ms que simula la recepción de
+frames, y --escritores procesos aparte escriben en el mismo archivo (los
+otros workers del nodo). Se comparan las operaciones de SQLite corriendo en
+el hub, en hilos reales (ejecutar_cpu) y con la copia local delante; el
+retraso del bucle de 20ms es lo que sufre el audio entrante de las demás llamadas.
+"""
+import sys
+
+if "--gevent" in sys.argv:
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse  # noqa: E402
+import multiprocessing  # noqa: E402
+import os  # noqa: E402
+import statistics  # noqa: E402
+import subprocess  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+import types  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from conversation_manager import agregar_al_historial  # noqa: E402
+from state_store import AlmacenCacheado, Conversacion, crear_almacen  # noqa: E402
+
+EMPLEADO = {"id": "74291468", "nombre": "Manuel Cruz", "dni": "74291468", "telefono": "+51954622077",
+            "fecha_inicio": "15/01/2026", "puesto": "Desarrollador"}
+PREGUNTA = "¿A qué hora tengo que llegar el primer día y dónde queda la oficina?"
+RESPUESTA = "El horario es de lunes a viernes de 9am a 6pm. La oficina está en La Victoria. ¿Algo más?"
+FRAME_SEGUNDOS = 0.02
+PAUSA_ENTRE_TURNOS = 0.05  # Segundos entre turnos de una llamada en modo gevent
+PAUSA_ESCRITOR = 0.01  # Segundos entre escrituras de cada proceso escritor
+
+
+def agregar(rol, contenido):
+    return lambda conv: agregar_al_historial(conv.historial, rol, contenido)
+
+
+def etapa(nueva):
+    def aplicar(conv):
+        conv.etapa = nueva
+    return aplicar
+
+
+def turno(almacen, call_sid, primero):
+    almacen.obtener(call_sid)  # etapa para el endpointing
+    almacen.actualizar(call_sid, agregar("user", PREGUNTA))
+    conv = almacen.obtener(call_sid)  # historial para el prompt
+    conv.mensajes()
+    if primero:
+        almacen.actualizar(call_sid, etapa("preguntas"))
+    almacen.actualizar(call_sid, agregar("assistant", RESPUESTA))
+
+
+def abrir(nombre, ruta):
+    """'memoria', 'sqlite' (sin copia local) o 'sqlite+cache' (como en la app)"""
+    if nombre == "memoria":
+        return crear_almacen(nombre)
+    return crear_almacen("sqlite", cache_local=nombre == "sqlite+cache", ruta=ruta)
+
+
+def correr(nombre, ruta, prefijo, llamadas, turnos):
+    almacen = abrir(nombre, ruta)
+    tiempos = []
+    for i in range(llamadas):
+        call_sid = f"CA{prefijo}-{i}"
+        almacen.crear(call_sid, Conversacion(dict(EMPLEADO)))
+        for t in range(turnos):
+            inicio = time.perf_counter()
+            turno(almacen, call_sid, t == 0)
+            tiempos.append(time.perf_counter() - inicio)
+        almacen.borrar(call_sid)
+    return tiempos
+
+
+def _proceso(args):
+    return correr(*args)
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+# ============================================
+# MODO GEVENT
+# ============================================
+
+def escritor(ruta, segundos):
+    """Otro worker del nodo: actualiza sus propias llamadas sin parar"""
+    almacen = crear_almacen("sqlite", cache_local=False, ruta=ruta)
+    call_sid = f"CAescritor-{os.getpid()}"
+    almacen.crear(call_sid, Conversacion(dict(EMPLEADO)))
+    fin = time.time() + segundos
+    while time.time() < fin:
+        almacen.actualizar(call_sid, agregar("user", PREGUNTA))
+        time.sleep(PAUSA_ESCRITOR)
+    almacen.borrar(call_sid)
+
+
+def en_hub(almacen):
+    """Las mismas operaciones sin pasar por ejecutar_cpu: bloquean el hub"""
+    return types.SimpleNamespace(crear=almacen._crear, obtener=almacen._obtener,
+                                 actualizar=almacen._actualizar, borrar=almacen._borrar)
+
+
+def correr_gevent(almacen, llamadas, turnos):
+    """(duración de cada turno, retraso de cada tick de 20ms) con todas las llamadas a la vez"""
+    import gevent
+
+    tiempos, retrasos = [], []
+    activas = [llamadas]
+
+    def bucle_frames():
+        esperado = time.perf_counter()
+        while activas[0]:
+            esperado += FRAME_SEGUNDOS
+            gevent.sleep(max(0.0, esperado - time.perf_counter()))
+            retrasos.append(max(0.0, time.perf_counter() - esperado))
+
+    def llamada(i):
+        call_sid = f"CAgevent-{i}"
+        almacen.crear(call_sid, Conversacion(dict(EMPLEADO)))
+        for t in range(turnos):
+            gevent.sleep(PAUSA_ENTRE_TURNOS)
+            inicio = time.perf_counter()
+            turno(almacen, call_sid, t == 0)
+            tiempos.append(time.perf_counter() - inicio)
+        almacen.borrar(call_sid)
+        activas[0] -= 1
+
+    greenlets = [gevent.spawn(bucle_frames) for _ in range(llamadas)]
+    gevent.joinall([gevent.spawn(llamada, i) for i in range(llamadas)])
+    gevent.joinall(greenlets)
+    return tiempos, retrasos
+
+
+def main_gevent(args):
+    ruta = os.path.join(tempfile.mkdtemp(prefix="bench-estado-"), "estado.db")
+    almacen = crear_almacen("sqlite", cache_local=False, ruta=ruta)
+    variantes = (("en hub", en_hub(almacen)), ("hilos reales", almacen), ("cache local", AlmacenCacheado(almacen)))
+    print(f"{'operaciones':<13}{'turno p50 ms':>13}{'turno p99 ms':>13}"
+          f"{'tick p50 ms':>12}{'tick p99 ms':>12}{'tick máx ms':>12}")
+    for nombre, destino in variantes:
+        escritores = [subprocess.Popen([sys.executable, __file__, "--escritor", ruta, "600"])
+                      for _ in range(args.escritores)]
+        time.sleep(0.5 if escritores else 0)
+        try:
+            tiempos, retrasos = correr_gevent(destino, args.llamadas, args.turnos)
+        finally:
+            for proceso in escritores:
+                proceso.kill()
+                proceso.wait()
+        print(f"{nombre:<13}{percentil(tiempos, 50) * 1e3:>13.2f}{percentil(tiempos, 99) * 1e3:>13.2f}"
+              f"{percentil(retrasos, 50) * 1e3:>12.2f}{percentil(retrasos, 99) * 1e3:>12.2f}"
+              f"{max(retrasos) * 1e3:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llamadas", type=int, default=200, help="llamadas por proceso")
+    parser.add_argument("--turnos", type=int, default=10, help="turnos por llamada")
+    parser.add_argument("--procesos", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--gevent", action="store_true", help="llamadas concurrentes en un worker gevent")
+    parser.add_argument("--escritores", type=int, default=2, help="procesos que escriben a la vez (con --gevent)")
+    parser.add_argument("--escritor", nargs=2, metavar=("RUTA", "SEGUNDOS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.escritor:
+        return escritor(args.escritor[0], float(args.escritor[1]))
+    if args.gevent:
+        return main_gevent(args)
+
+    directorio = tempfile.mkdtemp(prefix="bench-estado-")
+    print(f"{'almacén':<14}{'procesos':>9}{'turnos':>9}{'p50 us':>10}{'p99 us':>10}{'media us':>10}{'turnos/s':>11}")
+
+    for nombre in ("memoria", "sqlite", "sqlite+cache"):
+        for procesos in args.procesos:
+            if nombre == "memoria" and procesos > 1:
+                continue  # El almacén en memoria no se comparte entre procesos
+            ruta = os.path.join(directorio, f"estado-{nombre}-{procesos}.db")
+            trabajos = [(nombre, ruta, p, args.llamadas, args.turnos) for p in range(procesos)]
+
+            inicio = time.perf_counter()
+            if procesos == 1:
+                resultados = [_proceso(trabajos[0])]
+            else:
+                with multiprocessing.Pool(procesos) as pool:
+                    resultados = pool.map(_proceso, trabajos)
+            total = time.perf_counter() - inicio
+
+            tiempos = [t for resultado in resultados for t in resultado]
+            print(f"{nombre:<14}{procesos:>9}{len(tiempos):>9}"
+                  f"{percentil(tiempos, 50) * 1e6:>10.1f}{percentil(tiempos, 99) * 1e6:>10.1f}"
+                  f"{statistics.mean(tiempos) * 1e6:>10.1f}{len(tiempos) / total:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
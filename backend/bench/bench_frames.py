@@ -0,0 +1,242 @@
+"""
+Micro-benchmarks del camino por frame (lo que corre 50 veces por segundo por llamada).
+
+    python bench/bench_frames.py                  # compara con bench/baseline_frames.json
+    python bench/bench_frames.py --guardar        # actualiza la base (hacerlo en la misma máquina)
+    python bench/bench_frames.py --etapas vad_energia mulaw_a_pcm
+
+Por etapa se reporta:
+- ns por frame: el mejor promedio de --repeticiones corridas de --iteraciones frames
+- bytes asignados por frame: pico de memoria (tracemalloc) por encima de lo
+  que había antes de procesar el frame, o sea lo que la etapa pide y suelta
+- bloques retenidos por frame: bloques vivos que quedan tras procesar (crecimiento)
+Sale con código 1 si alguna etapa es más lenta que la base en más de
+--tolerancia. La comparación se hace relativa a un bucle de referencia medido
+en la misma corrida, así una máquina más lenta o cargada no marca regresiones.
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIRECTORIO, '..'))
+RUTA_BASE = os.path.join(DIRECTORIO, "baseline_frames.json")
+
+# app.py necesita las credenciales de Twilio para importarse; los servicios
+# apuntan a un puerto cerrado para que la precarga falle enseguida
+for variable, valor in (("TWILIO_ACCOUNT_SID", "ACbench"), ("TWILIO_AUTH_TOKEN", "bench"),
+                        ("TWILIO_PHONE_NUMBER", "+10000000000"), ("EMPLEADOS_CSV", os.devnull),
+                        ("WHISPER_URL", "http://127.0.0.1:9"), ("OLLAMA_URL", "http://127.0.0.1:9"),
+                        ("GEMINI_TTS_URL", "http://127.0.0.1:9")):
+    os.environ.setdefault(variable, valor)
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import app  # noqa: E402
+    # Esperar a los hilos de precarga (modelo, frases) para que no compitan con la medición
+    for hilo in threading.enumerate():
+        if hilo is not threading.current_thread():
+            hilo.join(timeout=5)
+from carga_llamadas import SILENCIO, voz_sintetica  # noqa: E402
+from outbound_player import CodificadorMedia  # noqa: E402
+from transcoder import frames_mulaw  # noqa: E402
+from vad import crear_motor_vad  # noqa: E402
+
+FRAME_BYTES = 160
+FRAMES_TURNO = 150  # 3s de voz: lo que get_audio empaqueta al cerrar un turno
+
+
+# ============================================
+# ENTRADAS
+# ============================================
+
+def frames_de_prueba():
+    """1.5s de voz y 1s de silencio, en frames mulaw de 20ms"""
+    voz = voz_sintetica()
+    frames = [voz[i:i + FRAME_BYTES] for i in range(0, len(voz) - FRAME_BYTES + 1, FRAME_BYTES)]
+    return frames + [SILENCIO] * 50
+
+
+def mensaje_media(frame, secuencia=1):
+    """Evento media tal como lo envía Twilio"""
+    return json.dumps({
+        "event": "media", "sequenceNumber": str(secuencia), "streamSid": "MZ" + "0" * 32,
+        "media": {"track": "inbound", "chunk": str(secuencia), "timestamp": str(secuencia * 20),
+                  "payload": base64.b64encode(frame).decode('ascii')},
+    })
+
+
+# ============================================
+# ETAPAS
+# ============================================
+
+def etapas():
+    """nombre -> (función de un frame, entradas que recorre en ciclo, frames por llamada)"""
+    mulaw = frames_de_prueba()
+    mensajes = [mensaje_media(frame, i) for i, frame in enumerate(mulaw)]
+    pcm = [app.mulaw_to_pcm(frame) for frame in mulaw]
+
+    motor_energia = crear_motor_vad("energia")
+    motor_hibrido = crear_motor_vad("hibrido")
+    buffer_vad = app.AudioBuffer()
+    buffer_completo = app.AudioBuffer()
+    buffer_turno = app.AudioBuffer()
+    for i in range(FRAMES_TURNO):
+        buffer_turno.buffer.agregar(mulaw[i % len(mulaw)])
+
+    def add_chunk(frame):
+        buffer_vad.add_chunk(frame)
+        if buffer_vad.is_finished_speaking() or len(buffer_vad.buffer) > 500:
+            buffer_vad.clear()
+
+    def entrante_completo(mensaje):
+        # El cuerpo del evento media de app.media(), sin el ASR incremental
+        audio = app.payload_media(mensaje)
+        if audio is not None:
+            buffer_completo.add_chunk(audio)
+            if buffer_completo.is_finished_speaking() or len(buffer_completo.buffer) > 500:
+                buffer_completo.clear()
+
+    # Lo que ReproductorSaliente serializa por frame enviado
+    mensaje_saliente = CodificadorMedia("MZ" + "0" * 32).media
+
+    bloque_tts = b''.join(mulaw) * 2
+    return {
+        "parseo_evento": (app.payload_media, mensajes, 1),
+        "base64_entrante": (base64.b64decode, [json.loads(m)['media']['payload'] for m in mensajes], 1),
+        "mulaw_a_pcm": (app.mulaw_to_pcm, mulaw, 1),
+        "vad_energia": (motor_energia.procesar, pcm, 1),
+        "vad_hibrido": (motor_hibrido.procesar, pcm, 1),
+        "vad_energia_mulaw": (motor_energia.procesar_mulaw, mulaw, 1),
+        "vad_hibrido_mulaw": (motor_hibrido.procesar_mulaw, mulaw, 1),
+        "add_chunk": (add_chunk, mulaw, 1),
+        "entrante_completo": (entrante_completo, mensajes, 1),
+        "get_audio": (lambda _: buffer_turno.get_audio(), [None], FRAMES_TURNO),
+        "frames_salientes": (lambda b: sum(1 for _ in frames_mulaw([b])), [bloque_tts],
+                             len(bloque_tts) // FRAME_BYTES),
+        "mensaje_saliente": (mensaje_saliente, mulaw, 1),
+    }
+
+
+# ============================================
+# MEDICIÓN
+# ============================================
+
+def medir_tiempo(funcion, entradas, iteraciones, repeticiones):
+    """Mejor promedio de ns por llamada entre varias corridas"""
+    n = len(entradas)
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter_ns()
+        for i in range(iteraciones):
+            funcion(entradas[i % n])
+        mejor = min(mejor, (time.perf_counter_ns() - inicio) / iteraciones)
+    return mejor
+
+
+def medir_memoria(funcion, entradas, muestras=500):
+    """(bytes asignados por llamada en el pico, bloques retenidos por llamada)"""
+    n = len(entradas)
+    for i in range(n):  # Calentar: cachés y buffers que se crean una vez
+        funcion(entradas[i])
+
+    tracemalloc.start()
+    pico_total = 0
+    for i in range(muestras):
+        antes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        funcion(entradas[i % n])
+        pico_total += tracemalloc.get_traced_memory()[1] - antes
+    tracemalloc.stop()
+
+    bloques_antes = sys.getallocatedblocks()
+    for i in range(muestras):
+        funcion(entradas[i % n])
+    retenidos = (sys.getallocatedblocks() - bloques_antes) / muestras
+    return pico_total / muestras, retenidos
+
+
+def referencia(_):
+    """Trabajo fijo de Python puro: escala de la máquina en esta corrida"""
+    return sum(range(200))
+
+
+def correr(nombres, iteraciones, repeticiones):
+    resultados = {"referencia": {
+        "ns_por_frame": round(medir_tiempo(referencia, [None], iteraciones, repeticiones), 1),
+        "bytes_por_frame": 0.0,
+        "bloques_retenidos_por_frame": 0.0,
+    }}
+    for nombre, (funcion, entradas, frames) in etapas().items():
+        if nombres and nombre not in nombres:
+            continue
+        llamadas = max(1, iteraciones // frames)
+        ns = medir_tiempo(funcion, entradas, llamadas, repeticiones)
+        bytes_pico, retenidos = medir_memoria(funcion, entradas, max(20, 500 // frames))
+        resultados[nombre] = {
+            "ns_por_frame": round(ns / frames, 1),
+            "bytes_por_frame": round(bytes_pico / frames, 1),
+            "bloques_retenidos_por_frame": round(retenidos / frames, 3),
+        }
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--etapas", nargs="+", help="solo estas etapas")
+    parser.add_argument("--iteraciones", type=int, default=4000, help="frames por corrida")
+    parser.add_argument("--repeticiones", type=int, default=25)
+    parser.add_argument("--guardar", action="store_true", help=f"guardar como base en {RUTA_BASE}")
+    parser.add_argument("--base", default=RUTA_BASE)
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="empeoramiento admitido (proporción)")
+    args = parser.parse_args()
+
+    resultados = correr(args.etapas, args.iteraciones, args.repeticiones)
+
+    base = {}
+    if os.path.exists(args.base) and not args.guardar:
+        with open(args.base) as archivo:
+            base = json.load(archivo)
+        if base.get("maquina") != platform.machine() or base.get("python") != platform.python_version():
+            print(f"⚠️ Base medida en {base.get('maquina')} / Python {base.get('python')}: comparar con cuidado")
+
+    # Escala entre esta corrida y la base según el bucle de referencia
+    ref_base = base.get("etapas", {}).get("referencia", {}).get("ns_por_frame")
+    escala = resultados["referencia"]["ns_por_frame"] / ref_base if ref_base else 1.0
+
+    regresiones = []
+    print(f"{'etapa':<20}{'ns/frame':>11}{'base':>11}{'cambio':>9}{'bytes/frame':>13}{'bloques ret.':>14}")
+    for nombre, medida in resultados.items():
+        anterior = base.get("etapas", {}).get(nombre, {}).get("ns_por_frame")
+        if anterior and nombre != "referencia":
+            anterior = round(anterior * escala, 1)
+        cambio = f"{(medida['ns_por_frame'] / anterior - 1) * 100:+.0f}%" if anterior else "-"
+        print(f"{nombre:<20}{medida['ns_por_frame']:>11.1f}{anterior or 0:>11.1f}{cambio:>9}"
+              f"{medida['bytes_por_frame']:>13.1f}{medida['bloques_retenidos_por_frame']:>14.3f}")
+        if anterior and nombre != "referencia" and medida["ns_por_frame"] > anterior * (1 + args.tolerancia):
+            regresiones.append(nombre)
+
+    if "entrante_completo" in resultados:
+        ns = resultados["entrante_completo"]["ns_por_frame"]
+        print(f"Entrante por llamada: {ns * 50 / 1e6:.2f} ms de CPU por segundo de audio")
+
+    if args.guardar:
+        with open(args.base, "w") as archivo:
+            json.dump({"maquina": platform.machine(), "python": platform.python_version(),
+                       "etapas": resultados}, archivo, indent=2)
+            archivo.write("\n")
+        print(f"💾 Base guardada en {args.base}")
+    elif regresiones:
+        print(f"❌ Más lentas que la base (> {args.tolerancia:.0%}): {', '.join(regresiones)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
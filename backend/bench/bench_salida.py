@@ -0,0 +1,112 @@
+"""
+Costo de CPU del camino saliente (audio del bot -> eventos media de Twilio)
+por segundo de audio: el bucle anterior contra CodificadorMedia.
+
+    python bench/bench_salida.py
+    python bench/bench_salida.py --ms 20 40 100 --segundos 30
+
+- anterior: corta una copia de 20ms, arma el dict, base64 y json.dumps por frame
+- codificador: frames memoryview (sin copia) y plantilla JSON del stream, con
+  mensajes de --ms milisegundos
+Cada mensaje se envía por un socketpair (un ws.send = una escritura), de modo
+que también cuenta el costo por llamada al sistema que se ahorra al mandar
+mensajes más grandes. Se mide el tiempo de CPU del hilo que envía.
+"""
+import argparse
+import base64
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIRECTORIO, '..'))
+
+from outbound_player import SAMPLE_RATE, CodificadorMedia  # noqa: E402
+from transcoder import FRAME_BYTES, frames_mulaw  # noqa: E402
+
+STREAM_SID = "MZ" + "0" * 32
+BLOQUE_TTS_SEGUNDOS = 2  # Audio por chunk de TTS, como una frase transcodificada
+
+
+class WebSocketFalso:
+    """Escribe cada mensaje en un socketpair que un hilo vacía en segundo plano"""
+    def __init__(self):
+        self._emisor, self._receptor = socket.socketpair()
+        threading.Thread(target=self._vaciar, daemon=True).start()
+
+    def _vaciar(self):
+        while self._receptor.recv(1 << 16):
+            pass
+
+    def send(self, mensaje):
+        self._emisor.sendall(mensaje.encode('ascii'))
+
+    def close(self):
+        self._emisor.close()
+
+
+def bloques_tts(segundos):
+    """Chunks mulaw como los que entrega la transcodificación"""
+    bloque = bytes(range(256)) * (SAMPLE_RATE * BLOQUE_TTS_SEGUNDOS // 256)
+    return [bloque] * max(1, int(segundos // BLOQUE_TTS_SEGUNDOS))
+
+
+def enviar_anterior(ws, bloques):
+    """El bucle previo: copia, dict y json.dumps por frame de 20ms"""
+    for bloque in bloques:
+        for i in range(0, len(bloque) - FRAME_BYTES + 1, FRAME_BYTES):
+            frame = bloque[i:i + FRAME_BYTES]
+            ws.send(json.dumps({
+                "event": "media",
+                "streamSid": STREAM_SID,
+                "media": {
+                    "payload": base64.b64encode(frame).decode('utf-8')
+                }
+            }))
+
+
+def enviar_codificador(ws, bloques, bytes_por_mensaje):
+    codificador = CodificadorMedia(STREAM_SID)
+    for frame in frames_mulaw(bloques, bytes_por_mensaje):
+        ws.send(codificador.media(frame))
+
+
+def medir(funcion, bloques, repeticiones):
+    """Mejor tiempo de CPU (s) del hilo actual entre varias corridas"""
+    ws = WebSocketFalso()
+    mejor = float("inf")
+    try:
+        for _ in range(repeticiones):
+            inicio = time.thread_time()
+            funcion(ws, bloques)
+            mejor = min(mejor, time.thread_time() - inicio)
+    finally:
+        ws.close()
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ms", type=int, nargs="+", default=[20, 40, 100], help="ms de audio por mensaje")
+    parser.add_argument("--segundos", type=float, default=20, help="audio enviado por corrida")
+    parser.add_argument("--repeticiones", type=int, default=15)
+    args = parser.parse_args()
+
+    bloques = bloques_tts(args.segundos)
+    segundos = sum(len(b) for b in bloques) / SAMPLE_RATE
+
+    anterior = medir(enviar_anterior, bloques, args.repeticiones)
+    print(f"{'camino':<22}{'µs CPU/s audio':>16}{'mensajes/s':>12}{'vs anterior':>13}")
+    print(f"{'anterior (20ms)':<22}{anterior / segundos * 1e6:>16.0f}{1000 / 20:>12.0f}{'-':>13}")
+    for ms in args.ms:
+        bytes_por_mensaje = SAMPLE_RATE * ms // 1000
+        costo = medir(lambda ws, b: enviar_codificador(ws, b, bytes_por_mensaje), bloques, args.repeticiones)
+        print(f"{f'codificador ({ms}ms)':<22}{costo / segundos * 1e6:>16.0f}{1000 / ms:>12.0f}"
+              f"{(costo / anterior - 1) * 100:>+12.0f}%")
+
+
+if __name__ == "__main__":
+    main()
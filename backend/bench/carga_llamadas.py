@@ -0,0 +1,478 @@
+"""
+Carga de punta a punta: llamadas simuladas contra /media, como Twilio.
+
+    # Todo local: lanza servicios_falsos.py y gunicorn, y sube la carga por niveles
+    python bench/carga_llamadas.py --lanzar --llamadas 5 10 20 40 --guardar base.json
+
+    # Contra un backend ya levantado (pid del master de gunicorn para medir CPU)
+    python bench/carga_llamadas.py --url ws://localhost:5000/media --pid 1234 --llamadas 10 20
+
+    # Gate de regresiones: falla (exit 1) si empeora respecto de la base
+    python bench/carga_llamadas.py --lanzar --llamadas 5 10 20 40 --comparar base.json
+
+Cada llamada abre el websocket, envía `connected` y `start`, y luego un frame
+mulaw de 20ms cada 20ms (silencio mientras el bot habla, la voz grabada
+cuando le toca al usuario) hasta completar sus turnos y enviar `stop`.
+
+Por nivel de concurrencia se reporta:
+- Latencia de turno: del último frame de voz enviado al primer frame de
+  audio del bot (incluye el silencio que espera el endpointing)
+- Jitter del audio saliente (p99 de la desviación entre frames respecto de
+  20ms, ya pasado el adelanto inicial) y huecos de reproducción: frames que
+  llegan cuando Twilio ya se quedó sin audio
+- CPU del backend por llamada (% de un núcleo), leída de /proc
+Un nivel se rompe si el p95 de latencia supera --max-p95 (por defecto 1.5x el
+del primer nivel), si fallan más de --max-fallos turnos o si hay más de
+--max-huecos huecos por minuto de audio. La carga se detiene en el primero
+que se rompe: ese es el punto de quiebre.
+
+Con un solo núcleo el arnés compite con el backend: para medir el techo real
+correrlo en otra máquina o fijar cada uno a su núcleo (taskset).
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import wave
+
+import numpy as np
+import requests
+import simple_websocket
+
+DIRECTORIO_BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, DIRECTORIO_BACKEND)
+
+from mulaw import pcm_a_mulaw  # noqa: E402
+
+FRAME_BYTES = 160  # 20ms de mulaw a 8kHz
+DURACION_FRAME = 0.02
+SILENCIO = b'\xff' * FRAME_BYTES  # mulaw de amplitud cero
+FIN_BOT = 0.6  # Segundos sin audio del bot para considerar que terminó de hablar
+FRAMES_ADELANTO = 10  # Primeros frames de cada respuesta, enviados en ráfaga (adelanto del reproductor)
+TOLERANCIA_HUECO = 0.005  # Segundos de retraso tolerados antes de contar un hueco
+
+
+# ============================================
+# AUDIO DEL USUARIO
+# ============================================
+
+def voz_sintetica(segundos=1.5):
+    """Señal con armónicos y envolvente silábica: el VAD de energía la toma como voz"""
+    t = np.arange(int(8000 * segundos)) / 8000
+    senal = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 6))
+    envolvente = 0.65 + 0.35 * np.sin(2 * np.pi * 4 * t)
+    pcm = (senal * envolvente * 5000).astype('<i2').tobytes()
+    return pcm_a_mulaw(pcm)
+
+
+def cargar_audio(ruta):
+    """WAV (PCM 16 bits, se convierte a 8kHz mono) o mulaw crudo; devuelve frames de 20ms"""
+    if ruta is None:
+        mulaw = voz_sintetica()
+    elif ruta.lower().endswith('.wav'):
+        with wave.open(ruta, 'rb') as wav:
+            if wav.getsampwidth() != 2:
+                raise SystemExit(f"{ruta}: se espera PCM de 16 bits")
+            muestras = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2').astype(np.float64)
+            if wav.getnchannels() == 2:
+                muestras = muestras.reshape(-1, 2).mean(axis=1)
+            if wav.getframerate() != 8000:
+                # Re-muestreo lineal: alcanza para audio de prueba
+                tiempos = np.arange(int(len(muestras) * 8000 / wav.getframerate())) * wav.getframerate() / 8000
+                muestras = np.interp(tiempos, np.arange(len(muestras)), muestras)
+        mulaw = pcm_a_mulaw(muestras.round().astype('<i2').tobytes())
+    else:
+        with open(ruta, 'rb') as archivo:
+            mulaw = archivo.read()
+
+    mulaw += SILENCIO[:(-len(mulaw)) % FRAME_BYTES]
+    return [mulaw[i:i + FRAME_BYTES] for i in range(0, len(mulaw), FRAME_BYTES)]
+
+
+# ============================================
+# LLAMADA SIMULADA
+# ============================================
+
+class LlamadaSimulada:
+    """Un cliente de Twilio Media Streams: envía audio a tiempo real y registra lo que recibe"""
+    def __init__(self, url, indice, frames_voz, turnos, timeout_turno):
+        self.url = url
+        self.call_sid = "CA" + uuid.uuid4().hex
+        self.stream_sid = "MZ" + uuid.uuid4().hex
+        self.telefono = f"+5190{indice:07d}"
+        self.frames_voz = frames_voz
+        self.turnos = turnos
+        self.timeout_turno = timeout_turno
+
+        self._lock = threading.Lock()
+        self.llegadas = []  # (momento, segundos de audio) de cada frame del bot
+        self.ventanas = []  # (fin de voz del usuario, inicio de su siguiente frase) por turno
+        self.inicio = None
+        self.fin = None
+        self.error = None
+
+    def correr(self):
+        try:
+            ws = simple_websocket.Client.connect(self.url)
+        except Exception as e:
+            self.error = f"conexión: {e}"
+            return
+        receptor = threading.Thread(target=self._recibir, args=(ws,), daemon=True)
+        receptor.start()
+        try:
+            self._enviar_llamada(ws)
+        except Exception as e:
+            self.error = f"envío: {e}"
+        finally:
+            self.fin = time.monotonic()
+            try:
+                ws.close()
+            except Exception:
+                pass
+            receptor.join(timeout=2)
+
+    def _enviar(self, ws, evento):
+        ws.send(json.dumps(evento))
+
+    def _enviar_llamada(self, ws):
+        self.inicio = time.monotonic()
+        self._enviar(ws, {"event": "connected", "protocol": "Call", "version": "1.0.0"})
+        self._enviar(ws, {
+            "event": "start", "sequenceNumber": "1", "streamSid": self.stream_sid,
+            "start": {"callSid": self.call_sid, "streamSid": self.stream_sid, "tracks": ["inbound"],
+                      "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": 8000, "channels": 1},
+                      "customParameters": {"toNumber": self.telefono}},
+        })
+
+        hablando = None  # índice del frame de voz que toca, o None si le toca al bot
+        referencia = self.inicio  # desde cuándo se espera la respuesta del bot
+        turnos_hechos = 0
+        proximo = time.monotonic()
+        secuencia = 2
+
+        while True:
+            ahora = time.monotonic()
+            if hablando is None:
+                ultima = self._ultima_llegada()
+                respondio = ultima is not None and ultima > referencia and ahora - ultima > FIN_BOT
+                if respondio or ahora - referencia > self.timeout_turno:
+                    if turnos_hechos == self.turnos:
+                        break
+                    if self.ventanas:
+                        self.ventanas[-1] = (self.ventanas[-1][0], ahora)
+                    hablando = 0
+                    turnos_hechos += 1
+                frame = SILENCIO
+            else:
+                frame = self.frames_voz[hablando]
+                hablando += 1
+                if hablando == len(self.frames_voz):
+                    hablando = None
+                    referencia = time.monotonic()
+                    self.ventanas.append((referencia, None))
+
+            self._enviar(ws, {
+                "event": "media", "sequenceNumber": str(secuencia), "streamSid": self.stream_sid,
+                "media": {"track": "inbound", "chunk": str(secuencia),
+                          "timestamp": str(int((ahora - self.inicio) * 1000)),
+                          "payload": base64.b64encode(frame).decode('ascii')},
+            })
+            secuencia += 1
+
+            # Ritmo de tiempo real con reloj absoluto (no acumula retraso)
+            proximo += DURACION_FRAME
+            espera = proximo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+
+        self._enviar(ws, {"event": "stop", "sequenceNumber": str(secuencia), "streamSid": self.stream_sid,
+                          "stop": {"callSid": self.call_sid}})
+
+    def _recibir(self, ws):
+        while True:
+            try:
+                mensaje = ws.receive(timeout=1)
+            except simple_websocket.ConnectionClosed:
+                return
+            if mensaje is None:
+                if self.fin is not None:
+                    return
+                continue
+            ahora = time.monotonic()
+            data = json.loads(mensaje)
+            if data.get("event") == "media":
+                payload = data["media"]["payload"]
+                muestras = len(payload) * 3 // 4 - payload.count("=", -2)
+                with self._lock:
+                    self.llegadas.append((ahora, muestras / 8000))
+
+    def _ultima_llegada(self):
+        with self._lock:
+            return self.llegadas[-1][0] if self.llegadas else None
+
+    def resultados(self):
+        """Latencias de turno, jitter y huecos de cada respuesta del bot"""
+        latencias, desvios = [], []
+        fallos, huecos, audio = 0, 0, 0.0
+        for fin_voz, siguiente in self.ventanas:
+            respuesta = [(t, d) for t, d in self.llegadas
+                         if t > fin_voz and (siguiente is None or t < siguiente)]
+            if not respuesta:
+                fallos += 1
+                continue
+            latencias.append(respuesta[0][0] - fin_voz)
+
+            # Reproducción simulada en Twilio: cada frame suena a continuación del anterior
+            fin_audio = respuesta[0][0] + respuesta[0][1]
+            for i in range(1, len(respuesta)):
+                t, duracion = respuesta[i]
+                if t > fin_audio + TOLERANCIA_HUECO:
+                    huecos += 1
+                fin_audio = max(fin_audio, t) + duracion
+                if i > FRAMES_ADELANTO:
+                    desvios.append(abs(t - respuesta[i - 1][0] - respuesta[i - 1][1]))
+            audio += sum(d for _, d in respuesta)
+        return {"latencias": latencias, "desvios": desvios, "fallos": fallos, "huecos": huecos,
+                "audio": audio, "duracion": (self.fin or time.monotonic()) - (self.inicio or 0),
+                "error": self.error}
+
+
+# ============================================
+# MEDICIÓN
+# ============================================
+
+def _hijos(pid):
+    hijos = []
+    try:
+        for tarea in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tarea}/children") as archivo:
+                hijos += [int(h) for h in archivo.read().split()]
+    except OSError:
+        pass
+    return hijos + [nieto for hijo in hijos for nieto in _hijos(hijo)]
+
+
+def cpu_proceso(pid):
+    """Segundos de CPU (usuario + sistema) del proceso y sus hijos (workers de gunicorn)"""
+    if not pid:
+        return 0.0
+    total = 0
+    for proceso in [pid] + _hijos(pid):
+        try:
+            with open(f"/proc/{proceso}/stat") as archivo:
+                campos = archivo.read().rsplit(")", 1)[1].split()
+            total += int(campos[11]) + int(campos[12])
+        except (OSError, IndexError, ValueError):
+            continue
+    return total / os.sysconf("SC_CLK_TCK")
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def correr_nivel(args, concurrencia, frames_voz, pid):
+    llamadas = [LlamadaSimulada(args.url, i, frames_voz, args.turnos, args.timeout_turno)
+                for i in range(concurrencia)]
+    hilos = [threading.Thread(target=llamada.correr, daemon=True) for llamada in llamadas]
+
+    cpu_inicio = cpu_proceso(pid)
+    inicio = time.monotonic()
+    for hilo in hilos:
+        hilo.start()
+        time.sleep(args.rampa)  # Escalonar los inicios como llegan las llamadas reales
+    for hilo in hilos:
+        hilo.join()
+    pared = time.monotonic() - inicio
+    cpu = cpu_proceso(pid) - cpu_inicio
+
+    resultados = [llamada.resultados() for llamada in llamadas]
+    latencias = [t for r in resultados for t in r["latencias"]]
+    desvios = [d for r in resultados for d in r["desvios"]]
+    fallos = sum(r["fallos"] for r in resultados)
+    turnos = len(latencias) + fallos
+    audio = sum(r["audio"] for r in resultados)
+    duracion_llamadas = sum(r["duracion"] for r in resultados)
+    errores = [r["error"] for r in resultados if r["error"]]
+
+    return {
+        "llamadas": concurrencia,
+        "turnos": turnos,
+        "fallos": fallos,
+        "errores": len(errores),
+        "p50": round(percentil(latencias, 50), 3),
+        "p95": round(percentil(latencias, 95), 3),
+        "p99": round(percentil(latencias, 99), 3),
+        "media": round(statistics.mean(latencias), 3) if latencias else 0.0,
+        "jitter_p99_ms": round(percentil(desvios, 99) * 1000, 1),
+        "huecos_por_minuto": round(sum(r["huecos"] for r in resultados) / (audio / 60), 2) if audio else 0.0,
+        "cpu_por_llamada": round(100 * cpu / duracion_llamadas, 2) if pid and duracion_llamadas else None,
+        "cpu_total": round(100 * cpu / pared, 1) if pid else None,
+        "segundos": round(pared, 1),
+        "primer_error": errores[0] if errores else None,
+    }
+
+
+def roto(nivel, args, p95_base):
+    """Motivo por el que el nivel se rompe, o None"""
+    max_p95 = args.max_p95 or p95_base * 1.5
+    if nivel["errores"]:
+        return f"{nivel['errores']} llamadas con error ({nivel['primer_error']})"
+    if nivel["turnos"] and nivel["fallos"] / nivel["turnos"] > args.max_fallos:
+        return f"{nivel['fallos']}/{nivel['turnos']} turnos sin respuesta"
+    if nivel["p95"] > max_p95:
+        return f"p95 {nivel['p95']}s > {max_p95:.3f}s"
+    if nivel["huecos_por_minuto"] > args.max_huecos:
+        return f"{nivel['huecos_por_minuto']} huecos/min"
+    return None
+
+
+def comparar(resultado, ruta_base, tolerancia):
+    """Regresiones respecto de una corrida guardada; devuelve la lista de problemas"""
+    with open(ruta_base) as archivo:
+        base = json.load(archivo)
+    problemas = []
+    niveles_base = {nivel["llamadas"]: nivel for nivel in base["niveles"]}
+    for nivel in resultado["niveles"]:
+        anterior = niveles_base.get(nivel["llamadas"])
+        if not anterior:
+            continue
+        for clave in ("p95", "cpu_por_llamada"):
+            if anterior.get(clave) and nivel.get(clave) and nivel[clave] > anterior[clave] * (1 + tolerancia):
+                problemas.append(f"{nivel['llamadas']} llamadas: {clave} {anterior[clave]} -> {nivel[clave]}")
+    if base.get("quiebre") and (resultado["quiebre"] or float("inf")) < base["quiebre"]:
+        problemas.append(f"punto de quiebre {base['quiebre']} -> {resultado['quiebre']} llamadas")
+    return problemas
+
+
+# ============================================
+# LANZAR BACKEND Y SERVICIOS LOCALES
+# ============================================
+
+def lanzar(args):
+    directorio = tempfile.mkdtemp(prefix="bench-carga-")
+    empleados = os.path.join(directorio, "empleados.csv")
+    with open(empleados, "w") as archivo:
+        archivo.write("nombre,dni,telefono,fecha_inicio,puesto\n"
+                      "Manuel Cruz,74291468,+51954622077,15/01/2026,Desarrollador\n")
+    log = open(os.path.join(directorio, "procesos.log"), "w")
+
+    url_servicios = f"http://127.0.0.1:{args.puerto_servicios}"
+    servicios = subprocess.Popen(
+        [sys.executable, os.path.join(DIRECTORIO_BACKEND, "bench", "servicios_falsos.py"),
+         "--puerto", str(args.puerto_servicios), "--asr", str(args.asr), "--ttft", str(args.ttft),
+         "--token", str(args.token), "--tts", str(args.tts)],
+        stdout=log, stderr=subprocess.STDOUT
+    )
+    entorno = dict(
+        os.environ,
+        PORT=str(args.puerto), WHISPER_URL=url_servicios, OLLAMA_URL=url_servicios, GEMINI_TTS_URL=url_servicios,
+        EMPLEADOS_CSV=empleados, STATE_SQLITE_PATH=os.path.join(directorio, "estado.db"),
+        TWILIO_ACCOUNT_SID="ACbench", TWILIO_AUTH_TOKEN="bench", TWILIO_PHONE_NUMBER="+10000000000",
+        LOG_LEVEL="warning",
+    )
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=DIRECTORIO_BACKEND, env=entorno, stdout=log, stderr=subprocess.STDOUT
+    )
+
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if backend.poll() is not None:
+            raise SystemExit(f"El backend terminó al arrancar (ver {log.name})")
+        try:
+            if requests.get(f"http://127.0.0.1:{args.puerto}/stats/llamadas", timeout=1).ok:
+                break
+        except requests.RequestException:
+            time.sleep(0.5)
+    else:
+        raise SystemExit(f"El backend no respondió en 60s (ver {log.name})")
+
+    print(f"🧪 Backend pid {backend.pid} en :{args.puerto}, servicios en :{args.puerto_servicios}, logs en {log.name}")
+    args.url = f"ws://127.0.0.1:{args.puerto}/media"
+    return backend.pid, [backend, servicios]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://localhost:5000/media")
+    parser.add_argument("--pid", type=int, help="pid del backend (gunicorn master) para medir CPU")
+    parser.add_argument("--llamadas", type=int, nargs="+", default=[5, 10, 20, 40], help="niveles de concurrencia")
+    parser.add_argument("--turnos", type=int, default=3, help="turnos del usuario por llamada")
+    parser.add_argument("--audio", help="WAV o mulaw crudo con la frase del usuario (por defecto voz sintética)")
+    parser.add_argument("--rampa", type=float, default=0.05, help="segundos entre inicios de llamadas")
+    parser.add_argument("--timeout-turno", type=float, default=15.0)
+    parser.add_argument("--max-p95", type=float, help="p95 de latencia (s) que rompe un nivel")
+    parser.add_argument("--max-fallos", type=float, default=0.02, help="proporción de turnos sin respuesta")
+    parser.add_argument("--max-huecos", type=float, default=2.0, help="huecos de reproducción por minuto")
+    parser.add_argument("--seguir", action="store_true", help="seguir subiendo la carga tras el quiebre")
+    parser.add_argument("--guardar", help="guardar los resultados en JSON (base para --comparar)")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior: exit 1 si hay regresión")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="empeoramiento admitido al comparar")
+
+    lanzamiento = parser.add_argument_group("lanzar backend y servicios falsos")
+    lanzamiento.add_argument("--lanzar", action="store_true")
+    lanzamiento.add_argument("--puerto", type=int, default=5097)
+    lanzamiento.add_argument("--puerto-servicios", type=int, default=5098)
+    lanzamiento.add_argument("--asr", type=float, default=0.3)
+    lanzamiento.add_argument("--ttft", type=float, default=0.4)
+    lanzamiento.add_argument("--token", type=float, default=0.03)
+    lanzamiento.add_argument("--tts", type=float, default=0.25)
+    args = parser.parse_args()
+
+    frames_voz = cargar_audio(args.audio)
+    pid, procesos = lanzar(args) if args.lanzar else (args.pid, [])
+
+    resultado = {"niveles": [], "quiebre": None, "turnos_por_llamada": args.turnos}
+    print(f"{'llamadas':>9}{'turnos':>8}{'fallos':>8}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}"
+          f"{'jitter ms':>11}{'huecos/min':>12}{'cpu %/llam':>12}  estado")
+    try:
+        p95_base = None
+        for concurrencia in args.llamadas:
+            nivel = correr_nivel(args, concurrencia, frames_voz, pid)
+            p95_base = p95_base or nivel["p95"]
+            motivo = roto(nivel, args, p95_base)
+            nivel["roto"] = motivo
+            resultado["niveles"].append(nivel)
+
+            cpu = f"{nivel['cpu_por_llamada']:.2f}" if nivel["cpu_por_llamada"] is not None else "-"
+            print(f"{concurrencia:>9}{nivel['turnos']:>8}{nivel['fallos']:>8}{nivel['p50']:>8.3f}"
+                  f"{nivel['p95']:>8.3f}{nivel['p99']:>8.3f}{nivel['jitter_p99_ms']:>11.1f}"
+                  f"{nivel['huecos_por_minuto']:>12.2f}{cpu:>12}  {motivo or 'ok'}", flush=True)
+
+            if motivo and resultado["quiebre"] is None:
+                resultado["quiebre"] = concurrencia
+                if not args.seguir:
+                    break
+    finally:
+        for proceso in procesos:
+            proceso.terminate()
+        for proceso in procesos:
+            proceso.wait(timeout=30)
+
+    print(f"Punto de quiebre: {resultado['quiebre'] or f'no alcanzado (> {args.llamadas[-1]})'} llamadas")
+
+    if args.guardar:
+        with open(args.guardar, "w") as archivo:
+            json.dump(resultado, archivo, indent=2)
+    if args.comparar:
+        problemas = comparar(resultado, args.comparar, args.tolerancia)
+        for problema in problemas:
+            print(f"❌ Regresión: {problema}")
+        if problemas:
+            sys.exit(1)
+        print("✅ Sin regresiones respecto de la base")
+
+
+if __name__ == "__main__":
+    main()
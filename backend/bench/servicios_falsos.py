@@ -0,0 +1,125 @@
+"""
+Dobles locales de Whisper, Ollama y Gemini TTS con latencia configurable,
+para medir el backend sin GPU ni servicios externos.
+
+    python bench/servicios_falsos.py --puerto 5098 --asr 0.3 --ttft 0.4 --token 0.03 --tts 0.25
+    WHISPER_URL=http://localhost:5098 OLLAMA_URL=http://localhost:5098 \\
+        GEMINI_TTS_URL=http://localhost:5098 gunicorn -c gunicorn.conf.py app:app
+
+- POST /asr: responde una de las transcripciones configuradas tras --asr segundos
+- POST /api/chat: stream NDJSON como Ollama (primer token a --ttft, luego uno
+  cada --token segundos) y el objeto final con prompt_eval_count y duraciones
+- POST /synthesize: mulaw 8kHz (audio/basic) de duración proporcional al
+  texto, tras --tts segundos
+Cada latencia varía ±--variacion (proporción) al azar.
+"""
+import argparse
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+
+from flask import Flask, Response, jsonify, request
+
+app = Flask(__name__)
+
+config = {"asr": 0.3, "ttft": 0.4, "token": 0.03, "tts": 0.25, "variacion": 0.2, "caracteres_por_segundo": 15}
+
+# Todas contienen "sí" para pasar la verificación; la segunda va por el índice de FAQ
+TRANSCRIPCIONES = [
+    "Sí, quisiera saber si tengo seguro médico",
+    "Sí, ¿cuál es el horario?",
+    "Sí, ¿me podrías contar cómo es el área donde voy a trabajar?",
+]
+RESPUESTA_LLM = ("Claro, con gusto te ayudo con eso. Esa información te la darán en RRHH "
+                 "durante tu primer día de trabajo. ¿Hay algo más en lo que pueda ayudarte?")
+
+_turnos_asr = itertools.count()
+_lock = threading.Lock()
+contadores = {"asr": 0, "chat": 0, "tts": 0}
+
+
+def esperar(segundos):
+    time.sleep(max(0.0, segundos * random.uniform(1 - config["variacion"], 1 + config["variacion"])))
+
+
+def contar(nombre):
+    with _lock:
+        contadores[nombre] += 1
+
+
+@app.route("/asr", methods=["POST"])
+def asr():
+    contar("asr")
+    esperar(config["asr"])
+    return jsonify({"text": TRANSCRIPCIONES[next(_turnos_asr) % len(TRANSCRIPCIONES)]})
+
+
+@app.route("/api/chat", methods=["POST"])
+def chat():
+    contar("chat")
+    datos = request.get_json(force=True)
+    caracteres = sum(len(m.get("content", "")) for m in datos.get("messages", []))
+    tokens = [palabra + " " for palabra in RESPUESTA_LLM.split(" ")]
+    num_predict = datos.get("options", {}).get("num_predict", 80)
+    tokens = tokens[:num_predict]
+
+    final = {
+        "model": datos.get("model"),
+        "done": True,
+        "prompt_eval_count": caracteres // 4,
+        "prompt_eval_duration": int(config["ttft"] * 1e9),
+        "eval_count": len(tokens),
+        "eval_duration": int(config["token"] * len(tokens) * 1e9),
+        "total_duration": int((config["ttft"] + config["token"] * len(tokens)) * 1e9),
+    }
+
+    if not datos.get("stream", True):
+        esperar(config["ttft"] + config["token"] * len(tokens))
+        return jsonify(dict(final, message={"role": "assistant", "content": "".join(tokens)}))
+
+    def generar():
+        esperar(config["ttft"])
+        for token in tokens:
+            yield json.dumps({"model": datos.get("model"), "done": False,
+                              "message": {"role": "assistant", "content": token}}) + "\n"
+            esperar(config["token"])
+        yield json.dumps(dict(final, message={"role": "assistant", "content": ""})) + "\n"
+
+    return Response(generar(), mimetype="application/x-ndjson")
+
+
+@app.route("/synthesize", methods=["POST"])
+def synthesize():
+    contar("tts")
+    texto = request.get_json(force=True).get("text", "")
+    esperar(config["tts"])
+    muestras = int(8000 * max(0.3, len(texto) / config["caracteres_por_segundo"]))
+    return Response(b"\xff" * muestras, mimetype="audio/basic")
+
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify(dict(contadores, config=config))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puerto", type=int, default=5098)
+    parser.add_argument("--asr", type=float, default=config["asr"], help="segundos por transcripción")
+    parser.add_argument("--ttft", type=float, default=config["ttft"], help="segundos hasta el primer token")
+    parser.add_argument("--token", type=float, default=config["token"], help="segundos entre tokens")
+    parser.add_argument("--tts", type=float, default=config["tts"], help="segundos por síntesis")
+    parser.add_argument("--variacion", type=float, default=config["variacion"])
+    args = parser.parse_args()
+
+    config.update(asr=args.asr, ttft=args.ttft, token=args.token, tts=args.tts, variacion=args.variacion)
+    print(f"🧪 Servicios falsos en :{args.puerto} {config}", flush=True)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # Sin una línea por petición
+    app.run(host="0.0.0.0", port=args.puerto, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Doble local de la API REST de Twilio para probar campañas sin llamar a nadie.
+
+    python bench/twilio_falso.py --puerto 5099 --sin-respuesta 0.3
+    TWILIO_API_BASE_URL=http://localhost:5099 python app.py
+
+Acepta POST /2010-04-01/Accounts/<sid>/Calls.json, responde como Twilio y,
+tras unos segundos, envía al StatusCallback el resultado de la llamada
+(completed, no-answer o busy según las proporciones configuradas).
+"""
+import argparse
+import random
+import threading
+import time
+import uuid
+
+import requests
+from flask import Flask, jsonify, request
+
+app = Flask(__name__)
+config = {"sin_respuesta": 0.2, "ocupado": 0.05, "duracion": 5.0}
+llamadas = []
+
+
+def notificar(url, call_sid, estado, duracion):
+    time.sleep(duracion)
+    try:
+        requests.post(url, data={"CallSid": call_sid, "CallStatus": estado,
+                                 "CallDuration": str(int(duracion))}, timeout=5)
+    except requests.RequestException as e:
+        print(f"⚠️ No se pudo notificar {call_sid}: {e}", flush=True)
+
+
+@app.route("/2010-04-01/Accounts/<account_sid>/Calls.json", methods=["POST"])
+def crear_llamada(account_sid):
+    call_sid = "CA" + uuid.uuid4().hex
+    azar = random.random()
+    if azar < config["sin_respuesta"]:
+        estado = "no-answer"
+    elif azar < config["sin_respuesta"] + config["ocupado"]:
+        estado = "busy"
+    else:
+        estado = "completed"
+
+    llamadas.append({"sid": call_sid, "to": request.form.get("To"), "resultado": estado, "hora": time.time()})
+
+    if request.form.get("StatusCallback"):
+        duracion = config["duracion"] * random.uniform(0.5, 1.5) if estado == "completed" else 1.0
+        threading.Thread(
+            target=notificar, args=(request.form["StatusCallback"], call_sid, estado, duracion), daemon=True
+        ).start()
+
+    return jsonify({
+        "sid": call_sid,
+        "account_sid": account_sid,
+        "to": request.form.get("To"),
+        "from": request.form.get("From"),
+        "status": "queued",
+        "uri": f"/2010-04-01/Accounts/{account_sid}/Calls/{call_sid}.json",
+    }), 201
+
+
+@app.route("/llamadas", methods=["GET"])
+def listar_llamadas():
+    """Llamadas recibidas, para comprobar ritmo y reintentos"""
+    return jsonify(llamadas)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puerto", type=int, default=5099)
+    parser.add_argument("--sin-respuesta", type=float, default=config["sin_respuesta"])
+    parser.add_argument("--ocupado", type=float, default=config["ocupado"])
+    parser.add_argument("--duracion", type=float, default=config["duracion"], help="segundos por llamada contestada")
+    args = parser.parse_args()
+    config.update(sin_respuesta=args.sin_respuesta, ocupado=args.ocupado, duracion=args.duracion)
+    app.run(host="0.0.0.0", port=args.puerto, threaded=True)
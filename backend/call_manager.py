@@ -1,7 +1,8 @@
-import pandas as pd
 from twilio.rest import Client
 import os
+from urllib.parse import urlencode
 from dotenv import load_dotenv
+from roster import RegistroEmpleados
 
 load_dotenv()
 
@@ -12,36 +13,40 @@ class CallManager:
             os.getenv('TWILIO_AUTH_TOKEN')
         )
         self.twilio_number = os.getenv('TWILIO_PHONE_NUMBER')
-        self.empleados = self.cargar_empleados()
+        # API REST alternativa (p. ej. un doble local de Twilio para pruebas de campañas)
+        if os.getenv('TWILIO_API_BASE_URL'):
+            self.client.api.base_url = os.getenv('TWILIO_API_BASE_URL').rstrip('/')
+        self.empleados = RegistroEmpleados()
     
-    def cargar_empleados(self):
-        """Carga la lista de empleados desde CSV"""
-        try:
-            df = pd.read_csv('/app/data/empleados.csv')
-            df['telefono'] = df['telefono'].astype(str).str.strip()
-            return df.to_dict('records')
-        except Exception as e:
-            print(f"Error cargando empleados: {e}")
-            return []
+    def obtener_empleado(self, empleado_id):
+        """Busca un empleado por su ID estable (columna id o dni del CSV)"""
+        return self.empleados.obtener(empleado_id)
     
     def obtener_empleado_por_telefono(self, telefono):
-        """Busca un empleado por su número de teléfono"""
-        for emp in self.empleados:
-            if emp['telefono'] == telefono:
-                return emp
-        return None
+        """Busca un empleado por su número de teléfono (normalizado)"""
+        return self.empleados.obtener_por_telefono(telefono)
+    
+    def listar_empleados(self, desde=0, limite=100):
+        """Página de empleados y total del padrón"""
+        return self.empleados.listar(desde, limite)
     
-    def iniciar_llamada(self, empleado):
-        """Inicia una llamada a un empleado"""
+    def iniciar_llamada(self, empleado, parametros_estado=None):
+        """
+        Inicia una llamada a un empleado. `parametros_estado` se agregan a la
+        URL del status callback y vuelven en cada notificación de estado.
+        """
         try:
             # URL del webhook que manejará la conversación
             webhook_url = f"{os.getenv('WEBHOOK_BASE_URL')}/twilio-webhook"
+            status_url = f"{os.getenv('WEBHOOK_BASE_URL')}/call-status"
+            if parametros_estado:
+                status_url += "?" + urlencode(parametros_estado)
             
             call = self.client.calls.create(
                 to=empleado['telefono'],
                 from_=self.twilio_number,
                 url=webhook_url,
-                status_callback=f"{os.getenv('WEBHOOK_BASE_URL')}/call-status",
+                status_callback=status_url,
                 status_callback_event=['initiated', 'ringing', 'answered', 'completed']
             )
             
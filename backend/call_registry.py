@@ -0,0 +1,151 @@
+import threading
+import time
+
+# ============================================
+# CONFIGURACIÓN DEL REGISTRO DE LLAMADAS
+# ============================================
+TTL_SIN_SOCKET = 10 * 60  # Llamada marcada que nunca abrió (o ya cerró) el stream y no avisó su fin
+TTL_CON_SOCKET = 2 * 60 * 60  # Stream abierto sin ningún turno durante este tiempo
+INTERVALO_BARRIDO = 30  # Segundos mínimos entre barridos de llamadas abandonadas
+
+# Estados de Twilio a partir de los cuales la llamada ya no existe
+ESTADOS_FINALES = {"completed", "busy", "no-answer", "failed", "canceled"}
+
+
+class _Llamada:
+    __slots__ = ("inicio", "ultima_actividad", "estado", "socket", "cerrar_socket")
+
+    def __init__(self, ahora):
+        self.inicio = ahora
+        self.ultima_actividad = ahora
+        self.estado = "iniciada"
+        self.socket = False
+        self.cerrar_socket = None
+
+
+class RegistroLlamadas:
+    """
+    Ciclo de vida de las llamadas del proceso. Una llamada se libera (se borra
+    su conversación y su trabajo pendiente con `al_liberar`) en cuanto pasa lo
+    primero de:
+    - Twilio informa un estado final por el status callback
+    - Se cierra el websocket de /media
+    - Queda abandonada más tiempo que su TTL
+    """
+    def __init__(self, al_liberar, medir_memoria=None, al_barrer=None, estado_compartido=False,
+                 ttl_sin_socket=TTL_SIN_SOCKET, ttl_con_socket=TTL_CON_SOCKET):
+        self._al_liberar = al_liberar  # call_sid -> None
+        self._al_barrer = al_barrer  # antigüedad -> None: purga el estado compartido de otros procesos
+        self._medir_memoria = medir_memoria or (lambda: 0)  # bytes retenidos por las conversaciones
+        # Con estado compartido, una llamada sin socket aquí puede estar viva en otro worker
+        self.estado_compartido = estado_compartido
+        self.ttl_sin_socket = ttl_sin_socket
+        self.ttl_con_socket = ttl_con_socket
+
+        self._lock = threading.Lock()
+        self._llamadas = {}  # call_sid -> _Llamada
+        self._ultimo_barrido = time.monotonic()
+
+        self.stats = {"registradas": 0, "por_estado": 0, "por_socket": 0, "por_ttl": 0, "duracion_total": 0.0}
+
+    def registrar(self, call_sid):
+        """Alta de una llamada (al marcarla o al abrir su stream)"""
+        ahora = time.monotonic()
+        with self._lock:
+            if call_sid not in self._llamadas:
+                self._llamadas[call_sid] = _Llamada(ahora)
+                self.stats["registradas"] += 1
+        self._barrer_si_toca(ahora)
+
+    def socket_abierto(self, call_sid, cerrar_socket=None):
+        """El stream de /media de la llamada está abierto; `cerrar_socket` lo corta si Twilio avisa el fin"""
+        self.registrar(call_sid)
+        with self._lock:
+            llamada = self._llamadas.get(call_sid)
+            if llamada:
+                llamada.socket = True
+                llamada.cerrar_socket = cerrar_socket
+                llamada.estado = "en-curso"
+
+    def actividad(self, call_sid):
+        """La llamada sigue viva (hubo un turno)"""
+        llamada = self._llamadas.get(call_sid)
+        if llamada:
+            llamada.ultima_actividad = time.monotonic()
+
+    def estado_twilio(self, call_sid, estado):
+        """Estado informado por el status callback de Twilio"""
+        with self._lock:
+            llamada = self._llamadas.get(call_sid)
+            if llamada:
+                llamada.estado = estado
+                llamada.ultima_actividad = time.monotonic()
+        if estado in ESTADOS_FINALES:
+            if llamada:
+                self._liberar(call_sid, "por_estado")
+            else:
+                # Con estado compartido la llamada pudo nacer en otro worker: liberar igual
+                self._al_liberar(call_sid)
+
+    def socket_cerrado(self, call_sid):
+        """El websocket de /media se cerró: la conversación terminó"""
+        self._liberar(call_sid, "por_socket")
+
+    def barrer(self):
+        """Libera las llamadas abandonadas (sin actividad más allá de su TTL)"""
+        ahora = time.monotonic()
+        with self._lock:
+            self._ultimo_barrido = ahora
+            vencidas = [
+                call_sid for call_sid, llamada in self._llamadas.items()
+                if ahora - llamada.ultima_actividad > (self.ttl_con_socket if llamada.socket else self.ttl_sin_socket)
+            ]
+        for call_sid in vencidas:
+            self._liberar(call_sid, "por_ttl")
+        if self._al_barrer:
+            self._al_barrer(self.ttl_con_socket)
+        return len(vencidas)
+
+    def obtener_stats(self):
+        """Llamadas vivas, memoria retenida y cómo se liberaron las anteriores"""
+        self._barrer_si_toca(time.monotonic())
+        with self._lock:
+            liberadas = self.stats["por_estado"] + self.stats["por_socket"] + self.stats["por_ttl"]
+            stats = {
+                "llamadas_vivas": len(self._llamadas),
+                "con_socket": sum(1 for llamada in self._llamadas.values() if llamada.socket),
+                "registradas": self.stats["registradas"],
+                "liberadas_por_estado": self.stats["por_estado"],
+                "liberadas_por_socket": self.stats["por_socket"],
+                "liberadas_por_ttl": self.stats["por_ttl"],
+                "duracion_media": round(self.stats["duracion_total"] / liberadas, 1) if liberadas else 0.0,
+            }
+        stats["bytes_retenidos"] = self._medir_memoria()
+        return stats
+
+    def _barrer_si_toca(self, ahora):
+        if ahora - self._ultimo_barrido >= INTERVALO_BARRIDO:
+            self.barrer()
+
+    def _liberar(self, call_sid, motivo):
+        with self._lock:
+            llamada = self._llamadas.pop(call_sid, None)
+            if not llamada:
+                return
+            self.stats[motivo] += 1
+            self.stats["duracion_total"] += time.monotonic() - llamada.inicio
+
+        # Twilio dio la llamada por terminada pero el stream sigue abierto: cortarlo
+        if llamada.socket and motivo != "por_socket" and llamada.cerrar_socket:
+            try:
+                llamada.cerrar_socket()
+            except Exception as e:
+                print(f"⚠️ No se pudo cerrar el stream de {call_sid}: {e}", flush=True)
+
+        if motivo == "por_ttl" and not llamada.socket and self.estado_compartido:
+            return  # El estado compartido se purga por antigüedad (al_barrer)
+
+        try:
+            self._al_liberar(call_sid)
+        except Exception as e:
+            print(f"⚠️ Error liberando la llamada {call_sid}: {e}", flush=True)
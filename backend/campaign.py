@@ -0,0 +1,306 @@
+import itertools
+import threading
+import time
+
+# ============================================
+# CONFIGURACIÓN DE CAMPAÑAS
+# ============================================
+LLAMADAS_POR_MINUTO = 30  # Ritmo de marcado por campaña
+MAX_SIMULTANEAS = 10  # Llamadas de una campaña en curso a la vez
+MAX_REINTENTOS = 2  # Reintentos por empleado si no contesta o está ocupado
+ESPERA_REINTENTO = 15 * 60  # Segundos hasta reintentar a quien no contestó
+MAX_DURACION_LLAMADA = 20 * 60  # Sin estado final tras este tiempo, se libera el cupo
+INTERVALO_MARCADOR = 0.2  # Segundos entre vueltas del marcador
+
+OCUPACION_MAX_SERVICIOS = 0.75  # Ocupación (en_curso / max_concurrencia) a partir de la cual no se marca
+SUAVIZADO_OCUPACION = 0.3  # Peso de la última medición en la media móvil
+
+# Estados de Twilio que cierran una llamada
+ESTADOS_SIN_RESPUESTA = {"no-answer", "busy"}
+ESTADOS_FALLIDOS = {"failed", "canceled"}
+ESTADOS_FINALES = {"completed"} | ESTADOS_SIN_RESPUESTA | ESTADOS_FALLIDOS
+
+
+class MedidorHolgura:
+    """
+    Decide si hay margen para admitir otra llamada a partir de lo medido en los
+    servicios (Whisper, Ollama, TTS) y en la cola de turnos:
+    - Ocupación suavizada de cada servicio por debajo de OCUPACION_MAX_SERVICIOS
+    - Ningún servicio saturado desde la última medición
+    - Ningún turno esperando trabajador
+    """
+    def __init__(self, obtener_servicios, obtener_turnos=None, ocupacion_max=OCUPACION_MAX_SERVICIOS):
+        self._obtener_servicios = obtener_servicios
+        self._obtener_turnos = obtener_turnos
+        self.ocupacion_max = ocupacion_max
+        self._ocupacion = {}
+        self._saturado = {}
+        self.ultimo_motivo = None
+
+    def hay_holgura(self):
+        motivo = None
+
+        for nombre, stats in self._obtener_servicios().items():
+            medida = stats["en_curso"] / max(1, stats["max_concurrencia"])
+            anterior = self._ocupacion.get(nombre, medida)
+            self._ocupacion[nombre] = anterior + SUAVIZADO_OCUPACION * (medida - anterior)
+
+            saturado_antes = self._saturado.get(nombre, stats["saturado"])
+            self._saturado[nombre] = stats["saturado"]
+
+            if stats["saturado"] > saturado_antes:
+                motivo = motivo or f"{nombre} saturado"
+            elif self._ocupacion[nombre] >= self.ocupacion_max:
+                motivo = motivo or f"{nombre} al {self._ocupacion[nombre]:.0%}"
+
+        if not motivo and self._obtener_turnos and self._obtener_turnos()["en_cola"] > 0:
+            motivo = "turnos en cola"
+
+        self.ultimo_motivo = motivo
+        return motivo is None
+
+    def obtener_stats(self):
+        return {
+            "ocupacion": {nombre: round(valor, 3) for nombre, valor in self._ocupacion.items()},
+            "motivo_espera": self.ultimo_motivo,
+        }
+
+
+class Campana:
+    """Una ola de llamadas: empleados a llamar, ritmo, cupo y progreso de cada uno"""
+    def __init__(self, id_campana, empleados, nombre=None, llamadas_por_minuto=LLAMADAS_POR_MINUTO,
+                 max_simultaneas=MAX_SIMULTANEAS, max_reintentos=MAX_REINTENTOS,
+                 espera_reintento=ESPERA_REINTENTO):
+        self.id = id_campana
+        self.nombre = nombre or id_campana
+        self.llamadas_por_minuto = llamadas_por_minuto
+        self.max_simultaneas = max_simultaneas
+        self.max_reintentos = max_reintentos
+        self.espera_reintento = espera_reintento
+
+        self.estado = "activa"  # activa, pausada, cancelada, terminada
+        self.creada = time.time()
+        self.proxima_llamada = 0.0  # monotonic: no marcar antes (ritmo)
+
+        # id de empleado -> progreso; el orden del dict es el orden de marcado
+        self.objetivos = {
+            id_empleado: {"estado": "pendiente", "intentos": 0, "call_sid": None,
+                          "ultimo_resultado": None, "reintentar_en": 0.0}
+            for id_empleado in empleados
+        }
+        self.en_curso = {}  # referencia del intento -> (id de empleado, momento del marcado)
+
+    def siguiente(self, ahora):
+        """Próximo empleado a marcar (pendiente o con reintento vencido), o None"""
+        for id_empleado, objetivo in self.objetivos.items():
+            if objetivo["estado"] == "pendiente":
+                return id_empleado
+            if objetivo["estado"] == "reintentar" and objetivo["reintentar_en"] <= ahora:
+                return id_empleado
+        return None
+
+    def terminada(self):
+        return all(o["estado"] in ("completada", "sin_respuesta", "fallida", "no_encontrado")
+                   for o in self.objetivos.values())
+
+    def resumen(self, detalle=False):
+        conteo = {}
+        for objetivo in self.objetivos.values():
+            conteo[objetivo["estado"]] = conteo.get(objetivo["estado"], 0) + 1
+
+        resumen = {
+            "id": self.id,
+            "nombre": self.nombre,
+            "estado": self.estado,
+            "creada": self.creada,
+            "total": len(self.objetivos),
+            "en_curso": len(self.en_curso),
+            "por_estado": conteo,
+            "intentos": sum(o["intentos"] for o in self.objetivos.values()),
+            "llamadas_por_minuto": self.llamadas_por_minuto,
+            "max_simultaneas": self.max_simultaneas,
+        }
+        if detalle:
+            resumen["empleados"] = {
+                id_empleado: {k: v for k, v in objetivo.items() if k != "reintentar_en"}
+                for id_empleado, objetivo in self.objetivos.items()
+            }
+        return resumen
+
+
+class MarcadorCampanas:
+    """
+    Marca las llamadas de las campañas activas en un hilo de fondo:
+    - Ritmo (llamadas por minuto) y cupo de llamadas simultáneas por campaña
+    - Solo admite una llamada nueva si `hay_holgura()` lo permite
+    - Reintenta más tarde a quien no contestó o estaba ocupado
+    El resultado de cada llamada llega por el status callback de Twilio
+    (`actualizar_estado`), con la referencia del intento en la URL: se
+    registra antes de marcar, así que un estado final que llegue antes de
+    que Twilio devuelva el CallSid igual encuentra su llamada.
+
+    El estado vive en este proceso: el marcador y los callbacks tienen que
+    correr en el mismo worker (app.py rechaza las campañas con varios workers).
+    """
+    def __init__(self, call_manager, hay_holgura=None):
+        self.call_manager = call_manager
+        self.hay_holgura = hay_holgura or (lambda: True)
+
+        self._lock = threading.Lock()
+        self._campanas = {}
+        self._por_referencia = {}  # referencia del intento -> campaña
+        self._contador = itertools.count(1)
+        self._hilo = None
+
+        self.stats = {"marcadas": 0, "errores_marcado": 0, "esperas_por_holgura": 0}
+
+    # ============================================
+    # API
+    # ============================================
+
+    def crear_campana(self, empleados, **opciones):
+        """Crea y arranca una campaña con una lista de IDs de empleado"""
+        with self._lock:
+            id_campana = f"camp-{next(self._contador)}"
+            campana = Campana(id_campana, list(dict.fromkeys(empleados)), **opciones)
+            self._campanas[id_campana] = campana
+        self._arrancar()
+        print(f"📣 Campaña {id_campana}: {len(campana.objetivos)} empleados", flush=True)
+        return campana
+
+    def obtener(self, id_campana):
+        return self._campanas.get(id_campana)
+
+    def listar(self):
+        with self._lock:
+            return [campana.resumen() for campana in self._campanas.values()]
+
+    def cambiar_estado(self, id_campana, accion):
+        """pausar, reanudar o cancelar una campaña; devuelve la campaña o None"""
+        nuevos = {"pausar": "pausada", "reanudar": "activa", "cancelar": "cancelada"}
+        with self._lock:
+            campana = self._campanas.get(id_campana)
+            if not campana or accion not in nuevos or campana.estado in ("cancelada", "terminada"):
+                return campana
+            campana.estado = nuevos[accion]
+        if campana.estado == "activa":
+            self._arrancar()
+        return campana
+
+    def actualizar_estado(self, referencia, estado_twilio):
+        """Registra el estado que informa Twilio para un intento de campaña"""
+        with self._lock:
+            campana = self._por_referencia.get(referencia)
+            if not campana:
+                return
+            if estado_twilio in ESTADOS_FINALES:
+                self._cerrar_llamada(campana, referencia, estado_twilio)
+            else:
+                id_empleado, _ = campana.en_curso.get(referencia, (None, None))
+                if id_empleado:
+                    campana.objetivos[id_empleado]["ultimo_resultado"] = estado_twilio
+
+    def obtener_stats(self):
+        with self._lock:
+            return dict(
+                self.stats,
+                campanas_activas=sum(1 for c in self._campanas.values() if c.estado == "activa"),
+                llamadas_en_curso=len(self._por_referencia),
+            )
+
+    # ============================================
+    # MARCADOR
+    # ============================================
+
+    def _arrancar(self):
+        with self._lock:
+            if self._hilo and self._hilo.is_alive():
+                return
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name='marcador')
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            with self._lock:
+                activas = [c for c in self._campanas.values() if c.estado == "activa"]
+                if not activas:
+                    self._hilo = None
+                    return
+            for campana in activas:
+                self._marcar_siguiente(campana)
+            time.sleep(INTERVALO_MARCADOR)
+
+    def _marcar_siguiente(self, campana):
+        ahora = time.monotonic()
+
+        with self._lock:
+            self._liberar_colgadas(campana, ahora)
+            if campana.terminada():
+                campana.estado = "terminada"
+                print(f"🏁 Campaña {campana.id} terminada: {campana.resumen()['por_estado']}", flush=True)
+                return
+            if ahora < campana.proxima_llamada or len(campana.en_curso) >= campana.max_simultaneas:
+                return
+            id_empleado = campana.siguiente(ahora)
+            if id_empleado is None:
+                return
+
+        if not self.hay_holgura():
+            self.stats["esperas_por_holgura"] += 1
+            return
+
+        empleado = self.call_manager.obtener_empleado(id_empleado)
+        with self._lock:
+            objetivo = campana.objetivos[id_empleado]
+            if not empleado:
+                objetivo["estado"] = "no_encontrado"
+                return
+            objetivo["estado"] = "llamando"
+            objetivo["intentos"] += 1
+            campana.proxima_llamada = ahora + 60.0 / campana.llamadas_por_minuto
+            referencia = f"{campana.id}.{id_empleado}.{objetivo['intentos']}"
+            campana.en_curso[referencia] = (id_empleado, ahora)
+            self._por_referencia[referencia] = campana
+
+        call_sid = self.call_manager.iniciar_llamada(empleado, {"referencia_campana": referencia})
+
+        with self._lock:
+            self.stats["marcadas"] += 1
+            if not call_sid:
+                self.stats["errores_marcado"] += 1
+                campana.en_curso.pop(referencia, None)
+                self._por_referencia.pop(referencia, None)
+                self._programar_reintento(campana, objetivo, "error_marcado")
+                return
+            objetivo["call_sid"] = call_sid
+
+    def _cerrar_llamada(self, campana, referencia, estado_twilio):
+        """Cierra un intento de campaña (llamar con el lock tomado)"""
+        id_empleado, _ = campana.en_curso.pop(referencia, (None, None))
+        self._por_referencia.pop(referencia, None)
+        if not id_empleado:
+            return
+
+        objetivo = campana.objetivos[id_empleado]
+        if estado_twilio == "completed":
+            objetivo["estado"] = "completada"
+            objetivo["ultimo_resultado"] = estado_twilio
+        elif estado_twilio in ESTADOS_SIN_RESPUESTA:
+            self._programar_reintento(campana, objetivo, estado_twilio)
+        else:
+            objetivo["estado"] = "fallida"
+            objetivo["ultimo_resultado"] = estado_twilio
+
+    def _programar_reintento(self, campana, objetivo, resultado):
+        objetivo["ultimo_resultado"] = resultado
+        if objetivo["intentos"] > campana.max_reintentos:
+            objetivo["estado"] = "sin_respuesta"
+        else:
+            objetivo["estado"] = "reintentar"
+            objetivo["reintentar_en"] = time.monotonic() + campana.espera_reintento
+
+    def _liberar_colgadas(self, campana, ahora):
+        """Libera el cupo de llamadas sin estado final tras MAX_DURACION_LLAMADA"""
+        for referencia, (_, marcada) in list(campana.en_curso.items()):
+            if ahora - marcada > MAX_DURACION_LLAMADA:
+                self._cerrar_llamada(campana, referencia, "failed")
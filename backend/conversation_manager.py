@@ -1,14 +1,65 @@
-import requests
-import requests
+import os
 import threading
+import json
+import re
+import time
+import functools
+import http_clients
+from faq_index import IndiceFAQ
+from llm_metrics import MetricasPrompt
+from state_store import Conversacion, crear_almacen
 
-class ConversationManager:
-    def __init__(self):
+# Fin de frase: puntuación final seguida de espacio (el texto que sigue ya llegó)
+FIN_DE_FRASE = re.compile(r'(?<=[.!?])\s+')
+MAX_FRASES_RESPUESTA = 2
+PREGUNTA_SEGUIMIENTO = "¿Hay algo más en lo que pueda ayudarte?"
+PALABRAS_DESPEDIDA = ["no", "nada", "todo", "gracias", "eso es todo", "hasta luego"]
+RESPUESTA_DESPEDIDA = "Perfecto. Fue un placer hablar contigo. ¡Te esperamos en tu primer día! Hasta pronto."
+RESPUESTA_NO_IDENTIFICADO = "Lamento la confusión. Disculpa las molestias. Que tengas un buen día."
+RESPUESTA_DESPEDIDA_FINAL = "Fue un gusto hablar contigo. ¡Hasta pronto!"
+RESPUESTA_ERROR = "Lo siento, ha ocurrido un error. Por favor, contacta con RRHH."
+MAX_HISTORIAL = 20  # Mensajes guardados por llamada (el contexto del LLM no da para más)
+MENSAJES_FIJOS = 2  # Primeros mensajes que nunca se recortan: cabeza estable del prompt
+RECORTE_HISTORIAL = 8  # Mensajes que se descartan de una vez al pasar MAX_HISTORIAL
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memoria')  # 'memoria' (un worker) o 'sqlite' (varios workers por nodo)
 
-        self._precargar_modelo()
+# Ollama: mismas opciones en la precarga y en cada turno. Si num_ctx o num_thread
+# cambian entre pedidos, Ollama recarga el modelo y se pierde el prefijo cacheado
+MODELO_OLLAMA = "phi4-mini"
+OPCIONES_OLLAMA = {
+    "temperature": 0.7,
+    "num_predict": 80,
+    "num_ctx": 2048,
+    "num_thread": 4,
+}
+MAX_PROMPTS_CACHEADOS = 256  # Prompts de sistema por empleado guardados (uno por llamada en curso)
+INSTRUCCION_BREVEDAD = "IMPORTANTE: Tus respuestas deben ser MUY BREVES (máximo 2-3 oraciones cortas). Esto es una llamada telefónica, no un email."
+
+# Plantillas con campos del empleado ({nombre}, {dni}, {puesto}, {fecha_inicio})
+PLANTILLA_MENSAJE_INICIAL = "Hola, te habla el asistente inteligente de la empresa SEILS LAND. ¿Eres {nombre}?"
+PLANTILLA_REVERIFICACION = "Hola, te saluda el asistente inteligente de la empresa SALESLAND, ¿podrías confirmar si tu nombre es {nombre} y tu DNI es el {dni}?"
+PLANTILLA_BIENVENIDA = """¡Te llamamos para darte la bienvenida a nuestra gran familia SALESLAND! Estamos muy felices de contar contigo como {puesto}. Tu fecha de inicio es el {fecha_inicio}. 
+¿Hay algo en lo que pueda ayudarte sobre tu incorporación?"""
+
+def agregar_al_historial(historial, rol, contenido):
+    """
+    Agrega un mensaje al historial. Al pasar MAX_HISTORIAL descarta de una vez
+    RECORTE_HISTORIAL mensajes justo después de la cabeza: entre recortes el
+    historial solo crece, así que el prefijo del prompt no cambia y Ollama lo
+    reutiliza. Devuelve True si recortó (ese turno re-evalúa el prompt).
+    """
+    historial.append((rol, contenido))
+    if len(historial) <= MAX_HISTORIAL:
+        return False
+    del historial[MENSAJES_FIJOS:MENSAJES_FIJOS + RECORTE_HISTORIAL]
+    return True
+
+
+class ConversationManager:
+    def __init__(self, almacen=None):
 
-        # Almacena el estado de cada conversación por call_sid
-        self.conversaciones = {}
+        # Almacena el estado de cada conversación por call_sid (compartible entre procesos)
+        self.almacen = almacen or crear_almacen(STATE_BACKEND)
         
         # Información de la empresa
         self.info_empresa = {
@@ -17,30 +68,74 @@ class ConversationManager:
             "portal": "https://peru.salesland.net:8088/salesland-autoservicios-web",
             "onboarding": "Debes acercarte a la oficina en tu fecha de inicio, en el horario correspondiente. Preséntate en recepción y serás asistido por nuestro personal de RRHH o tu Jefe de Área."
         }
+        
+        # Respuestas de emergencia si Ollama falla
+        self.respuestas_fallback = {
+            "horario": f"El horario es {self.info_empresa['horarios']}. ¿Algo más?",
+            "ubicacion": f"La oficina está en {self.info_empresa['ubicacion']}. ¿Necesitas algo más?",
+            "onboarding": f"{self.info_empresa['onboarding']} ¿Tienes otra pregunta?",
+            "portal": f"El portal del empleado está en {self.info_empresa['portal']}. ¿Algo más?",
+            "general": "Para más información, te sugiero revisar el portal del empleado o consultar con RRHH. ¿Algo más?"
+        }
+        
+        # Prompt del sistema: prefijo común a todas las llamadas + datos del empleado
+        self.prefijo_sistema = self._armar_prefijo_sistema()
+        self._prompt_por_empleado = functools.lru_cache(maxsize=MAX_PROMPTS_CACHEADOS)(self._armar_prompt_sistema)
+        self.metricas_prompt = MetricasPrompt()
+        
+        # Preguntas frecuentes contestadas al instante (sin LLM) con las mismas respuestas
+        self.indice_faq = IndiceFAQ(self.respuestas_fallback)
+        
+        self._precargar_modelo()
     
     def iniciar_conversacion(self, call_sid, empleado):
         """Inicia una nueva conversación"""
-        self.conversaciones[call_sid] = {
-            "empleado": empleado,
-            "etapa": "verificacion",  # verificacion, bienvenida, preguntas, despedida
-            "identificado": False,
-            "historial": []
-        }
+        self.almacen.crear(call_sid, Conversacion(empleado))
     
     def obtener_conversacion(self, call_sid):
-        """Obtiene el estado actual de la conversación"""
-        return self.conversaciones.get(call_sid)
+        """Obtiene el estado actual de la conversación (solo lectura)"""
+        return self.almacen.obtener(call_sid)
+    
+    def finalizar_conversacion(self, call_sid):
+        """Libera el estado de una llamada que terminó"""
+        return self.almacen.borrar(call_sid)
+    
+    def contar_conversaciones(self):
+        return self.almacen.contar()
+    
+    def memoria_retenida(self):
+        """Bytes aproximados que ocupan las conversaciones guardadas"""
+        return self.almacen.memoria_retenida()
     
     def agregar_mensaje(self, call_sid, rol, contenido):
-        """Agrega un mensaje al historial"""
-        if call_sid in self.conversaciones:
-            self.conversaciones[call_sid]["historial"].append({
-                "role": rol,
-                "content": contenido
-            })
+        """Agrega un mensaje al historial (se recorta por bloques, ver agregar_al_historial)"""
+        recortado = []
+        self.almacen.actualizar(
+            call_sid, lambda conv: recortado.append(agregar_al_historial(conv.historial, rol, contenido))
+        )
+        if any(recortado):
+            self.metricas_prompt.registrar_recorte()
+    
+    def _cambiar_etapa(self, call_sid, etapa, identificado=None):
+        """Avanza la etapa (si la llamada ya se liberó no hace nada)"""
+        def cambiar(conv):
+            conv.etapa = etapa
+            if identificado is not None:
+                conv.identificado = identificado
+        self.almacen.actualizar(call_sid, cambiar)
     
     def generar_prompt_sistema(self, empleado):
-        """Genera el prompt del sistema para el LLM"""
+        """
+        Prompt del sistema para el LLM. Se arma una sola vez por empleado (por
+        llamada): el texto es idéntico en todos los turnos y Ollama reutiliza
+        el prefijo ya evaluado.
+        """
+        return self._prompt_por_empleado(
+            empleado['nombre'], empleado['dni'], empleado['puesto'], empleado['fecha_inicio']
+        )
+    
+    def _armar_prefijo_sistema(self):
+        """Parte del prompt común a todas las llamadas (va primero para compartir el prefijo)"""
         return f"""Eres un asistente virtual de recursos humanos de la empresa SALESLAND (pronunciado seils land), una empresa peruana.
 
 Tu rol es contactar telefónicamente a nuevos empleados para:
@@ -48,12 +143,6 @@ Tu rol es contactar telefónicamente a nuevos empleados para:
 2. Darles la BIENVENIDA con entusiasmo
 3. Responder PREGUNTAS sobre su incorporación
 
-INFORMACIÓN DEL EMPLEADO:
-- Nombre: {empleado['nombre']}
-- DNI: {empleado['dni']}
-- Puesto: {empleado['puesto']}
-- Fecha de inicio: {empleado['fecha_inicio']}
-
 INFORMACIÓN DE LA EMPRESA:
 - Horarios: {self.info_empresa['horarios']}
 - Ubicación: {self.info_empresa['ubicacion']}
@@ -65,21 +154,53 @@ INSTRUCCIONES:
 2. Si responde SÍ y confirma datos → Dar bienvenida efusiva y mencionar su puesto y fecha de inicio
 3. Si responde NO → Disculparte amablemente y despedirte
 4. Después de la bienvenida, preguntar si tiene dudas
-5. Responder preguntas SOLO con la información proporcionada arriba
+5. Responder preguntas SOLO con la información proporcionada
 6. Si no sabes algo, dirígelo al portal o a presentarse en la oficina
 7. Mantén un tono AMABLE, PROFESIONAL y ENTUSIASTA
 8. Sé BREVE (respuestas de 2-4 oraciones máximo)
 
-NO INVENTES información que no tengas. Si no sabes, deriva al portal o a RRHH."""
+NO INVENTES información que no tengas. Si no sabes, deriva al portal o a RRHH.
+
+{INSTRUCCION_BREVEDAD}"""
+    
+    def _armar_prompt_sistema(self, nombre, dni, puesto, fecha_inicio):
+        return f"""{self.prefijo_sistema}
+
+INFORMACIÓN DEL EMPLEADO:
+- Nombre: {nombre}
+- DNI: {dni}
+- Puesto: {puesto}
+- Fecha de inicio: {fecha_inicio}"""
+    
+    def _mensajes_chat(self, call_sid, empleado):
+        """
+        Mensajes para /api/chat: prompt del sistema fijo + historial que solo
+        crece, así cada turno empieza con los tokens del turno anterior
+        """
+        conv = self.obtener_conversacion(call_sid)
+        historial = conv.mensajes() if conv else []
+        return [{"role": "system", "content": self.generar_prompt_sistema(empleado)}] + historial
+    
+    def _pedir_chat(self, messages, stream):
+        return http_clients.ollama.post(
+            "/api/chat",
+            json={
+                "model": MODELO_OLLAMA,
+                "messages": messages,
+                "stream": stream,
+                "options": OPCIONES_OLLAMA,
+            },
+            stream=stream
+        )
 
     def procesar_respuesta(self, call_sid, texto_usuario):
         """Procesa la respuesta del usuario y genera la siguiente respuesta"""
         conv = self.obtener_conversacion(call_sid)
         if not conv:
-            return "Lo siento, ha ocurrido un error. Por favor, contacta con RRHH."
+            return RESPUESTA_ERROR
         
-        etapa = conv["etapa"]
-        empleado = conv["empleado"]
+        etapa = conv.etapa
+        empleado = conv.empleado
         
         # Agregar respuesta del usuario al historial
         self.agregar_mensaje(call_sid, "user", texto_usuario)
@@ -100,25 +221,23 @@ NO INVENTES información que no tengas. Si no sabes, deriva al portal o a RRHH."
         
         # Detectar confirmación
         if any(word in respuesta_lower for word in ["sí", "si", "yes", "correcto", "soy yo", empleado['nombre'].lower()]):
-            self.conversaciones[call_sid]["identificado"] = True
-            self.conversaciones[call_sid]["etapa"] = "bienvenida"
+            self._cambiar_etapa(call_sid, "bienvenida", identificado=True)
             return self.dar_bienvenida(call_sid, empleado)
         
         # Detectar negación
         elif any(word in respuesta_lower for word in ["no", "equivocado", "error", "incorrecto"]):
-            self.conversaciones[call_sid]["etapa"] = "despedida"
-            return "Lamento la confusión. Disculpa las molestias. Que tengas un buen día."
+            self._cambiar_etapa(call_sid, "despedida")
+            return RESPUESTA_NO_IDENTIFICADO
         
         # Respuesta ambigua - preguntar de nuevo
         else:
-            return f"Hola, te saluda el asistente inteligente de la empresa SALESLAND, ¿podrías confirmar si tu nombre es {empleado['nombre']} y tu DNI es el {empleado['dni']}?"
+            return PLANTILLA_REVERIFICACION.format(**empleado)
     
     def dar_bienvenida(self, call_sid, empleado):
         """Da la bienvenida al empleado"""
-        self.conversaciones[call_sid]["etapa"] = "preguntas"
+        self._cambiar_etapa(call_sid, "preguntas")
         
-        bienvenida = f"""¡Te llamamos para darte la bienvenida a nuestra gran familia SALESLAND! Estamos muy felices de contar contigo como {empleado['puesto']}. Tu fecha de inicio es el {empleado['fecha_inicio']}. 
-¿Hay algo en lo que pueda ayudarte sobre tu incorporación?"""
+        bienvenida = PLANTILLA_BIENVENIDA.format(**empleado)
         
         self.agregar_mensaje(call_sid, "assistant", bienvenida)
         return bienvenida
@@ -152,41 +271,27 @@ NO INVENTES información que no tengas. Si no sabes, deriva al portal o a RRHH."
     def responder_pregunta(self, call_sid, pregunta, empleado):
         """Responde preguntas usando Ollama (phi4-mini)"""
         
-        conv = self.conversaciones[call_sid]
-        historial = conv["historial"]
-        
-        # Generar prompt del sistema (MÁS ESTRICTO)
-        system_prompt = self.generar_prompt_sistema(empleado)
-        
-        # 🆕 AGREGAR INSTRUCCIÓN DE BREVEDAD
-        system_prompt += "\n\nIMPORTANTE: Tus respuestas deben ser MUY BREVES (máximo 2-3 oraciones cortas). Esto es una llamada telefónica, no un email."
+        if not self._es_despedida(pregunta):
+            respuesta_faq = self._responder_faq(call_sid, pregunta)
+            if respuesta_faq:
+                return respuesta_faq
         
-        messages = [
-            {"role": "system", "content": system_prompt}
-        ] + historial
+        # Prompt del sistema (cacheado por empleado) + historial
+        messages = self._mensajes_chat(call_sid, empleado)
         
-        print(f"🧠 Llamando a Ollama con {len(historial)} mensajes de historial", flush=True)
+        print(f"🧠 Llamando a Ollama con {len(messages) - 1} mensajes de historial", flush=True)
         
         try:
-            response = requests.post(
-                "http://ollama:11434/api/chat",
-                json={
-                    "model": "phi4-mini",
-                    "messages": messages,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "num_predict": 80,  # 🔥 Reducir de 80 a 60 tokens
-                        "num_ctx": 2048,
-                        "num_thread": 4 
-                    }
-                },
-                timeout=60
-            )
+            inicio = time.monotonic()
+            response = self._pedir_chat(messages, stream=False)
             
             if response.status_code == 200:
                 respuesta_json = response.json()
                 respuesta_texto = respuesta_json.get("message", {}).get("content", "")
+                self.metricas_prompt.registrar(messages, respuesta_json, texto_generado=respuesta_texto)
+                self.indice_faq.registrar_llm(time.monotonic() - inicio)
+                print(f"🧠 Prompt: {respuesta_json.get('prompt_eval_count', '?')} tokens evaluados "
+                      f"en {time.monotonic() - inicio:.2f}s", flush=True)
                 
                 print(f"🧠 Ollama respondió: {respuesta_texto}", flush=True)
                 
@@ -199,12 +304,12 @@ NO INVENTES información que no tengas. Si no sabes, deriva al portal o a RRHH."
                     respuesta_texto = '. '.join(sentences[:2]) + '.'
                 
                 # Detectar despedida
-                if any(word in pregunta.lower() for word in ["no", "nada", "todo", "gracias", "eso es todo", "hasta luego"]):
-                    self.conversaciones[call_sid]["etapa"] = "despedida"
-                    respuesta_texto = "Perfecto. Fue un placer hablar contigo. ¡Te esperamos en tu primer día! Hasta pronto."
+                if self._es_despedida(pregunta):
+                    self._cambiar_etapa(call_sid, "despedida")
+                    respuesta_texto = RESPUESTA_DESPEDIDA
                 else:
                     if "?" not in respuesta_texto:
-                        respuesta_texto += " ¿Hay algo más en lo que pueda ayudarte?"
+                        respuesta_texto += " " + PREGUNTA_SEGUIMIENTO
                 
                 self.agregar_mensaje(call_sid, "assistant", respuesta_texto)
                 return respuesta_texto
@@ -215,30 +320,175 @@ NO INVENTES información que no tengas. Si no sabes, deriva al portal o a RRHH."
             print(f"❌ Error llamando a Ollama: {e}", flush=True)
             return self._respuesta_fallback(call_sid, pregunta, empleado)
 
+    def procesar_respuesta_streaming(self, call_sid, texto_usuario, cancelado=None, al_generar=None):
+        """
+        Igual que procesar_respuesta, pero es un generador que entrega la
+        respuesta frase por frase. En la etapa de preguntas las frases salen
+        a medida que Ollama genera tokens; en las demás etapas se entrega
+        la respuesta completa de una vez. Si `cancelado` (threading.Event)
+        se activa, la generación se corta (barge-in).
+        `al_generar(segundos)` recibe la duración de la generación de Ollama
+        (ver responder_pregunta_streaming).
+        """
+        conv = self.obtener_conversacion(call_sid)
+        if not conv or conv.etapa != "preguntas":
+            yield self.procesar_respuesta(call_sid, texto_usuario)
+            return
+        
+        self.agregar_mensaje(call_sid, "user", texto_usuario)
+        yield from self.responder_pregunta_streaming(call_sid, texto_usuario, conv.empleado, cancelado, al_generar)
+
+    def responder_pregunta_streaming(self, call_sid, pregunta, empleado, cancelado=None, al_generar=None):
+        """
+        Responde preguntas con Ollama en modo streaming.
+        Aplica las mismas reglas que responder_pregunta, pero de forma incremental:
+        - Despedida: se detecta en la pregunta, así que no se llama al LLM
+        - Máximo MAX_FRASES_RESPUESTA frases: al completarlas se corta la generación
+        - Si ninguna frase fue una pregunta, se agrega PREGUNTA_SEGUIMIENTO al final
+        Si Ollama respondió, llama a `al_generar(segundos)` con lo que tardó la
+        generación: la que informa Ollama en el último objeto del stream, que no
+        depende de cuán rápido se consumen las frases, o hasta el corte.
+        """
+        if self._es_despedida(pregunta):
+            self._cambiar_etapa(call_sid, "despedida")
+            self.agregar_mensaje(call_sid, "assistant", RESPUESTA_DESPEDIDA)
+            yield RESPUESTA_DESPEDIDA
+            return
+        
+        respuesta_faq = self._responder_faq(call_sid, pregunta)
+        if respuesta_faq:
+            yield respuesta_faq
+            return
+        
+        messages = self._mensajes_chat(call_sid, empleado)
+        
+        print(f"🧠 Llamando a Ollama (streaming) con {len(messages) - 1} mensajes de historial", flush=True)
+        
+        frases = []
+        # Último objeto del stream (trae prompt_eval_count) y segundos hasta el primer token
+        metricas = {"inicio": time.monotonic(), "final": None, "primer_token": None, "texto": "", "generacion": None}
+        try:
+            try:
+                response = self._pedir_chat(messages, stream=True)
+                
+                if response.status_code != 200:
+                    response.close()
+                    raise RuntimeError(f"Ollama respondió {response.status_code}")
+                
+                with response:
+                    for frase in self._frases_desde_tokens(response, cancelado, metricas):
+                        if not frases:
+                            primera_frase = time.monotonic() - metricas["inicio"]
+                        frases.append(frase)
+                        yield frase
+                        if len(frases) >= MAX_FRASES_RESPUESTA:
+                            # Cortar la generación: el resto no se va a decir
+                            break
+                if frases:
+                    self.indice_faq.registrar_llm(primera_frase, time.monotonic() - metricas["inicio"])
+            
+            except Exception as e:
+                print(f"❌ Error en streaming de Ollama: {e}", flush=True)
+                if not frases:
+                    # Aún no se dijo nada: usar las respuestas de emergencia
+                    yield self._respuesta_fallback(call_sid, pregunta, empleado)
+                    return
+            
+            if cancelado is not None and cancelado.is_set():
+                return
+            
+            if not any("?" in frase for frase in frases):
+                frases.append(PREGUNTA_SEGUIMIENTO)
+                yield PREGUNTA_SEGUIMIENTO
+        
+        finally:
+            # Guardar en el historial lo que efectivamente se entregó
+            if frases:
+                self.agregar_mensaje(call_sid, "assistant", " ".join(frases))
+            if metricas["primer_token"] is not None:
+                self.metricas_prompt.registrar(messages, metricas["final"], metricas["primer_token"], metricas["texto"])
+                if al_generar is not None:
+                    # Sin "done" la generación se cortó (máximo de frases, barge-in o error)
+                    al_generar(metricas["generacion"] or time.monotonic() - metricas["inicio"])
+
+    @staticmethod
+    def _frases_desde_tokens(response, cancelado=None, metricas=None):
+        """
+        Agrupa los tokens del stream NDJSON de Ollama en frases completas.
+        Si se pasa `metricas` (dict), anota el primer token, el texto generado,
+        el último objeto del stream (done), que trae las métricas del prompt, y
+        la duración de la generación.
+        """
+        pendiente = ""
+        for linea in response.iter_lines():
+            if cancelado is not None and cancelado.is_set():
+                return
+            if not linea:
+                continue
+            
+            data = json.loads(linea)
+            contenido = data.get("message", {}).get("content", "")
+            pendiente += contenido
+            
+            if metricas is not None:
+                if metricas["primer_token"] is None:
+                    metricas["primer_token"] = time.monotonic() - metricas["inicio"]
+                metricas["texto"] += contenido
+                if data.get("done"):
+                    metricas["final"] = data
+                    # total_duration (ns) lo mide Ollama: no incluye el tiempo que el
+                    # consumidor tardó en pedir frases (cola de TTS llena)
+                    metricas["generacion"] = (data.get("total_duration", 0) / 1e9
+                                              or time.monotonic() - metricas["inicio"])
+            
+            partes = FIN_DE_FRASE.split(pendiente)
+            for frase in partes[:-1]:
+                if frase.strip():
+                    yield frase.strip()
+            pendiente = partes[-1]
+            
+            if data.get("done"):
+                break
+        
+        if pendiente.strip():
+            yield pendiente.strip()
+
+    def _responder_faq(self, call_sid, pregunta):
+        """Respuesta del índice de preguntas frecuentes (o None: se consulta al LLM)"""
+        respuesta = self.indice_faq.responder(pregunta)
+        if respuesta:
+            self.agregar_mensaje(call_sid, "assistant", respuesta)
+        return respuesta
+
+    @staticmethod
+    def _es_despedida(pregunta):
+        """Detecta si el usuario se está despidiendo"""
+        return any(word in pregunta.lower() for word in PALABRAS_DESPEDIDA)
+
     def _respuesta_fallback(self, call_sid, pregunta, empleado):
         """Respuestas de emergencia si Ollama falla"""
         pregunta_lower = pregunta.lower()
         
         if "horario" in pregunta_lower:
-            respuesta = f"El horario es {self.info_empresa['horarios']}. ¿Algo más?"
+            respuesta = self.respuestas_fallback["horario"]
         elif "ubicacion" in pregunta_lower or "dirección" in pregunta_lower or "direccion" in pregunta_lower:
-            respuesta = f"La oficina está en {self.info_empresa['ubicacion']}. ¿Necesitas algo más?"
+            respuesta = self.respuestas_fallback["ubicacion"]
         elif "primer día" in pregunta_lower or "inicio" in pregunta_lower:
-            respuesta = f"{self.info_empresa['onboarding']} ¿Tienes otra pregunta?"
+            respuesta = self.respuestas_fallback["onboarding"]
         elif "portal" in pregunta_lower:
-            respuesta = f"El portal del empleado está en {self.info_empresa['portal']}. ¿Algo más?"
+            respuesta = self.respuestas_fallback["portal"]
         elif "no" in pregunta_lower or "nada" in pregunta_lower:
-            self.conversaciones[call_sid]["etapa"] = "despedida"
-            respuesta = "Perfecto. Fue un placer hablar contigo. ¡Te esperamos en tu primer día! Hasta pronto."
+            self._cambiar_etapa(call_sid, "despedida")
+            respuesta = RESPUESTA_DESPEDIDA
         else:
-            respuesta = "Para más información, te sugiero revisar el portal del empleado o consultar con RRHH. ¿Algo más?"
+            respuesta = self.respuestas_fallback["general"]
         
         self.agregar_mensaje(call_sid, "assistant", respuesta)
         return respuesta
     
     def despedirse(self, call_sid):
         """Despedida final"""
-        return "Fue un gusto hablar contigo. ¡Hasta pronto!"
+        return RESPUESTA_DESPEDIDA_FINAL
     
 
     def _precargar_modelo(self):
@@ -246,18 +496,20 @@ NO INVENTES información que no tengas. Si no sabes, deriva al portal o a RRHH."
         
         def cargar():
             try:
-                print("🔄 Pre-cargando modelo phi4-mini en Ollama...", flush=True)
-                response = requests.post(
-                    "http://ollama:11434/api/generate",
+                print(f"🔄 Pre-cargando modelo {MODELO_OLLAMA} en Ollama...", flush=True)
+                # Mismas opciones que los turnos (no fuerza recarga) y el prefijo
+                # común del prompt, que queda evaluado en el KV cache
+                response = http_clients.ollama.post(
+                    "/api/chat",
                     json={
-                        "model": "phi4-mini",
-                        "prompt": "Hola",
-                        "stream": False
-                    },
-                    timeout=60
+                        "model": MODELO_OLLAMA,
+                        "messages": [{"role": "system", "content": self.prefijo_sistema}],
+                        "stream": False,
+                        "options": dict(OPCIONES_OLLAMA, num_predict=1)
+                    }
                 )
                 if response.status_code == 200:
-                    print("✅ Modelo phi4-mini pre-cargado exitosamente", flush=True)
+                    print(f"✅ Modelo {MODELO_OLLAMA} pre-cargado exitosamente", flush=True)
                 else:
                     print(f"⚠️ No se pudo pre-cargar el modelo: {response.status_code}", flush=True)
             except Exception as e:
@@ -268,6 +520,24 @@ NO INVENTES información que no tengas. Si no sabes, deriva al portal o a RRHH."
         thread.start()
 
     
+    def frases_fijas(self):
+        """Frases que el bot dice siempre igual (candidatas a pre-renderizarse)"""
+        return [
+            RESPUESTA_DESPEDIDA,
+            RESPUESTA_NO_IDENTIFICADO,
+            RESPUESTA_DESPEDIDA_FINAL,
+            RESPUESTA_ERROR,
+            PREGUNTA_SEGUIMIENTO,
+        ] + list(self.respuestas_fallback.values())
+
+    def plantillas(self):
+        """Frases con campos del empleado ({nombre}, {dni}, {puesto}, {fecha_inicio})"""
+        return [
+            PLANTILLA_MENSAJE_INICIAL,
+            PLANTILLA_REVERIFICACION,
+            PLANTILLA_BIENVENIDA,
+        ]
+
     def obtener_mensaje_inicial(self, empleado):
         """Mensaje inicial de verificación"""
-        return f"Hola, te habla el asistente inteligente de la empresa SEILS LAND. ¿Eres {empleado['nombre']}?"
\ No newline at end of file
+        return PLANTILLA_MENSAJE_INICIAL.format(**empleado)
\ No newline at end of file
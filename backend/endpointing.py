@@ -0,0 +1,113 @@
+from collections import deque
+
+import numpy as np
+
+# ============================================
+# CONFIGURACIÓN DE ENDPOINTING (frames de 20ms)
+# ============================================
+FRAME_SEGUNDOS = 0.02
+SILENCIO_BASE = 1.8  # Segundos de silencio para cerrar un turno normal
+SILENCIO_RESPUESTA_CORTA = 0.6  # En verificación, tras un "sí"/"no" corto
+FRAMES_RESPUESTA_CORTA = 60  # 1.2s de voz como máximo para considerarla respuesta corta
+MAX_FRAMES_TURNO = 750  # 15s: tope duro de un turno
+VENTANA_CORTE_FALSO = 35  # 700ms: si vuelve a hablar antes, el corte fue prematuro
+
+VENTANA_RUIDO = 250  # 5s de RMS para estimar el piso de ruido
+PERCENTIL_RUIDO = 10  # Las pausas entre palabras dejan ver el ruido aun hablando
+FACTOR_RUIDO = 2.5  # Umbral de voz = piso de ruido * factor (~8dB)
+UMBRAL_MIN = 300
+UMBRAL_MAX = 6000
+FRAMES_RECALIBRAR = 25  # Recalcular el piso cada 500ms
+
+
+class Endpointer:
+    """
+    Detección adaptativa de fin de turno por llamada:
+    - Calibra el piso de ruido de la línea y ajusta el umbral del VAD
+    - Acorta la espera en verificación para respuestas cortas ("sí", "no")
+    - Impone un tope duro a la duración del turno
+    - Mide la latencia de endpointing y los cortes prematuros
+    """
+    def __init__(self, motor_vad, obtener_etapa=None, silencio_base=SILENCIO_BASE):
+        self.vad = motor_vad
+        self.obtener_etapa = obtener_etapa or (lambda: None)
+        self.silencio_base = silencio_base
+
+        self._rms = deque(maxlen=VENTANA_RUIDO)
+        self.piso_ruido = None
+        self._frame = 0  # contador global de frames de la llamada
+        self._frames_voz = 0  # frames con voz en el turno actual
+        self._ultimo_corte = None  # frame del último fin de turno
+        self._etapa = None  # etapa de la conversación, consultada una vez por turno
+
+        self.stats = {
+            "turnos": 0,
+            "cortes_por_silencio": 0,
+            "cortes_por_tope": 0,
+            "cortes_falsos": 0,
+            "espera_total": 0.0,
+        }
+
+    def observar(self, voz_cruda, hablando):
+        """Se llama con cada frame, después de que el VAD lo procesó"""
+        self._frame += 1
+        self._rms.append(self.vad.ultimo_rms)
+
+        if hablando and voz_cruda:
+            self._frames_voz += 1
+
+        # Volvió a hablar justo después de un corte: el turno se cortó antes de tiempo
+        if voz_cruda and self._ultimo_corte is not None:
+            if self._frame - self._ultimo_corte <= VENTANA_CORTE_FALSO:
+                self.stats["cortes_falsos"] += 1
+            self._ultimo_corte = None
+
+        if self._frame % FRAMES_RECALIBRAR == 0:
+            self._recalibrar()
+
+    def frames_silencio_necesarios(self):
+        """Frames de silencio para cerrar el turno según etapa y largo de la respuesta"""
+        if self._etapa is None:
+            self._etapa = self.obtener_etapa() or ""
+        segundos = self.silencio_base
+        if self._etapa == "verificacion" and self._frames_voz <= FRAMES_RESPUESTA_CORTA:
+            segundos = SILENCIO_RESPUESTA_CORTA
+        return int(segundos / FRAME_SEGUNDOS)
+
+    def turno_terminado(self, silent_chunks, frames_turno):
+        """Decide si el turno terminó; registra el corte si es así"""
+        if frames_turno >= MAX_FRAMES_TURNO:
+            self._registrar_corte("cortes_por_tope", silent_chunks)
+            return True
+
+        if frames_turno and silent_chunks >= self.frames_silencio_necesarios():
+            self._registrar_corte("cortes_por_silencio", silent_chunks)
+            return True
+
+        return False
+
+    def resumen(self):
+        """Métricas de endpointing de la llamada"""
+        turnos = self.stats["turnos"]
+        return {
+            "turnos": turnos,
+            "cortes_por_silencio": self.stats["cortes_por_silencio"],
+            "cortes_por_tope": self.stats["cortes_por_tope"],
+            "cortes_falsos": self.stats["cortes_falsos"],
+            "tasa_cortes_falsos": round(self.stats["cortes_falsos"] / turnos, 3) if turnos else 0.0,
+            "espera_media": round(self.stats["espera_total"] / turnos, 3) if turnos else 0.0,
+            "piso_ruido": round(self.piso_ruido, 1) if self.piso_ruido is not None else None,
+            "umbral_vad": round(self.vad.umbral, 1),
+        }
+
+    def _registrar_corte(self, motivo, silent_chunks):
+        self.stats["turnos"] += 1
+        self.stats[motivo] += 1
+        self.stats["espera_total"] += silent_chunks * FRAME_SEGUNDOS
+        self._ultimo_corte = self._frame
+        self._frames_voz = 0
+        self._etapa = None
+
+    def _recalibrar(self):
+        self.piso_ruido = float(np.percentile(self._rms, PERCENTIL_RUIDO))
+        self.vad.umbral = min(UMBRAL_MAX, max(UMBRAL_MIN, self.piso_ruido * FACTOR_RUIDO))
@@ -0,0 +1,180 @@
+import re
+import threading
+import time
+import unicodedata
+
+# ============================================
+# CONFIGURACIÓN DEL ÍNDICE DE PREGUNTAS FRECUENTES
+# ============================================
+UMBRAL_CONFIANZA = 0.6  # Fracción (ponderada) de la pregunta que debe cubrir la intención
+MARGEN_CONFIANZA = 0.3  # Ventaja mínima sobre la segunda intención (si no, es ambigua)
+MAX_PALABRAS = 14  # Preguntas más largas van siempre al LLM
+SUAVIZADO_LATENCIA = 0.2  # Peso de la última medición del LLM en la media móvil
+
+# Ejemplos por intención: palabras y frases con que suele preguntarse cada cosa.
+# Las claves coinciden con las de ConversationManager.respuestas_fallback
+INTENCIONES_FAQ = {
+    "horario": [
+        "horario", "horario de trabajo", "a qué hora entro", "hora de entrada", "hora de salida",
+        "hasta qué hora", "a qué hora salgo", "días de trabajo", "refrigerio", "almuerzo", "descanso",
+    ],
+    "ubicacion": [
+        "ubicación", "dirección", "dónde queda la oficina", "dónde está la oficina", "dónde queda",
+        "cómo llego", "sede", "local", "dónde es", "oficina",
+    ],
+    "onboarding": [
+        "primer día", "qué hago el primer día", "qué debo hacer", "a quién busco", "recepción",
+        "qué llevo", "cómo empiezo", "incorporación", "proceso de incorporación", "a dónde me presento",
+    ],
+    "portal": [
+        "portal", "portal del empleado", "página web", "plataforma", "intranet", "autoservicio",
+        "boletas de pago", "link del portal", "sistema",
+    ],
+}
+
+# Palabras que no aportan a la intención
+PALABRAS_VACIAS = frozenset("""
+a al de del el la los las lo un una unos unas y o u que cual cuales es son en por para me mi mis se
+te tu tus yo con como hay esta este esto eso ese sobre mas muy ya le les nos ser estar puedes podrias
+puede decir dime saber quiero quisiera necesito favor bueno ok oye hola seria tengo tiene tenemos
+donde quien hasta hago debo
+""".split())
+
+_NO_PALABRA = re.compile(r"[^a-z0-9ñ ]+")
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes ni signos; plurales simples al singular"""
+    texto = unicodedata.normalize("NFD", texto.lower().replace("ñ", "\0"))
+    texto = "".join(c for c in texto if unicodedata.category(c) != "Mn").replace("\0", "ñ")
+    palabras = []
+    for palabra in _NO_PALABRA.sub(" ", texto).split():
+        if len(palabra) > 3 and palabra.endswith("s") and not palabra.endswith("ss"):
+            palabra = palabra[:-1]
+        palabras.append(palabra)
+    return palabras
+
+
+def rasgos(palabras):
+    """Palabras con contenido y sus bigramas (consecutivos, sin palabras vacías)"""
+    contenido = [p for p in palabras if p not in PALABRAS_VACIAS]
+    return contenido + [f"{a} {b}" for a, b in zip(contenido, contenido[1:])]
+
+
+class IndiceFAQ:
+    """
+    Índice precalculado de intenciones frecuentes (horario, ubicación, primer
+    día, portal) para contestar sin pasar por el LLM.
+    - Cada intención se describe con ejemplos; palabras y bigramas de los
+      ejemplos van a un índice invertido rasgo -> intención, con peso menor
+      cuanto más intenciones comparten el rasgo
+    - Una pregunta se contesta al instante solo si una intención cubre al
+      menos UMBRAL_CONFIANZA de sus rasgos y le saca MARGEN_CONFIANZA a la
+      segunda; lo demás (ambiguo, largo o con palabras desconocidas) va a Ollama
+    """
+    def __init__(self, respuestas, intenciones=INTENCIONES_FAQ,
+                 umbral=UMBRAL_CONFIANZA, margen=MARGEN_CONFIANZA):
+        self.umbral = umbral
+        self.margen = margen
+        self.respuestas = {nombre: respuestas[nombre] for nombre in intenciones if nombre in respuestas}
+
+        # rasgo -> {intención: peso}
+        por_rasgo = {}
+        for nombre in self.respuestas:
+            for ejemplo in intenciones[nombre]:
+                for rasgo in rasgos(normalizar(ejemplo)):
+                    por_rasgo.setdefault(rasgo, set()).add(nombre)
+        self._indice = {
+            rasgo: {nombre: 1.0 / len(nombres) for nombre in nombres}
+            for rasgo, nombres in por_rasgo.items()
+        }
+
+        self._lock = threading.Lock()
+        self._latencia_llm = None  # Media móvil: segundos hasta la primera frase del LLM
+        self._duracion_llm = None  # Media móvil: segundos de generación completa en Ollama
+        self.stats = {
+            "consultas": 0,
+            "aciertos": 0,
+            "ambiguas": 0,
+            "tiempo_busqueda": 0.0,
+            "latencia_ahorrada": 0.0,
+            "ollama_ahorrado": 0.0,
+            "por_intencion": {nombre: 0 for nombre in self.respuestas},
+        }
+
+    def clasificar(self, pregunta):
+        """(intención, confianza) de la mejor coincidencia, o (None, confianza) si no alcanza"""
+        palabras = normalizar(pregunta)
+        consulta = rasgos(palabras)
+        if not consulta or len(palabras) > MAX_PALABRAS:
+            return None, 0.0
+
+        puntos = {}
+        total = 0.0
+        for rasgo in consulta:
+            intenciones = self._indice.get(rasgo)
+            if not intenciones:
+                total += 1.0  # Rasgo desconocido: baja la cobertura de todas
+                continue
+            total += max(intenciones.values())
+            for nombre, peso in intenciones.items():
+                puntos[nombre] = puntos.get(nombre, 0.0) + peso
+
+        if not puntos:
+            return None, 0.0
+        orden = sorted(puntos.items(), key=lambda item: item[1], reverse=True)
+        mejor, confianza = orden[0][0], orden[0][1] / total
+        segunda = orden[1][1] / total if len(orden) > 1 else 0.0
+        if confianza >= self.umbral and confianza - segunda >= self.margen:
+            return mejor, confianza
+        return None, confianza
+
+    def responder(self, pregunta):
+        """Respuesta precalculada si la pregunta coincide con confianza alta, o None"""
+        inicio = time.perf_counter()
+        intencion, confianza = self.clasificar(pregunta)
+        duracion = time.perf_counter() - inicio
+
+        with self._lock:
+            self.stats["consultas"] += 1
+            self.stats["tiempo_busqueda"] += duracion
+            if intencion is None:
+                if confianza > 0:
+                    self.stats["ambiguas"] += 1
+                return None
+            self.stats["aciertos"] += 1
+            self.stats["por_intencion"][intencion] += 1
+            # Lo que habría tardado el LLM según lo medido en los turnos que sí lo usaron
+            self.stats["latencia_ahorrada"] += max(0.0, (self._latencia_llm or 0.0) - duracion)
+            self.stats["ollama_ahorrado"] += self._duracion_llm or 0.0
+
+        print(f"⚡ FAQ '{intencion}' ({confianza:.2f}) sin pasar por el LLM", flush=True)
+        return self.respuestas[intencion]
+
+    def registrar_llm(self, primera_frase, duracion=None):
+        """Latencia de un turno que sí fue al LLM (base para estimar lo ahorrado)"""
+        with self._lock:
+            self._latencia_llm = self._suavizar(self._latencia_llm, primera_frase)
+            self._duracion_llm = self._suavizar(self._duracion_llm, duracion or primera_frase)
+
+    def obtener_stats(self):
+        with self._lock:
+            s = self.stats
+            return {
+                "consultas": s["consultas"],
+                "aciertos": s["aciertos"],
+                "ambiguas": s["ambiguas"],
+                "al_llm": s["consultas"] - s["aciertos"],
+                "tasa_aciertos": round(s["aciertos"] / s["consultas"], 3) if s["consultas"] else 0.0,
+                "por_intencion": dict(s["por_intencion"]),
+                "busqueda_media_us": round(s["tiempo_busqueda"] / s["consultas"] * 1e6, 1) if s["consultas"] else 0.0,
+                "latencia_llm_media": round(self._latencia_llm or 0.0, 3),
+                "latencia_ahorrada_total": round(s["latencia_ahorrada"], 2),
+                "ollama_ahorrado_total": round(s["ollama_ahorrado"], 2),
+            }
+
+    @staticmethod
+    def _suavizar(anterior, medida):
+        if anterior is None:
+            return medida
+        return anterior + SUAVIZADO_LATENCIA * (medida - anterior)
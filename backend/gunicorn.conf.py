@@ -0,0 +1,54 @@
+"""
+Configuración de producción: gunicorn con workers gevent.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Cada stream de Twilio (/media) es una greenlet: la lectura del websocket,
+el reproductor saliente y las llamadas HTTP a Whisper/Ollama/TTS ceden el
+control mientras esperan, así que un proceso no necesita un hilo del SO
+por llamada y el límite pasa a ser la CPU (ver el techo más abajo). El
+trabajo de CPU pesado (decodificar MP3) se manda a hilos reales con
+serving.ejecutar_cpu para no frenar el bucle de 20ms.
+
+Techo medido con bench/carga_llamadas.py (1 worker gevent, Python 3.11,
+servicios falsos, 2 turnos por llamada, máquina de 1 núcleo compartido con
+el arnés):
+    python bench/carga_llamadas.py --lanzar --llamadas 5 10 20 30 --turnos 2 --seguir
+    - CPU del worker: ~2.4% de un núcleo por llamada con 5 llamadas, ~2.1%
+      con 10 y ~1.6% con 20-30 (lo fijo se reparte entre más llamadas).
+      El camino entrante solo es ~9us por frame (bench/bench_frames.py), ~0.05%;
+      el resto es websocket, reproductor saliente y pipeline de turnos.
+    - Punto de quiebre: 20 llamadas (p95 de latencia de turno 6.2s contra
+      3.7s con 5; jitter saliente 8ms, sin huecos).
+  => ~20 llamadas simultáneas por worker medidas, ~40-60 si el worker tuviera
+     el núcleo para él solo (100% / 1.6-2.4%). Lejos del objetivo de
+     "cientos de llamadas por proceso": para eso hay que escalar con
+     GUNICORN_WORKERS (un worker por núcleo) o bajar el costo fijo por llamada.
+Con GUNICORN_WORKERS > 1 usar STATE_BACKEND=sqlite: las conversaciones
+quedan en un SQLite (WAL) compartido por los workers del nodo, así que
+/iniciar-llamada y el websocket de /media pueden caer en procesos distintos.
+Para varios nodos hace falta un almacén en red (ver state_store.AlmacenEstado).
+Las campañas (/campanas) no se comparten: el marcador y los status callbacks
+de Twilio tienen que caer en el mismo proceso, así que solo funcionan con
+un worker (con más, esas rutas responden 409).
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = "gevent"
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))  # websockets + HTTP por worker
+
+# Los websockets duran toda la llamada; el timeout solo vigila que el worker siga vivo
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv('LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # Workers que realmente corren (GUNICORN_WORKERS o -w), para que app.py lo vea
+    os.environ['WORKERS_SERVIDOR'] = str(server.cfg.workers)
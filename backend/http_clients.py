@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import peticiones_servicio
+
+# ============================================
+# CONFIGURACIÓN DE SERVICIOS
+# ============================================
+TIMEOUT_CONEXION = 3.05  # Segundos para abrir la conexión TCP
+
+
+class ServicioSaturado(requests.exceptions.RequestException):
+    """No hubo cupo de concurrencia para el servicio dentro del timeout"""
+
+
+class ClienteServicio:
+    """
+    Cliente HTTP compartido para un servicio interno (Whisper, Ollama, TTS):
+    - Sesión con keep-alive y pool de conexiones
+    - Timeout por defecto del servicio
+    - Límite de peticiones simultáneas
+    - Estadísticas de latencia y reutilización de conexiones
+    """
+    def __init__(self, nombre, base_url, timeout, max_concurrencia):
+        self.nombre = nombre
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_concurrencia = max_concurrencia
+
+        self.session = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrencia, pool_block=False)
+        self.session.mount('http://', adaptador)
+        self.session.mount('https://', adaptador)
+
+        self._semaforo = threading.BoundedSemaphore(max_concurrencia)
+        self._lock = threading.Lock()
+        self.stats = {
+            "peticiones": 0,
+            "errores": 0,
+            "saturado": 0,
+            "en_curso": 0,
+            "latencia_total": 0.0,
+            "latencia_max": 0.0,
+            "espera_total": 0.0,
+        }
+
+    def post(self, ruta, timeout=None, **kwargs):
+        """
+        POST a `ruta` del servicio. Con stream=True el cupo de concurrencia
+        se mantiene hasta que se cierra la respuesta.
+        """
+        return self._request('POST', ruta, timeout=timeout, **kwargs)
+
+    def get(self, ruta, timeout=None, **kwargs):
+        return self._request('GET', ruta, timeout=timeout, **kwargs)
+
+    def _request(self, metodo, ruta, timeout=None, **kwargs):
+        timeout = timeout or self.timeout
+
+        inicio_espera = time.perf_counter()
+        if not self._semaforo.acquire(timeout=timeout):
+            self._registrar(saturado=True)
+            raise ServicioSaturado(f"{self.nombre}: {self.max_concurrencia} peticiones en curso")
+        espera = time.perf_counter() - inicio_espera
+
+        with self._lock:
+            self.stats["en_curso"] += 1
+
+        inicio = time.perf_counter()
+        liberar = True
+        try:
+            response = self.session.request(
+                metodo,
+                self.base_url + ruta,
+                timeout=(TIMEOUT_CONEXION, timeout),
+                **kwargs
+            )
+            if kwargs.get('stream'):
+                self._liberar_al_cerrar(response)
+                liberar = False
+            self._registrar(latencia=time.perf_counter() - inicio, espera=espera)
+            return response
+        except Exception:
+            self._registrar(latencia=time.perf_counter() - inicio, espera=espera, error=True)
+            raise
+        finally:
+            if liberar:
+                self._liberar()
+
+    def _liberar(self):
+        with self._lock:
+            self.stats["en_curso"] -= 1
+        self._semaforo.release()
+
+    def _liberar_al_cerrar(self, response):
+        cerrar_original = response.close
+        liberado = []
+
+        def cerrar():
+            try:
+                cerrar_original()
+            finally:
+                if not liberado:
+                    liberado.append(True)
+                    self._liberar()
+
+        response.close = cerrar
+
+    def _registrar(self, latencia=0.0, espera=0.0, error=False, saturado=False):
+        with self._lock:
+            if saturado:
+                self.stats["saturado"] += 1
+                return
+            self.stats["peticiones"] += 1
+            self.stats["errores"] += int(error)
+            self.stats["latencia_total"] += latencia
+            self.stats["latencia_max"] = max(self.stats["latencia_max"], latencia)
+            self.stats["espera_total"] += espera
+        peticiones_servicio.observar(self.nombre, latencia)
+
+    def _conexiones_creadas(self):
+        """Conexiones TCP creadas por los pools de la sesión (una sesión = un servicio)"""
+        pools = self.session.get_adapter(self.base_url).poolmanager.pools
+        return sum(pools[clave].num_connections for clave in pools.keys())
+
+    def obtener_stats(self):
+        """Latencias y reutilización de conexiones del servicio"""
+        conexiones = self._conexiones_creadas()
+        with self._lock:
+            peticiones = self.stats["peticiones"]
+            return {
+                "servicio": self.nombre,
+                "url": self.base_url,
+                "peticiones": peticiones,
+                "errores": self.stats["errores"],
+                "saturado": self.stats["saturado"],
+                "en_curso": self.stats["en_curso"],
+                "max_concurrencia": self.max_concurrencia,
+                "conexiones_creadas": conexiones,
+                "reutilizacion": round(1 - conexiones / peticiones, 4) if peticiones else 0.0,
+                "latencia_media": round(self.stats["latencia_total"] / peticiones, 4) if peticiones else 0.0,
+                "latencia_max": round(self.stats["latencia_max"], 4),
+                "espera_media": round(self.stats["espera_total"] / peticiones, 4) if peticiones else 0.0,
+            }
+
+
+# ============================================
+# CLIENTES COMPARTIDOS
+# ============================================
+whisper = ClienteServicio(
+    "whisper",
+    os.getenv('WHISPER_URL', 'http://whisper:9000'),
+    timeout=30,
+    max_concurrencia=int(os.getenv('WHISPER_MAX_CONCURRENCIA', '4'))
+)
+
+ollama = ClienteServicio(
+    "ollama",
+    os.getenv('OLLAMA_URL', 'http://ollama:11434'),
+    timeout=60,
+    max_concurrencia=int(os.getenv('OLLAMA_MAX_CONCURRENCIA', '4'))
+)
+
+gemini_tts = ClienteServicio(
+    "gemini-tts",
+    os.getenv('GEMINI_TTS_URL', 'http://gemini-tts:5003'),
+    timeout=10,
+    max_concurrencia=int(os.getenv('TTS_MAX_CONCURRENCIA', '16'))
+)
+
+servicios = [whisper, ollama, gemini_tts]
+
+
+def obtener_stats():
+    """Estadísticas de todos los servicios"""
+    return {cliente.nombre: cliente.obtener_stats() for cliente in servicios}
@@ -0,0 +1,103 @@
+import threading
+
+# ============================================
+# CONFIGURACIÓN DE MÉTRICAS DEL LLM
+# ============================================
+CARACTERES_POR_TOKEN = 3.5  # Valor inicial hasta medirlo con las respuestas del modelo
+TOKENS_POR_MENSAJE = 4  # Etiquetas de la plantilla de chat por mensaje (rol, inicio, fin)
+MIN_TOKENS_COSTO = 32  # Turnos con menos tokens evaluados no se usan para medir ms/token
+
+
+class MetricasPrompt:
+    """
+    Cuánto prompt re-evalúa Ollama por turno y cuánto se ahorra reutilizando el
+    prefijo (KV cache) entre turnos de una llamada.
+    - prompt_eval_count / prompt_eval_duration salen del último mensaje de Ollama
+      (done); si la respuesta se cortó antes, el turno solo aporta el primer token
+    - Los tokens del prompt completo se estiman con la relación caracteres/token
+      medida en las propias respuestas del modelo (eval_count vs. texto generado)
+    - Cada recorte del historial cambia el prefijo: se cuenta como fallo de reutilización
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {
+            "turnos": 0,
+            "turnos_con_metricas": 0,
+            "tokens_prompt_estimados": 0,
+            "tokens_evaluados": 0,
+            "ns_prompt_eval": 0,
+            "ns_costo_muestra": 0,  # prompt_eval_duration de turnos con >= MIN_TOKENS_COSTO
+            "tokens_costo_muestra": 0,
+            "caracteres_generados": 0,
+            "tokens_generados": 0,
+            "primer_token_total": 0.0,
+            "turnos_primer_token": 0,
+            "recortes_historial": 0,
+        }
+
+    def registrar(self, mensajes, final=None, primer_token=None, texto_generado=""):
+        """
+        Registra un turno: `mensajes` enviados a /api/chat, el último objeto
+        de la respuesta de Ollama (`final`, o None si se cortó) y los segundos
+        hasta el primer token.
+        """
+        caracteres = sum(len(m["content"]) for m in mensajes)
+
+        with self._lock:
+            self.stats["turnos"] += 1
+            if primer_token is not None:
+                self.stats["primer_token_total"] += primer_token
+                self.stats["turnos_primer_token"] += 1
+
+            if not final or "prompt_eval_count" not in final:
+                return
+
+            evaluados = final.get("prompt_eval_count", 0)
+            duracion = final.get("prompt_eval_duration", 0)
+            if final.get("eval_count") and texto_generado:
+                self.stats["caracteres_generados"] += len(texto_generado)
+                self.stats["tokens_generados"] += final["eval_count"]
+
+            estimados = int(caracteres / self._caracteres_por_token()) + TOKENS_POR_MENSAJE * len(mensajes)
+            self.stats["turnos_con_metricas"] += 1
+            self.stats["tokens_prompt_estimados"] += max(estimados, evaluados)
+            self.stats["tokens_evaluados"] += evaluados
+            self.stats["ns_prompt_eval"] += duracion
+            if evaluados >= MIN_TOKENS_COSTO:
+                self.stats["ns_costo_muestra"] += duracion
+                self.stats["tokens_costo_muestra"] += evaluados
+
+    def registrar_recorte(self):
+        """El historial de una llamada se recortó: su próximo turno no reutiliza el prefijo"""
+        with self._lock:
+            self.stats["recortes_historial"] += 1
+
+    def obtener_stats(self):
+        with self._lock:
+            s = self.stats
+            turnos = s["turnos_con_metricas"]
+            ahorrados = s["tokens_prompt_estimados"] - s["tokens_evaluados"]
+            ms_por_token = (s["ns_costo_muestra"] / s["tokens_costo_muestra"] / 1e6
+                            if s["tokens_costo_muestra"] else 0.0)
+            return {
+                "turnos": s["turnos"],
+                "turnos_con_metricas": turnos,
+                "tokens_prompt_por_turno": round(s["tokens_prompt_estimados"] / turnos, 1) if turnos else 0.0,
+                "tokens_evaluados_por_turno": round(s["tokens_evaluados"] / turnos, 1) if turnos else 0.0,
+                "tokens_ahorrados_por_turno": round(ahorrados / turnos, 1) if turnos else 0.0,
+                "tasa_reutilizacion": round(ahorrados / s["tokens_prompt_estimados"], 3)
+                if s["tokens_prompt_estimados"] else 0.0,
+                "ms_prompt_eval_por_turno": round(s["ns_prompt_eval"] / turnos / 1e6, 1) if turnos else 0.0,
+                "ms_por_token_prompt": round(ms_por_token, 3),
+                "ms_ahorrados_por_turno": round(ahorrados * ms_por_token / turnos, 1) if turnos else 0.0,
+                "primer_token_medio": round(s["primer_token_total"] / s["turnos_primer_token"], 3)
+                if s["turnos_primer_token"] else 0.0,
+                "caracteres_por_token": round(self._caracteres_por_token(), 2),
+                "recortes_historial": s["recortes_historial"],
+                "tasa_fallos_prefijo": round(s["recortes_historial"] / s["turnos"], 3) if s["turnos"] else 0.0,
+            }
+
+    def _caracteres_por_token(self):
+        if self.stats["tokens_generados"] >= 100:
+            return self.stats["caracteres_generados"] / self.stats["tokens_generados"]
+        return CARACTERES_POR_TOKEN
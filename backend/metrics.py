@@ -0,0 +1,241 @@
+import bisect
+import threading
+import time
+
+# ============================================
+# CONFIGURACIÓN DE MÉTRICAS
+# ============================================
+PREFIJO = "voicebot"  # Prefijo de todas las series exportadas en /metrics
+# Límites (segundos) de los buckets: de frames de 20ms a generaciones largas del LLM
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+# Etapas de un turno, desde que el usuario deja de hablar hasta que sale el primer audio
+ETAPAS_TURNO = (
+    "fin_de_voz",  # Silencio esperado por el endpointing antes de cortar el turno
+    "cola_turno",  # Espera en el planificador hasta tener trabajador
+    "whisper",  # Transcripción (con ASR incremental, solo la cola del turno)
+    "llm_primera_frase",  # Desde que se pide la respuesta hasta la primera frase
+    "llm_total",  # Generación completa de Ollama (o hasta que se corta), medida dentro del stream de tokens
+    "espera_cola_tts",  # Tiempo que las frases esperan lugar en la cola de TTS (contrapresión, no LLM)
+    "tts_primer_byte",  # Desde que se pide el primer chunk hasta tener su audio
+    "transcodificacion",  # MP3 -> mulaw 8kHz
+    "primer_frame",  # Fin de voz -> primer frame de audio enviado a Twilio
+)
+
+
+class Histograma:
+    """
+    Histograma acumulativo al estilo Prometheus con una etiqueta (etapa,
+    servicio...). Observar es O(log buckets) y no guarda las muestras.
+    """
+    def __init__(self, nombre, ayuda, etiqueta, buckets=BUCKETS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiqueta = etiqueta
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # valor de la etiqueta -> [conteo por bucket..., +Inf, suma]
+
+    def observar(self, valor_etiqueta, segundos):
+        indice = bisect.bisect_left(self.buckets, segundos)
+        with self._lock:
+            serie = self._series.get(valor_etiqueta)
+            if serie is None:
+                serie = self._series[valor_etiqueta] = [0] * (len(self.buckets) + 1) + [0.0]
+            serie[indice] += 1
+            serie[-1] += segundos
+
+    def percentil(self, valor_etiqueta, p):
+        """Percentil aproximado (interpolado dentro del bucket), como histogram_quantile"""
+        with self._lock:
+            serie = self._series.get(valor_etiqueta)
+            if not serie:
+                return 0.0
+            conteos = serie[:-1]
+        total = sum(conteos)
+        objetivo = total * p / 100
+        acumulado = 0
+        for i, conteo in enumerate(conteos):
+            if acumulado + conteo >= objetivo and conteo:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # Por encima del último límite
+                inferior = self.buckets[i - 1] if i else 0.0
+                return inferior + (self.buckets[i] - inferior) * (objetivo - acumulado) / conteo
+            acumulado += conteo
+        return self.buckets[-1]
+
+    def resumen(self):
+        """Por valor de la etiqueta: muestras, media, p50 y p95"""
+        with self._lock:
+            series = {valor: (sum(serie[:-1]), serie[-1]) for valor, serie in self._series.items()}
+        return {
+            valor: {
+                "muestras": conteo,
+                "media": round(suma / conteo, 4) if conteo else 0.0,
+                "p50": round(self.percentil(valor, 50), 4),
+                "p95": round(self.percentil(valor, 95), 4),
+            }
+            for valor, (conteo, suma) in series.items()
+        }
+
+    def exponer(self):
+        """Líneas en formato de texto de Prometheus"""
+        nombre = f"{PREFIJO}_{self.nombre}"
+        lineas = [f"# HELP {nombre} {self.ayuda}", f"# TYPE {nombre} histogram"]
+        with self._lock:
+            series = {valor: list(serie) for valor, serie in self._series.items()}
+        for valor, serie in sorted(series.items()):
+            etiqueta = f'{self.etiqueta}="{valor}"'
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, serie):
+                acumulado += conteo
+                lineas.append(f'{nombre}_bucket{{{etiqueta},le="{limite}"}} {acumulado}')
+            acumulado += serie[len(self.buckets)]
+            lineas.append(f'{nombre}_bucket{{{etiqueta},le="+Inf"}} {acumulado}')
+            lineas.append(f'{nombre}_sum{{{etiqueta}}} {serie[-1]:.6f}')
+            lineas.append(f'{nombre}_count{{{etiqueta}}} {acumulado}')
+        return lineas
+
+
+class RegistroMetricas:
+    """
+    Métricas del proceso para /metrics: histogramas que se alimentan al
+    observar y medidores (gauges/counters) que se leen al exportar, a partir
+    de los `obtener_stats()` que ya existen.
+    """
+    def __init__(self):
+        self._histogramas = []
+        self._medidores = []  # (nombre, ayuda, tipo, etiqueta, función)
+
+    def histograma(self, nombre, ayuda, etiqueta, buckets=BUCKETS_SEGUNDOS):
+        histograma = Histograma(nombre, ayuda, etiqueta, buckets)
+        self._histogramas.append(histograma)
+        return histograma
+
+    def medidor(self, nombre, ayuda, funcion, etiqueta=None, tipo="gauge"):
+        """
+        `funcion()` devuelve un número, o con `etiqueta` un dict
+        valor de la etiqueta -> número
+        """
+        self._medidores.append((nombre, ayuda, tipo, etiqueta, funcion))
+
+    def exponer(self):
+        lineas = []
+        for nombre, ayuda, tipo, etiqueta, funcion in self._medidores:
+            try:
+                valor = funcion()
+            except Exception as e:
+                print(f"⚠️ Métrica {nombre} no disponible: {e}", flush=True)
+                continue
+            nombre = f"{PREFIJO}_{nombre}"
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+            if etiqueta:
+                for clave, numero in sorted(valor.items()):
+                    lineas.append(f'{nombre}{{{etiqueta}="{clave}"}} {numero}')
+            else:
+                lineas.append(f"{nombre} {valor}")
+        for histograma in self._histogramas:
+            lineas += histograma.exponer()
+        return "\n".join(lineas) + "\n"
+
+
+# ============================================
+# MÉTRICAS COMPARTIDAS DEL PROCESO
+# ============================================
+registro = RegistroMetricas()
+
+etapas_turno = registro.histograma(
+    "turno_etapa_segundos", "Duración de cada etapa de un turno de conversación", "etapa"
+)
+peticiones_servicio = registro.histograma(
+    "servicio_peticion_segundos", "Latencia de las peticiones HTTP a Whisper, Ollama y TTS", "servicio"
+)
+# Por llamada, al cerrar el socket: la espera media y la tasa de cortes falsos
+# caen en los mismos buckets (la tasa va de 0 a 1)
+endpointing_llamadas = registro.histograma(
+    "endpointing_llamada", "Por llamada: espera media de fin de voz (s) y tasa de cortes falsos", "metrica"
+)
+_cortes_endpointing = {"cortes_por_silencio": 0, "cortes_por_tope": 0, "cortes_falsos": 0}
+_lock_endpointing = threading.Lock()
+
+
+def observar_endpointing(resumen):
+    """Suma el `Endpointer.resumen()` de una llamada que terminó"""
+    with _lock_endpointing:
+        for motivo in _cortes_endpointing:
+            _cortes_endpointing[motivo] += resumen[motivo]
+    if resumen["turnos"]:
+        endpointing_llamadas.observar("espera_media_segundos", resumen["espera_media"])
+        endpointing_llamadas.observar("tasa_cortes_falsos", resumen["tasa_cortes_falsos"])
+
+
+def cortes_endpointing():
+    with _lock_endpointing:
+        return dict(_cortes_endpointing)
+
+
+registro.medidor("endpointing_cortes_total", "Turnos cortados por silencio o por tope y cortes falsos",
+                 cortes_endpointing, etiqueta="motivo", tipo="counter")
+
+
+class TrazaTurno:
+    """
+    Spans de un turno. El reloj arranca cuando el endpointing da el turno por
+    terminado; cada etapa se registra en el histograma `etapas_turno`.
+    """
+    __slots__ = ("inicio", "_marcadas")
+
+    def __init__(self, fin_de_voz=None):
+        self.inicio = time.monotonic()
+        self._marcadas = set()
+        if fin_de_voz is not None:
+            self.observar("fin_de_voz", fin_de_voz)
+
+    def observar(self, etapa, segundos):
+        etapas_turno.observar(etapa, segundos)
+
+    def span(self, etapa):
+        return _Span(self, etapa)
+
+    def marcar(self, etapa):
+        """Registra el tiempo desde el fin de voz hasta ahora (una vez por etapa)"""
+        if etapa in self._marcadas:
+            return
+        self._marcadas.add(etapa)
+        self.observar(etapa, time.monotonic() - self.inicio)
+
+
+class _Span:
+    __slots__ = ("traza", "etapa", "inicio")
+
+    def __init__(self, traza, etapa):
+        self.traza = traza
+        self.etapa = etapa
+
+    def __enter__(self):
+        self.inicio = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.traza.observar(self.etapa, time.monotonic() - self.inicio)
+        return False
+
+
+def cronometrar_frases(frases, traza):
+    """
+    Envuelve el iterable de frases del LLM y registra el tiempo hasta la
+    primera frase. La generación completa (llm_total) no se mide aquí: este
+    iterador avanza al ritmo del consumidor, que se frena cuando la cola de
+    TTS está llena; la registra el propio generador del LLM (al_generar).
+    """
+    inicio = time.monotonic()
+    primera = True
+    try:
+        for frase in frases:
+            if primera:
+                traza.observar("llm_primera_frase", time.monotonic() - inicio)
+                primera = False
+            yield frase
+    finally:
+        if hasattr(frases, 'close'):
+            frases.close()
@@ -0,0 +1,44 @@
+import numpy as np
+
+# ============================================
+# CÓDEC G.711 µ-law (reemplaza a audioop, que no existe desde Python 3.13)
+# ============================================
+BIAS = 0x84  # Sesgo de la codificación µ-law (sobre muestras de 16 bits)
+CLIP = 32635  # Mayor magnitud codificable antes de saturar
+
+
+def _tabla_decodificacion():
+    """PCM 16-bit de cada uno de los 256 códigos µ-law (igual que audioop.ulaw2lin)"""
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    t = (((u & 0x0F) << 3) + BIAS) << ((u & 0x70) >> 4)
+    return np.where(u & 0x80, BIAS - t, t - BIAS).astype(np.int16)
+
+
+def _tabla_codificacion():
+    """Código µ-law de cada muestra de 16 bits, indexada como uint16 (igual que audioop.lin2ulaw)"""
+    muestras = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32) >> 2
+    mascara = np.where(muestras < 0, 0x7F, 0xFF)
+    magnitud = np.minimum(np.abs(muestras), CLIP >> 2) + (BIAS >> 2)
+    segmento = np.searchsorted(np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]),
+                               magnitud, side="left")
+    codigo = (np.minimum(segmento, 7) << 4) | ((magnitud >> (segmento + 1)) & 0x0F)
+    codigo = np.where(segmento >= 8, 0x7F, codigo)
+    return (codigo ^ mascara).astype(np.uint8)
+
+
+TABLA_PCM = _tabla_decodificacion()
+TABLA_MULAW = _tabla_codificacion()
+# Decodificación directa a float32: lo que el VAD analiza, sin pasar por PCM 16-bit
+TABLA_FLOAT = TABLA_PCM.astype(np.float32)
+
+
+def mulaw_a_pcm(audio_mulaw):
+    """Convierte mulaw a PCM 16-bit little-endian"""
+    return TABLA_PCM.take(np.frombuffer(audio_mulaw, dtype=np.uint8)).astype('<i2', copy=False).tobytes()
+
+
+def pcm_a_mulaw(audio_pcm):
+    """Convierte PCM 16-bit little-endian (bytes o array('h')) a mulaw"""
+    muestras = np.frombuffer(audio_pcm, dtype='<u2')
+    return TABLA_MULAW.take(muestras).tobytes()
+
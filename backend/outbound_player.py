@@ -0,0 +1,175 @@
+import binascii
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# ============================================
+# CONFIGURACIÓN DEL REPRODUCTOR
+# ============================================
+SAMPLE_RATE = 8000  # mulaw 8kHz: 1 byte = 1 muestra
+ADELANTO_SEGUNDOS = 0.2  # Cuánto audio se deja en el buffer de Twilio por delante del tiempo real
+# Audio por evento media saliente. Twilio acepta payloads de más de 20ms: mensajes
+# más grandes = menos base64/JSON/ws.send por segundo de audio (ver bench/bench_salida.py)
+MS_POR_MENSAJE = int(os.getenv('MS_POR_MENSAJE', '20'))
+BYTES_POR_MENSAJE = SAMPLE_RATE * MS_POR_MENSAJE // 1000
+
+
+class CodificadorMedia:
+    """
+    Eventos salientes de un stream con plantillas JSON precalculadas: el
+    streamSid se serializa una vez y por frame solo se codifica el payload
+    (el alfabeto base64 no necesita escape en JSON)
+    """
+    def __init__(self, stream_sid):
+        sid = json.dumps(stream_sid)
+        self._prefijo_media = '{"event":"media","streamSid":' + sid + ',"media":{"payload":"'
+        self._prefijo_marca = '{"event":"mark","streamSid":' + sid + ',"mark":{"name":'
+        self.clear = '{"event":"clear","streamSid":' + sid + '}'
+
+    def media(self, audio):
+        """Evento media con `audio` mulaw (bytes o memoryview, sin copiar)"""
+        return self._prefijo_media + binascii.b2a_base64(audio, newline=False).decode('ascii') + '"}}'
+
+    def marca(self, nombre):
+        return self._prefijo_marca + json.dumps(nombre) + '}}'
+
+
+class ReproductorSaliente:
+    """
+    Reproductor de audio saliente por llamada.
+    Envía los frames mulaw a Twilio a ritmo de tiempo real (con un pequeño
+    adelanto), de modo que el audio pendiente sigue en nuestra cola y se
+    puede descartar si el usuario interrumpe (barge-in).
+    Cuando toca enviar, los frames ya encolados se juntan en un solo evento
+    media de hasta `bytes_por_mensaje`.
+    """
+    def __init__(self, ws, stream_sid, adelanto=ADELANTO_SEGUNDOS, bytes_por_mensaje=BYTES_POR_MENSAJE):
+        self.ws = ws
+        self.stream_sid = stream_sid
+        self.adelanto = adelanto
+        self.bytes_por_mensaje = bytes_por_mensaje
+        self._codificador = CodificadorMedia(stream_sid)
+
+        self._cola = deque()
+        self._cond = threading.Condition()
+        self._lock_envio = threading.Lock()
+        self._fin_reproduccion = 0.0  # time.monotonic() en que Twilio termina lo ya enviado
+        self._generacion = 0  # cambia en cada interrupción para descartar envíos en curso
+        self._cerrado = False
+
+        self._hilo = threading.Thread(target=self._bucle, daemon=True)
+        self._hilo.start()
+
+    def encolar_audio(self, frame, al_enviar=None):
+        """
+        Encola un frame mulaw (bytes o memoryview) para enviarlo a su tiempo;
+        `al_enviar()` se llama al mandarlo
+        """
+        with self._cond:
+            self._cola.append(("media", frame, al_enviar))
+            self._cond.notify()
+
+    def encolar_marca(self, nombre):
+        """Encola un evento mark que Twilio confirma al reproducir hasta aquí"""
+        with self._cond:
+            self._cola.append(("mark", nombre, None))
+            self._cond.notify()
+
+    def reproduciendo(self):
+        """True si queda audio en cola o Twilio aún está reproduciendo lo enviado"""
+        with self._cond:
+            return bool(self._cola) or time.monotonic() < self._fin_reproduccion
+
+    def esperar_fin(self, timeout=None):
+        """Bloquea hasta que todo el audio encolado se haya reproducido"""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while self.reproduciendo() and not self._cerrado:
+            if limite is not None and time.monotonic() >= limite:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def interrumpir(self):
+        """
+        Barge-in: descarta el audio pendiente y pide a Twilio que
+        vacíe su buffer con el evento `clear`.
+        """
+        with self._cond:
+            self._cola.clear()
+            self._generacion += 1
+            self._fin_reproduccion = 0.0
+            self._cond.notify()
+
+        self._enviar(self._codificador.clear)
+
+    def cerrar(self):
+        """Detiene el hilo del reproductor"""
+        with self._cond:
+            self._cerrado = True
+            self._cola.clear()
+            self._cond.notify()
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                while not self._cola and not self._cerrado:
+                    self._cond.wait()
+                if self._cerrado:
+                    return
+
+                tipo, dato, al_enviar = self._cola.popleft()
+                generacion = self._generacion
+
+                # Esperar hasta que el buffer de Twilio baje del adelanto permitido
+                if tipo == "media":
+                    while not self._cerrado and generacion == self._generacion:
+                        espera = self._fin_reproduccion - self.adelanto - time.monotonic()
+                        if espera <= 0:
+                            break
+                        self._cond.wait(espera)
+
+                if self._cerrado or generacion != self._generacion:
+                    # Interrumpido mientras esperábamos: el frame se descarta
+                    continue
+
+                avisos = [al_enviar] if al_enviar else []
+                if tipo == "media":
+                    # Juntar los frames siguientes que entren en el mismo mensaje
+                    partes = [dato]
+                    total = len(dato)
+                    while (self._cola and self._cola[0][0] == "media"
+                           and total + len(self._cola[0][1]) <= self.bytes_por_mensaje):
+                        _, siguiente, aviso = self._cola.popleft()
+                        partes.append(siguiente)
+                        total += len(siguiente)
+                        if aviso:
+                            avisos.append(aviso)
+                    ahora = time.monotonic()
+                    self._fin_reproduccion = max(self._fin_reproduccion, ahora) + total / SAMPLE_RATE
+
+            if tipo == "media":
+                mensaje = self._codificador.media(dato if len(partes) == 1 else b''.join(partes))
+            else:
+                mensaje = self._codificador.marca(dato)
+
+            if not self._enviar(mensaje, generacion):
+                return
+            for aviso in avisos:
+                aviso()
+
+    def _enviar(self, mensaje, generacion=None):
+        """Envía un evento ya serializado"""
+        with self._lock_envio:
+            if generacion is not None and generacion != self._generacion:
+                return True
+            try:
+                self.ws.send(mensaje)
+                return True
+            except Exception as e:
+                print(f"❌ Error enviando a Twilio: {e}", flush=True)
+                with self._cond:
+                    self._cerrado = True
+                    self._cola.clear()
+                return False
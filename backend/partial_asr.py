@@ -0,0 +1,137 @@
+import re
+import time
+
+from utterance_buffer import frames_a_entregar
+
+# ============================================
+# CONFIGURACIÓN DE ASR INCREMENTAL (frames de 20ms)
+# ============================================
+FRAMES_PAUSA = 15  # 300ms sin voz: punto seguro para cortar un segmento
+MIN_FRAMES_SEGMENTO = 100  # 2s: no se transcriben segmentos más cortos
+MAX_FRAMES_SEGMENTO = 400  # 8s: si no hay pausas, se corta igual
+FRAMES_SOLAPE = 15  # 300ms de audio que se repiten al inicio del segmento siguiente
+TIMEOUT_SEGMENTO = 30  # Segundos máximos esperando un segmento en segundo plano
+MAX_PALABRAS_SOLAPE = 6  # Palabras repetidas que se buscan al unir segmentos
+BYTES_POR_SEGUNDO = 8000  # Los frames son mulaw 8kHz: 1 byte por muestra
+
+
+class TranscriptorIncremental:
+    """
+    Transcripción incremental de un turno mientras el usuario sigue hablando.
+    El audio se corta en segmentos en las pausas (o al llegar a MAX_FRAMES_SEGMENTO)
+    y cada segmento se transcribe en segundo plano. Como los cortes caen en pausas,
+    el texto de cada segmento ya es estable; al detectar el fin de turno solo falta
+    transcribir la cola desde el último corte.
+
+    `transcribir` recibe el audio de un tramo del turno (mulaw 8kHz) y devuelve
+    texto, así que se puede probar contra cualquier servicio /asr (o un doble local).
+    """
+    def __init__(self, transcribir, executor, frames_pausa=FRAMES_PAUSA,
+                 min_frames_segmento=MIN_FRAMES_SEGMENTO, max_frames_segmento=MAX_FRAMES_SEGMENTO,
+                 frames_solape=FRAMES_SOLAPE):
+        self._transcribir = transcribir
+        self._executor = executor
+        self.frames_pausa = frames_pausa
+        self.min_frames_segmento = min_frames_segmento
+        self.max_frames_segmento = max_frames_segmento
+        self.frames_solape = frames_solape
+
+        self._segmentos = []  # futuros con el texto de cada segmento, en orden
+        self._corte = 0  # índice de frame donde termina el último segmento enviado
+
+        self.stats = {"turnos": 0, "segmentos": 0, "frames_cola": 0, "frames_total": 0}
+
+    def actualizar(self, frames, silent_chunks):
+        """
+        Se llama con cada frame mientras se acumula el turno.
+        `frames` es el BufferVoz del turno (len() en frames, tramo() sin copia)
+        y `silent_chunks` los frames de silencio seguidos al final.
+        """
+        pendientes = len(frames) - self._corte
+
+        if silent_chunks == self.frames_pausa and pendientes - silent_chunks >= self.min_frames_segmento:
+            # Cortar a mitad de la pausa para no partir palabras
+            self._cortar(frames, len(frames) - silent_chunks // 2)
+        elif pendientes >= self.max_frames_segmento:
+            self._cortar(frames, len(frames))
+
+    def finalizar(self, frames, silent_chunks):
+        """
+        Cierra el turno y devuelve una función que completa la transcripción:
+        espera los segmentos en curso, transcribe solo la cola (sin el silencio
+        final que hizo cortar el turno) y une el texto.
+        """
+        segmentos = self._segmentos
+        inicio_cola = self._inicio_con_solape()
+        fin_cola = frames_a_entregar(len(frames), silent_chunks)
+        # La cola solo se transcribe si hubo voz después del último corte
+        cola_con_voz = len(frames) - self._corte > silent_chunks
+        audio_cola = frames.tramo(inicio_cola, fin_cola) if cola_con_voz else b''
+
+        self.stats["turnos"] += 1
+        self.stats["frames_total"] += len(frames)
+        self.stats["frames_cola"] += fin_cola - inicio_cola if cola_con_voz else 0
+        self.reset()
+
+        def completar():
+            inicio = time.time()
+            textos = []
+            for futuro in segmentos:
+                try:
+                    textos.append(futuro.result(timeout=TIMEOUT_SEGMENTO))
+                except Exception as e:
+                    print(f"⚠️ Segmento de ASR fallido: {e}", flush=True)
+            if audio_cola:
+                textos.append(self._transcribir(audio_cola))
+
+            texto = unir_transcripciones(textos)
+            print(f"📝 ASR incremental: {len(segmentos)} segmentos previos + "
+                  f"{len(audio_cola) / BYTES_POR_SEGUNDO:.1f}s de cola en {time.time() - inicio:.2f}s", flush=True)
+            return texto
+
+        return completar
+
+    def reset(self):
+        """Descarta el estado del turno (los segmentos en curso se ignoran)"""
+        self._segmentos = []
+        self._corte = 0
+
+    def _inicio_con_solape(self):
+        if not self._segmentos:
+            return 0
+        return max(0, self._corte - self.frames_solape)
+
+    def _cortar(self, frames, fin):
+        audio = frames.tramo(self._inicio_con_solape(), fin)
+        self._segmentos.append(self._executor.submit(self._transcribir, audio))
+        self._corte = fin
+        self.stats["segmentos"] += 1
+
+
+def _normalizar_palabra(palabra):
+    return re.sub(r'[^\wáéíóúñü]', '', palabra.lower())
+
+
+def unir_transcripciones(textos):
+    """
+    Une los textos de segmentos consecutivos quitando las palabras que
+    se repiten por el audio solapado entre uno y otro.
+    """
+    palabras = []
+    for texto in textos:
+        nuevas = (texto or "").split()
+        if not nuevas:
+            continue
+
+        # Buscar el solape más largo: final de lo acumulado == inicio del nuevo
+        maximo = min(MAX_PALABRAS_SOLAPE, len(palabras), len(nuevas))
+        for k in range(maximo, 0, -1):
+            final = [_normalizar_palabra(p) for p in palabras[-k:]]
+            inicio = [_normalizar_palabra(p) for p in nuevas[:k]]
+            if final == inicio:
+                nuevas = nuevas[k:]
+                break
+
+        palabras.extend(nuevas)
+
+    return ' '.join(palabras)
@@ -0,0 +1,228 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# ============================================
+# CONFIGURACIÓN DE LA BIBLIOTECA
+# ============================================
+SAMPLE_RATE = 8000  # mulaw 8kHz: 1 byte = 1 muestra
+MAX_VALORES = 2000  # Segmentos variables (nombres, puestos, fechas) guardados como máximo
+MARGEN_INICIO = int(0.04 * SAMPLE_RATE)  # Silencio que se deja antes de cada segmento unido
+MARGEN_FIN = int(0.08 * SAMPLE_RATE)  # Silencio que se deja después de cada segmento unido
+NIVEL_VOZ_MULAW = 0x20  # Nivel mulaw (0-127, sin signo) a partir del cual hay voz
+
+CAMPO = re.compile(r'\{(\w+)\}')
+SOLO_PUNTUACION = re.compile(r'^[\s.,;:!?¡¿]*$')
+
+
+class BibliotecaFrases:
+    """
+    Biblioteca en memoria de frases del bot ya codificadas como mulaw 8kHz.
+    - Frases fijas: se sintetizan una vez (al arrancar o en el primer uso)
+    - Plantillas: los tramos fijos se sintetizan una vez y los campos
+      (nombre, puesto, fecha...) se sintetizan por valor y se unen
+    Si un chunk está en la biblioteca se reproduce sin llamar al TTS.
+    """
+    def __init__(self, sintetizar, dividir=None, max_valores=MAX_VALORES):
+        self._sintetizar = sintetizar  # texto -> bytes mulaw 8kHz
+        self._dividir = dividir or (lambda texto: [texto])  # texto -> chunks, igual que al enviar
+        self.max_valores = max_valores
+
+        self._lock = threading.Lock()
+        self._frases = {}  # texto -> bytes mulaw (None = registrada, aún sin sintetizar)
+        self._plantillas = []  # (regex, tramos de _segmentar)
+        self._valores = OrderedDict()  # texto de un campo -> bytes mulaw (LRU)
+
+        self.stats = {"hits": 0, "hits_plantilla": 0, "misses": 0, "errores": 0}
+
+    # ============================================
+    # REGISTRO
+    # ============================================
+
+    def registrar_frase(self, texto):
+        """Registra una frase fija (se divide en chunks como al enviar)"""
+        with self._lock:
+            for chunk in self._dividir(texto):
+                self._frases.setdefault(self._normalizar(chunk), None)
+
+    def registrar_plantilla(self, plantilla):
+        """Registra una plantilla con campos {campo}"""
+        for chunk in self._dividir(plantilla):
+            if not CAMPO.search(chunk):
+                self.registrar_frase(chunk)
+                continue
+
+            chunk = self._normalizar(chunk)
+            segmentos = self._segmentar(chunk)
+            patron = ''.join(
+                f'(?P<{texto}>.+?)' if es_campo else re.escape(texto)
+                for es_campo, texto in self._segmentos_patron(chunk)
+            )
+            with self._lock:
+                self._plantillas.append((re.compile(f'^{patron}$'), segmentos))
+                for tipo, texto, _ in segmentos:
+                    if tipo == "literal":
+                        self._frases.setdefault(texto, None)
+
+    def precargar(self):
+        """Sintetiza todas las frases y tramos fijos registrados que falten"""
+        with self._lock:
+            pendientes = [texto for texto, audio in self._frases.items() if audio is None]
+
+        listas = sum(1 for texto in pendientes if self._frase(texto) is not None)
+
+        print(f"📚 Biblioteca de frases: {listas}/{len(pendientes)} frases pre-renderizadas", flush=True)
+
+    # ============================================
+    # CONSULTA
+    # ============================================
+
+    def obtener(self, texto):
+        """Devuelve el audio mulaw del chunk si está en la biblioteca, o None"""
+        texto = self._normalizar(texto)
+
+        with self._lock:
+            registrada = texto in self._frases
+
+        if registrada:
+            audio = self._frase(texto)
+            if audio is not None:
+                self._contar("hits")
+                return audio
+
+        for patron, segmentos in self._plantillas:
+            coincidencia = patron.match(texto)
+            if coincidencia:
+                audio = self._unir(segmentos, coincidencia.groupdict())
+                if audio is not None:
+                    self._contar("hits_plantilla")
+                    return audio
+                break
+
+        self._contar("misses")
+        return None
+
+    def _contar(self, clave):
+        with self._lock:
+            self.stats[clave] += 1
+
+    def obtener_stats(self):
+        with self._lock:
+            return dict(
+                self.stats,
+                frases=len(self._frases),
+                frases_listas=sum(1 for audio in self._frases.values() if audio is not None),
+                plantillas=len(self._plantillas),
+                valores=len(self._valores),
+                bytes=sum(len(a) for a in self._frases.values() if a) + sum(len(a) for a in self._valores.values()),
+            )
+
+    # ============================================
+    # INTERNOS
+    # ============================================
+
+    @staticmethod
+    def _normalizar(texto):
+        return re.sub(r'\s+', ' ', texto).strip()
+
+    @staticmethod
+    def _segmentos_patron(chunk):
+        """Divide una plantilla en tramos literales y campos, para armar el regex"""
+        pos = 0
+        for m in CAMPO.finditer(chunk):
+            if m.start() > pos:
+                yield False, chunk[pos:m.start()]
+            yield True, m.group(1)
+            pos = m.end()
+        if pos < len(chunk):
+            yield False, chunk[pos:]
+
+    def _segmentar(self, chunk):
+        """
+        Tramos a sintetizar por separado: ("literal", texto, "") o
+        ("campo", nombre, sufijo). La puntuación que sigue a un campo se
+        pega al valor ("{puesto}." se sintetiza como "Desarrollador.")
+        para no pedir audio de un signo suelto.
+        """
+        segmentos = []
+        for es_campo, texto in self._segmentos_patron(chunk):
+            if es_campo:
+                segmentos.append(("campo", texto, ""))
+            elif SOLO_PUNTUACION.match(texto) and segmentos and segmentos[-1][0] == "campo":
+                _, nombre, sufijo = segmentos[-1]
+                segmentos[-1] = ("campo", nombre, sufijo + texto.strip())
+            elif texto.strip():
+                segmentos.append(("literal", texto.strip(), ""))
+        return segmentos
+
+    def _frase(self, texto):
+        """Audio de una frase fija registrada, sintetizándola si hace falta"""
+        with self._lock:
+            audio = self._frases.get(texto)
+        if audio is not None:
+            return audio
+
+        try:
+            audio = self._sintetizar(texto)
+        except Exception as e:
+            self._contar("errores")
+            print(f"⚠️ No se pudo pre-renderizar '{texto[:40]}': {e}", flush=True)
+            return None
+
+        if not audio:
+            return None
+        with self._lock:
+            self._frases[texto] = audio
+        return audio
+
+    def _valor(self, texto):
+        """Audio de un valor de campo (LRU acotado)"""
+        with self._lock:
+            audio = self._valores.get(texto)
+            if audio is not None:
+                self._valores.move_to_end(texto)
+                return audio
+
+        audio = self._sintetizar(texto)
+        if not audio:
+            return None
+
+        with self._lock:
+            self._valores[texto] = audio
+            while len(self._valores) > self.max_valores:
+                self._valores.popitem(last=False)
+        return audio
+
+    def _unir(self, segmentos, campos):
+        partes = []
+        try:
+            for tipo, texto, sufijo in segmentos:
+                if tipo == "campo":
+                    audio = self._valor(campos[texto].strip() + sufijo)
+                else:
+                    audio = self._frase(texto)
+                if audio is None:
+                    return None
+                partes.append(recortar_silencio(audio))
+        except Exception as e:
+            self._contar("errores")
+            print(f"⚠️ Error uniendo plantilla: {e}", flush=True)
+            return None
+
+        return b''.join(partes)
+
+
+def recortar_silencio(audio_mulaw, margen_inicio=MARGEN_INICIO, margen_fin=MARGEN_FIN):
+    """Recorta el silencio al inicio y al final de un audio mulaw, dejando un margen"""
+    muestras = np.frombuffer(audio_mulaw, dtype=np.uint8)
+    # En mulaw la magnitud va invertida en los 7 bits bajos: 0x7F/0xFF es silencio
+    nivel = np.bitwise_and(np.invert(muestras), 0x7F)
+    voz = np.flatnonzero(nivel >= NIVEL_VOZ_MULAW)
+    if voz.size == 0:
+        return audio_mulaw
+
+    inicio = max(0, int(voz[0]) - margen_inicio)
+    fin = min(len(audio_mulaw), int(voz[-1]) + 1 + margen_fin)
+    return audio_mulaw[inicio:fin]
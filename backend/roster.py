@@ -0,0 +1,192 @@
+import csv
+import io
+import os
+import re
+import threading
+import time
+
+# ============================================
+# CONFIGURACIÓN DEL PADRÓN DE EMPLEADOS
+# ============================================
+RUTA_EMPLEADOS = os.getenv('EMPLEADOS_CSV', '/app/data/empleados.csv')
+INTERVALO_REVISION = 1.0  # Segundos entre revisiones del mtime del CSV
+BYTES_FIRMA = 64  # Bytes del final ya leído que deben seguir iguales para leer solo lo agregado
+COLUMNAS_ID = ('id', 'dni')  # Primera columna presente que se usa como ID estable
+
+
+def normalizar_telefono(telefono):
+    """Solo dígitos: '+51 954-622-077' y '51954622077' son el mismo teléfono"""
+    return re.sub(r'\D', '', str(telefono or ''))
+
+
+class _Padron:
+    """Contenido de una lectura completa del CSV: filas como tuplas e índices"""
+    def __init__(self, campos):
+        self.campos = campos
+        self.columna_id = next((campos.index(c) for c in COLUMNAS_ID if c in campos), None)
+        self.columna_telefono = campos.index('telefono') if 'telefono' in campos else None
+        self.filas = []  # tuplas en el orden del CSV
+        self.por_id = {}  # id -> posición en filas
+        self.por_telefono = {}  # teléfono normalizado -> posición en filas
+
+    def agregar(self, valores):
+        fila = tuple(v.strip() for v in valores)
+        if len(fila) != len(self.campos):
+            return
+        id_empleado = fila[self.columna_id] if self.columna_id is not None else str(len(self.filas))
+        if not id_empleado:
+            return
+
+        # Un ID repetido actualiza al empleado en su posición original
+        posicion = self.por_id.get(id_empleado)
+        if posicion is None:
+            posicion = len(self.filas)
+            self.filas.append(fila)
+            self.por_id[id_empleado] = posicion
+        else:
+            anterior = self.filas[posicion]
+            if self.columna_telefono is not None:
+                self.por_telefono.pop(normalizar_telefono(anterior[self.columna_telefono]), None)
+            self.filas[posicion] = fila
+
+        if self.columna_telefono is not None:
+            self.por_telefono[normalizar_telefono(fila[self.columna_telefono])] = posicion
+
+    def empleado(self, posicion):
+        fila = self.filas[posicion]
+        empleado = dict(zip(self.campos, fila))
+        empleado['id'] = fila[self.columna_id] if self.columna_id is not None else str(posicion)
+        return empleado
+
+
+class RegistroEmpleados:
+    """
+    Padrón de empleados en memoria, leído de un CSV:
+    - ID estable por empleado (columna id o dni), no la posición en la lista
+    - Índice por teléfono normalizado
+    - Recarga por mtime: si el archivo solo creció se leen las filas nuevas,
+      si cambió de otra forma se vuelve a leer completo
+    """
+    def __init__(self, ruta=RUTA_EMPLEADOS, intervalo_revision=INTERVALO_REVISION):
+        self.ruta = ruta
+        self.intervalo_revision = intervalo_revision
+
+        self._lock = threading.Lock()
+        self._padron = _Padron([])
+        self._firma_archivo = None  # (mtime_ns, tamaño) de la última lectura
+        self._offset = 0  # bytes ya procesados (hasta el último salto de línea)
+        self._cola = b''  # últimos bytes procesados, para detectar si solo se agregó al final
+        self._ultima_revision = 0.0
+
+        self.stats = {"lecturas_completas": 0, "lecturas_incrementales": 0, "errores": 0}
+        self._revisar(forzar=True)
+
+    # ============================================
+    # CONSULTA
+    # ============================================
+
+    def obtener(self, id_empleado):
+        """Empleado por ID estable, o None"""
+        padron = self._actual()
+        posicion = padron.por_id.get(str(id_empleado).strip())
+        return padron.empleado(posicion) if posicion is not None else None
+
+    def obtener_por_telefono(self, telefono):
+        """Empleado por teléfono (se compara normalizado), o None"""
+        padron = self._actual()
+        posicion = padron.por_telefono.get(normalizar_telefono(telefono))
+        return padron.empleado(posicion) if posicion is not None else None
+
+    def primero(self):
+        padron = self._actual()
+        return padron.empleado(0) if padron.filas else None
+
+    def listar(self, desde=0, limite=100):
+        """Página de empleados en el orden del CSV y el total"""
+        padron = self._actual()
+        total = len(padron.filas)
+        return [padron.empleado(i) for i in range(max(0, desde), min(total, desde + limite))], total
+
+    def filtrar(self, **criterios):
+        """IDs de los empleados cuyos campos coinciden exactamente con los criterios"""
+        padron = self._actual()
+        columnas = [(padron.campos.index(campo), str(valor).strip())
+                    for campo, valor in criterios.items() if campo in padron.campos]
+        if len(columnas) < len(criterios):
+            return []
+        return [id_empleado for id_empleado, posicion in padron.por_id.items()
+                if all(padron.filas[posicion][i] == valor for i, valor in columnas)]
+
+    def __len__(self):
+        return len(self._actual().filas)
+
+    def obtener_stats(self):
+        return dict(self.stats, empleados=len(self._padron.filas), telefonos=len(self._padron.por_telefono))
+
+    # ============================================
+    # RECARGA
+    # ============================================
+
+    def _actual(self):
+        if time.monotonic() - self._ultima_revision >= self.intervalo_revision:
+            self._revisar()
+        return self._padron
+
+    def _revisar(self, forzar=False):
+        with self._lock:
+            self._ultima_revision = time.monotonic()
+            try:
+                estado = os.stat(self.ruta)
+                firma = (estado.st_mtime_ns, estado.st_size)
+                if firma == self._firma_archivo and not forzar:
+                    return
+
+                with open(self.ruta, 'rb') as archivo:
+                    if not forzar and self._solo_crecio(archivo, estado.st_size):
+                        self._leer_agregado(archivo)
+                    else:
+                        self._leer_completo(archivo)
+                self._firma_archivo = firma
+            except Exception as e:
+                self.stats["errores"] += 1
+                print(f"Error cargando empleados: {e}")
+
+    def _solo_crecio(self, archivo, tamano):
+        if not self._offset or tamano <= self._offset:
+            return False
+        archivo.seek(self._offset - len(self._cola))
+        return archivo.read(len(self._cola)) == self._cola
+
+    def _leer_completo(self, archivo):
+        archivo.seek(0)
+        datos = archivo.read()
+        lector = csv.reader(io.StringIO(datos.decode('utf-8-sig'), newline=''))
+
+        padron = _Padron([c.strip() for c in next(lector, [])])
+        for valores in lector:
+            padron.agregar(valores)
+
+        self._padron = padron
+        # Una última línea sin salto se vuelve a leer si el archivo crece (el ID la actualiza)
+        self._avanzar(datos[:datos.rfind(b'\n') + 1], 0)
+        self.stats["lecturas_completas"] += 1
+        print(f"👥 Padrón de empleados: {len(padron.filas)} empleados", flush=True)
+
+    def _leer_agregado(self, archivo):
+        archivo.seek(self._offset)
+        datos = archivo.read()
+        fin = datos.rfind(b'\n') + 1  # Una última línea a medio escribir se lee en la próxima revisión
+        if not fin:
+            return
+
+        antes = len(self._padron.filas)
+        for valores in csv.reader(io.StringIO(datos[:fin].decode('utf-8'), newline='')):
+            self._padron.agregar(valores)
+
+        self._avanzar(datos[:fin], self._offset)
+        self.stats["lecturas_incrementales"] += 1
+        print(f"👥 Padrón de empleados: +{len(self._padron.filas) - antes} empleados", flush=True)
+
+    def _avanzar(self, procesado, offset):
+        self._offset = offset + len(procesado)
+        self._cola = (self._cola + procesado)[-BYTES_FIRMA:] if offset else procesado[-BYTES_FIRMA:]
@@ -0,0 +1,36 @@
+import threading
+
+try:
+    import gevent
+    from gevent import monkey
+except ImportError:  # Servidor de desarrollo sin gevent
+    gevent = None
+
+
+def modo_servidor():
+    """'gevent' si corremos en un worker gevent (threading parcheado), 'hilos' si no"""
+    if gevent is not None and monkey.is_module_patched('threading'):
+        return 'gevent'
+    return 'hilos'
+
+
+def ejecutar_cpu(funcion, *args):
+    """
+    Ejecuta trabajo de CPU pesado fuera del bucle de eventos.
+    Bajo gevent usa el pool de hilos reales del hub: la greenlet que llama
+    espera sin bloquear a las demás (los websockets siguen recibiendo sus
+    frames de 20ms). Con hilos normales se ejecuta directamente.
+    """
+    if modo_servidor() == 'gevent':
+        return gevent.get_hub().threadpool.apply(funcion, args)
+    return funcion(*args)
+
+
+def lock_nativo():
+    """
+    Lock de hilos reales. Con threading parcheado, threading.Lock es un lock
+    de greenlets y no protege nada entre los hilos del pool de ejecutar_cpu.
+    """
+    if gevent is not None:
+        return monkey.get_original('_thread', 'allocate_lock')()
+    return threading.Lock()
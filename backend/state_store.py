@@ -0,0 +1,361 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from serving import ejecutar_cpu, lock_nativo
+
+# ============================================
+# CONFIGURACIÓN DEL ALMACÉN DE ESTADO
+# ============================================
+RUTA_SQLITE = os.getenv('STATE_SQLITE_PATH', '/app/state/conversaciones.db')
+TIMEOUT_SQLITE = 5.0  # Segundos esperando el lock de escritura de otro proceso
+CACHE_LOCAL = os.getenv('STATE_CACHE_LOCAL', '1') == '1'  # Copia por worker de las conversaciones que atiende
+
+
+class Conversacion:
+    """Estado de una llamada en curso (slots: sin dict por instancia)"""
+    __slots__ = ("empleado", "etapa", "identificado", "historial")
+
+    def __init__(self, empleado, etapa="verificacion", identificado=False, historial=None):
+        self.empleado = empleado
+        self.etapa = etapa  # verificacion, bienvenida, preguntas, despedida
+        self.identificado = identificado
+        self.historial = historial if historial is not None else []  # tuplas (rol, contenido)
+
+    def mensajes(self):
+        """Historial en el formato de mensajes de Ollama"""
+        return [{"role": rol, "content": contenido} for rol, contenido in self.historial]
+
+    def a_json(self):
+        return json.dumps([self.empleado, self.etapa, self.identificado, self.historial],
+                          ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def desde_json(cls, datos):
+        empleado, etapa, identificado, historial = json.loads(datos)
+        return cls(empleado, etapa, identificado, [tuple(mensaje) for mensaje in historial])
+
+
+class AlmacenEstado:
+    """
+    Interfaz del almacén de conversaciones por CallSid.
+    Un almacén en red (Redis, etc.) solo tiene que implementar estos métodos;
+    `actualizar` debe ser atómico por llamada (leer, modificar y guardar sin
+    que otro proceso escriba en medio).
+    """
+    nombre = "base"
+    compartido = False  # True si lo ven otros procesos (ver AlmacenCacheado)
+
+    def crear(self, call_sid, conversacion):
+        raise NotImplementedError
+
+    def obtener(self, call_sid):
+        """Conversación de la llamada (solo lectura), o None"""
+        raise NotImplementedError
+
+    def actualizar(self, call_sid, funcion):
+        """Aplica `funcion(conversacion)` de forma atómica; devuelve la conversación o None si no existe"""
+        raise NotImplementedError
+
+    def guardar(self, call_sid, conversacion):
+        """Sobrescribe una conversación que ya existe; False si ya no existe (no la vuelve a crear)"""
+        raise NotImplementedError
+
+    def borrar(self, call_sid):
+        """Borra la conversación; True si existía"""
+        raise NotImplementedError
+
+    def purgar(self, antiguedad):
+        """Borra las conversaciones sin cambios hace más de `antiguedad` segundos; devuelve cuántas"""
+        raise NotImplementedError
+
+    def contar(self):
+        raise NotImplementedError
+
+    def memoria_retenida(self):
+        """Bytes aproximados que ocupan las conversaciones guardadas"""
+        raise NotImplementedError
+
+
+class AlmacenMemoria(AlmacenEstado):
+    """Conversaciones en un dict del proceso: lo más rápido, pero solo sirve con un worker"""
+    nombre = "memoria"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conversaciones = {}  # call_sid -> Conversacion
+        self._actualizadas = {}  # call_sid -> momento del último cambio
+
+    def crear(self, call_sid, conversacion):
+        with self._lock:
+            self._conversaciones[call_sid] = conversacion
+            self._actualizadas[call_sid] = time.time()
+
+    def obtener(self, call_sid):
+        return self._conversaciones.get(call_sid)
+
+    def actualizar(self, call_sid, funcion):
+        with self._lock:
+            conversacion = self._conversaciones.get(call_sid)
+            if conversacion is None:
+                return None
+            funcion(conversacion)
+            self._actualizadas[call_sid] = time.time()
+            return conversacion
+
+    def guardar(self, call_sid, conversacion):
+        with self._lock:
+            if call_sid not in self._conversaciones:
+                return False
+            self._conversaciones[call_sid] = conversacion
+            self._actualizadas[call_sid] = time.time()
+            return True
+
+    def borrar(self, call_sid):
+        with self._lock:
+            self._actualizadas.pop(call_sid, None)
+            return self._conversaciones.pop(call_sid, None) is not None
+
+    def purgar(self, antiguedad):
+        limite = time.time() - antiguedad
+        with self._lock:
+            vencidas = [call_sid for call_sid, momento in self._actualizadas.items() if momento < limite]
+            for call_sid in vencidas:
+                self._conversaciones.pop(call_sid, None)
+                self._actualizadas.pop(call_sid, None)
+        return len(vencidas)
+
+    def contar(self):
+        return len(self._conversaciones)
+
+    def memoria_retenida(self):
+        total = sys.getsizeof(self._conversaciones) + sys.getsizeof(self._actualizadas)
+        for conversacion in list(self._conversaciones.values()):
+            total += sys.getsizeof(conversacion) + sys.getsizeof(conversacion.historial)
+            total += sum(sys.getsizeof(contenido) for _, contenido in conversacion.historial)
+        return total
+
+
+class AlmacenSQLite(AlmacenEstado):
+    """
+    Conversaciones en un archivo SQLite en modo WAL, compartido por todos los
+    workers del nodo. Cada `actualizar` es una transacción BEGIN IMMEDIATE:
+    el lock de escritura se toma antes de leer, así que dos procesos no pisan
+    la misma llamada. Una conexión por proceso, protegida con un lock.
+
+    Cada operación corre con ejecutar_cpu: bajo gevent, la espera del lock
+    (hasta TIMEOUT_SQLITE) y la E/S ocurren en un hilo real y no frenan el
+    bucle de 20ms de las demás llamadas del worker.
+    """
+    nombre = "sqlite"
+    compartido = True
+
+    def __init__(self, ruta=RUTA_SQLITE):
+        self.ruta = ruta
+        if os.path.dirname(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+        self._lock = lock_nativo()
+        self._conexion = sqlite3.connect(ruta, timeout=TIMEOUT_SQLITE, isolation_level=None,
+                                         check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")  # En WAL: durable salvo corte de luz
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS conversaciones ("
+            " call_sid TEXT PRIMARY KEY,"
+            " datos TEXT NOT NULL,"
+            " actualizada REAL NOT NULL)"
+        )
+
+    def crear(self, call_sid, conversacion):
+        return ejecutar_cpu(self._crear, call_sid, conversacion)
+
+    def _crear(self, call_sid, conversacion):
+        with self._lock:
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO conversaciones (call_sid, datos, actualizada) VALUES (?, ?, ?)",
+                (call_sid, conversacion.a_json(), time.time())
+            )
+
+    def obtener(self, call_sid):
+        return ejecutar_cpu(self._obtener, call_sid)
+
+    def _obtener(self, call_sid):
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT datos FROM conversaciones WHERE call_sid = ?", (call_sid,)
+            ).fetchone()
+        return Conversacion.desde_json(fila[0]) if fila else None
+
+    def actualizar(self, call_sid, funcion):
+        return ejecutar_cpu(self._actualizar, call_sid, funcion)
+
+    def _actualizar(self, call_sid, funcion):
+        with self._lock:
+            self._conexion.execute("BEGIN IMMEDIATE")
+            try:
+                fila = self._conexion.execute(
+                    "SELECT datos FROM conversaciones WHERE call_sid = ?", (call_sid,)
+                ).fetchone()
+                if not fila:
+                    self._conexion.execute("COMMIT")
+                    return None
+
+                conversacion = Conversacion.desde_json(fila[0])
+                funcion(conversacion)
+                self._conexion.execute(
+                    "UPDATE conversaciones SET datos = ?, actualizada = ? WHERE call_sid = ?",
+                    (conversacion.a_json(), time.time(), call_sid)
+                )
+                self._conexion.execute("COMMIT")
+                return conversacion
+            except BaseException:
+                self._conexion.execute("ROLLBACK")
+                raise
+
+    def guardar(self, call_sid, conversacion):
+        return ejecutar_cpu(self._guardar, call_sid, conversacion)
+
+    def _guardar(self, call_sid, conversacion):
+        with self._lock:
+            cursor = self._conexion.execute(
+                "UPDATE conversaciones SET datos = ?, actualizada = ? WHERE call_sid = ?",
+                (conversacion.a_json(), time.time(), call_sid)
+            )
+        return cursor.rowcount > 0
+
+    def borrar(self, call_sid):
+        return ejecutar_cpu(self._borrar, call_sid)
+
+    def _borrar(self, call_sid):
+        with self._lock:
+            cursor = self._conexion.execute("DELETE FROM conversaciones WHERE call_sid = ?", (call_sid,))
+        return cursor.rowcount > 0
+
+    def purgar(self, antiguedad):
+        return ejecutar_cpu(self._purgar, antiguedad)
+
+    def _purgar(self, antiguedad):
+        with self._lock:
+            cursor = self._conexion.execute(
+                "DELETE FROM conversaciones WHERE actualizada < ?", (time.time() - antiguedad,)
+            )
+        return cursor.rowcount
+
+    def contar(self):
+        return ejecutar_cpu(self._contar)
+
+    def _contar(self):
+        with self._lock:
+            return self._conexion.execute("SELECT COUNT(*) FROM conversaciones").fetchone()[0]
+
+    def memoria_retenida(self):
+        return ejecutar_cpu(self._memoria_retenida)
+
+    def _memoria_retenida(self):
+        with self._lock:
+            return self._conexion.execute(
+                "SELECT COALESCE(SUM(LENGTH(datos)), 0) FROM conversaciones"
+            ).fetchone()[0]
+
+
+class AlmacenCacheado(AlmacenEstado):
+    """
+    Copia local, por worker, delante de un almacén compartido. Una llamada en
+    curso la atiende un solo worker (el de su websocket de /media), así que su
+    conversación se lee del almacén una vez y después se sirve de memoria; cada
+    cambio se aplica a la copia y se escribe en el almacén (write-through) con
+    un UPDATE, sin volver a leer la fila.
+
+    No se cachea al crear: /iniciar-llamada puede caer en otro worker que nunca
+    va a liberar la llamada. Las copias se descartan al borrar y, como las
+    filas, al purgar por antigüedad.
+    """
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self.nombre = almacen.nombre
+        self.compartido = almacen.compartido
+        self._lock = threading.Lock()
+        self._locales = {}  # call_sid -> Conversacion
+        self._usadas = {}  # call_sid -> momento del último uso
+
+    def crear(self, call_sid, conversacion):
+        self._descartar(call_sid)
+        self.almacen.crear(call_sid, conversacion)
+
+    def obtener(self, call_sid):
+        conversacion = self._locales.get(call_sid)
+        if conversacion is None:
+            conversacion = self.almacen.obtener(call_sid)
+            if conversacion is None:
+                return None
+        with self._lock:
+            conversacion = self._locales.setdefault(call_sid, conversacion)
+            self._usadas[call_sid] = time.time()
+        return conversacion
+
+    def actualizar(self, call_sid, funcion):
+        conversacion = self.obtener(call_sid)
+        if conversacion is None:
+            return None
+        with self._lock:
+            funcion(conversacion)
+        if not self.almacen.guardar(call_sid, conversacion):
+            # Otro worker la borró (Twilio dio la llamada por terminada)
+            self._descartar(call_sid)
+            return None
+        return conversacion
+
+    def guardar(self, call_sid, conversacion):
+        if not self.almacen.guardar(call_sid, conversacion):
+            self._descartar(call_sid)
+            return False
+        with self._lock:
+            self._locales[call_sid] = conversacion
+            self._usadas[call_sid] = time.time()
+        return True
+
+    def borrar(self, call_sid):
+        self._descartar(call_sid)
+        return self.almacen.borrar(call_sid)
+
+    def purgar(self, antiguedad):
+        limite = time.time() - antiguedad
+        with self._lock:
+            for call_sid in [c for c, momento in self._usadas.items() if momento < limite]:
+                self._locales.pop(call_sid, None)
+                self._usadas.pop(call_sid, None)
+        return self.almacen.purgar(antiguedad)
+
+    def contar(self):
+        return self.almacen.contar()
+
+    def memoria_retenida(self):
+        return self.almacen.memoria_retenida()
+
+    def _descartar(self, call_sid):
+        with self._lock:
+            self._locales.pop(call_sid, None)
+            self._usadas.pop(call_sid, None)
+
+
+ALMACENES = {
+    AlmacenMemoria.nombre: AlmacenMemoria,
+    AlmacenSQLite.nombre: AlmacenSQLite,
+}
+
+
+def crear_almacen(nombre="memoria", cache_local=CACHE_LOCAL, **kwargs):
+    """
+    Crea un almacén de estado por nombre ('memoria' o 'sqlite'). Los compartidos
+    entre procesos van detrás de un AlmacenCacheado salvo con cache_local=False.
+    """
+    try:
+        clase = ALMACENES[nombre]
+    except KeyError:
+        raise ValueError(f"Almacén de estado desconocido: {nombre} (disponibles: {', '.join(ALMACENES)})")
+    almacen = clase(**kwargs)
+    return AlmacenCacheado(almacen) if cache_local and almacen.compartido else almacen
@@ -0,0 +1,55 @@
+"""
+Utilidades de las pruebas de humo: levantan procesos reales (gunicorn y los
+dobles de bench/) en puertos libres y los cierran al terminar.
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+DIRECTORIO_BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar(url, proceso, segundos=60):
+    """Espera a que `url` responda; falla si el proceso muere antes"""
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            pytest.fail(f"{proceso.args} terminó al arrancar")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.3)
+    pytest.fail(f"{url} no respondió en {segundos}s")
+
+
+@pytest.fixture
+def lanzar(tmp_path):
+    """lanzar(argumentos, url, **entorno) arranca un proceso desde backend/ y espera a `url`"""
+    procesos = []
+
+    def arrancar(argumentos, url, **entorno):
+        log = open(tmp_path / f"proceso-{len(procesos)}.log", "w")
+        proceso = subprocess.Popen([sys.executable, *argumentos], cwd=DIRECTORIO_BACKEND,
+                                   env=dict(os.environ, **entorno), stdout=log, stderr=subprocess.STDOUT)
+        procesos.append(proceso)
+        esperar(url, proceso)
+        return proceso
+
+    yield arrancar
+
+    for proceso in procesos:
+        proceso.terminate()
+    for proceso in procesos:
+        proceso.wait(timeout=30)
@@ -0,0 +1,70 @@
+"""
+Prueba de humo del marcador de campañas contra bench/twilio_falso.py: nadie
+contesta, así que cada empleado se marca una vez más por reintento. Se
+comprueban el ritmo, el cupo de llamadas simultáneas y los reintentos a partir
+de las llamadas que recibió el doble de Twilio.
+"""
+import time
+
+import requests
+
+from conftest import puerto_libre
+
+EMPLEADOS = ("70000001", "70000002", "70000003")
+LLAMADAS_POR_MINUTO = 240  # Una llamada cada 0.25s
+MAX_SIMULTANEAS = 2
+MAX_REINTENTOS = 1
+DURACION_SIN_RESPUESTA = 1.0  # Lo que tarda twilio_falso en avisar un no-answer
+
+
+def test_campana_respeta_ritmo_cupo_y_reintentos(lanzar, tmp_path):
+    empleados = tmp_path / "empleados.csv"
+    empleados.write_text("nombre,dni,telefono,fecha_inicio,puesto\n" + "".join(
+        f"Empleado {i},{dni},+5190000000{i},15/01/2026,Desarrollador\n" for i, dni in enumerate(EMPLEADOS)
+    ))
+    puerto, puerto_twilio = puerto_libre(), puerto_libre()
+    url_twilio = f"http://127.0.0.1:{puerto_twilio}"
+    url = f"http://127.0.0.1:{puerto}"
+
+    lanzar(["bench/twilio_falso.py", "--puerto", str(puerto_twilio), "--sin-respuesta", "1", "--ocupado", "0"],
+           f"{url_twilio}/llamadas")
+    lanzar(["-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"], f"{url}/stats/llamadas",
+           PORT=str(puerto), TWILIO_API_BASE_URL=url_twilio, WEBHOOK_BASE_URL=url,
+           TWILIO_ACCOUNT_SID="ACsmoke", TWILIO_AUTH_TOKEN="smoke", TWILIO_PHONE_NUMBER="+10000000000",
+           EMPLEADOS_CSV=str(empleados), STATE_SQLITE_PATH=str(tmp_path / "estado.db"),
+           GUNICORN_WORKERS="1", LOG_LEVEL="warning")
+
+    respuesta = requests.post(f"{url}/campanas", json={
+        "empleados": list(EMPLEADOS), "llamadas_por_minuto": LLAMADAS_POR_MINUTO,
+        "max_simultaneas": MAX_SIMULTANEAS, "max_reintentos": MAX_REINTENTOS, "espera_reintento": 0,
+    }, timeout=5)
+    assert respuesta.status_code == 201
+    id_campana = respuesta.json()["id"]
+
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        campana = requests.get(f"{url}/campanas/{id_campana}", timeout=5).json()
+        if campana["estado"] == "terminada":
+            break
+        time.sleep(0.2)
+    assert campana["estado"] == "terminada", campana
+    assert campana["por_estado"] == {"sin_respuesta": len(EMPLEADOS)}
+
+    llamadas = requests.get(f"{url_twilio}/llamadas", timeout=5).json()
+    horas = sorted(llamada["hora"] for llamada in llamadas)
+
+    # Reintentos: cada empleado se marca 1 + MAX_REINTENTOS veces
+    por_numero = {}
+    for llamada in llamadas:
+        por_numero[llamada["to"]] = por_numero.get(llamada["to"], 0) + 1
+    assert sorted(por_numero.values()) == [1 + MAX_REINTENTOS] * len(EMPLEADOS)
+
+    # Ritmo: nunca dos marcados más cerca que 60 / llamadas por minuto (con margen de red)
+    separacion = 60.0 / LLAMADAS_POR_MINUTO
+    assert min(b - a for a, b in zip(horas, horas[1:])) >= separacion * 0.8
+
+    # Cupo: una llamada sin respuesta ocupa su lugar al menos DURACION_SIN_RESPUESTA,
+    # así que al marcar nunca hay MAX_SIMULTANEAS marcadas en ese tiempo
+    for hora in horas:
+        en_curso = sum(1 for otra in horas if hora - DURACION_SIN_RESPUESTA < otra < hora)
+        assert en_curso < MAX_SIMULTANEAS
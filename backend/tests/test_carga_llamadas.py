@@ -0,0 +1,28 @@
+"""
+Prueba de humo de punta a punta: una llamada simulada con bench/carga_llamadas.py
+contra gunicorn y bench/servicios_falsos.py (Whisper, Ollama y TTS). Cada turno
+pasa por el VAD, el endpointing, el ASR incremental, el LLM en streaming y el
+reproductor saliente.
+"""
+import json
+import subprocess
+import sys
+
+from conftest import DIRECTORIO_BACKEND, puerto_libre
+
+TURNOS = 2
+
+
+def test_llamada_simulada_contesta_cada_turno(tmp_path):
+    resultado = tmp_path / "resultado.json"
+    proceso = subprocess.run(
+        [sys.executable, "bench/carga_llamadas.py", "--lanzar", "--llamadas", "1", "--turnos", str(TURNOS),
+         "--puerto", str(puerto_libre()), "--puerto-servicios", str(puerto_libre()), "--guardar", str(resultado)],
+        cwd=DIRECTORIO_BACKEND, capture_output=True, text=True, timeout=180
+    )
+    assert proceso.returncode == 0, proceso.stdout + proceso.stderr
+
+    nivel = json.loads(resultado.read_text())["niveles"][0]
+    assert nivel["turnos"] == TURNOS
+    assert nivel["fallos"] == 0
+    assert nivel["roto"] is None
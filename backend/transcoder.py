@@ -0,0 +1,56 @@
+import miniaudio
+
+from mulaw import pcm_a_mulaw
+
+# ============================================
+# CONFIGURACIÓN DE TRANSCODIFICACIÓN
+# ============================================
+SAMPLE_RATE_SALIDA = 8000  # Twilio usa 8kHz
+FRAME_BYTES = 160  # 20ms de mulaw a 8kHz
+FRAMES_LECTURA = FRAME_BYTES * 5  # 100ms por bloque decodificado (múltiplo de un frame)
+
+
+def mp3_a_mulaw_stream(mp3_bytes, frames_lectura=FRAMES_LECTURA):
+    """
+    Decodifica MP3 en memoria, re-muestrea a 8kHz mono y codifica a mulaw.
+    Es un generador: entrega bloques mulaw mientras el MP3 se sigue
+    decodificando, sin archivos temporales ni procesos externos.
+    """
+    stream = miniaudio.stream_memory(
+        mp3_bytes,
+        output_format=miniaudio.SampleFormat.SIGNED16,
+        nchannels=1,
+        sample_rate=SAMPLE_RATE_SALIDA,
+        frames_to_read=frames_lectura
+    )
+
+    for muestras in stream:
+        # El primer elemento del generador de miniaudio viene vacío
+        if not muestras:
+            continue
+        yield pcm_a_mulaw(muestras)
+
+
+def mp3_a_mulaw(mp3_bytes):
+    """Convierte un MP3 completo a mulaw 8kHz"""
+    return b''.join(mp3_a_mulaw_stream(mp3_bytes))
+
+
+def frames_mulaw(bloques, frame_bytes=FRAME_BYTES):
+    """
+    Re-empaqueta bloques mulaw de cualquier tamaño en frames de
+    frame_bytes (20ms por defecto), guardando el resto entre bloques.
+    Los frames son memoryview sobre el bloque: se cortan sin copiar.
+    """
+    resto = b''
+    for bloque in bloques:
+        if resto:
+            bloque = resto + bloque
+        vista = memoryview(bloque)
+        fin = len(bloque) - len(bloque) % frame_bytes
+        for i in range(0, fin, frame_bytes):
+            yield vista[i:i + frame_bytes]
+        resto = bytes(vista[fin:])
+
+    if resto:
+        yield resto
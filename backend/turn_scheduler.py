@@ -0,0 +1,168 @@
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# ============================================
+# CONFIGURACIÓN DEL PLANIFICADOR DE TURNOS
+# ============================================
+MAX_TRABAJADORES = 32  # Turnos procesándose a la vez en todo el proceso
+MAX_EN_COLA = 64  # Turnos esperando un trabajador; por encima se rechazan
+
+
+class Turno:
+    """Token de cancelación de un turno (LLM + TTS + envío de audio)"""
+    def __init__(self):
+        self.cancelado = threading.Event()
+
+    def cancelar(self):
+        self.cancelado.set()
+
+    @property
+    def activo(self):
+        return not self.cancelado.is_set()
+
+
+class PlanificadorTurnos:
+    """
+    Pool de trabajadores compartido para procesar los turnos de todas las llamadas:
+    - Cola serial por llamada: como mucho un turno en curso por CallSid
+    - Un turno nuevo reemplaza al que esperaba detrás del turno en curso
+    - Límites globales de trabajadores y de turnos en cola
+    - Métricas de profundidad de cola y tiempo de espera
+    """
+    def __init__(self, max_trabajadores=MAX_TRABAJADORES, max_en_cola=MAX_EN_COLA):
+        self.max_trabajadores = max_trabajadores
+        self.max_en_cola = max_en_cola
+        self._executor = ThreadPoolExecutor(max_workers=max_trabajadores, thread_name_prefix='turno')
+
+        self._lock = threading.Lock()
+        self._llamadas = {}  # call_sid -> {"en_curso": bool, "pendiente": trabajo o None}
+        self._en_cola = 0  # enviados al pool y esperando trabajador
+        self._en_curso = 0
+
+        self.stats = {
+            "turnos": 0,
+            "iniciados": 0,
+            "completados": 0,
+            "reemplazados": 0,
+            "rechazados": 0,
+            "descartados": 0,
+            "errores": 0,
+            "espera_total": 0.0,
+            "espera_max": 0.0,
+            "en_cola_max": 0,
+        }
+
+    def enviar(self, call_sid, turno, funcion, *args):
+        """
+        Encola `funcion(*args)` como el turno `turno` de la llamada.
+        Devuelve False si se rechazó por saturación (el turno queda cancelado).
+        """
+        trabajo = [turno, funcion, args, 0.0]
+
+        with self._lock:
+            self.stats["turnos"] += 1
+            estado = self._llamadas.setdefault(call_sid, {"en_curso": False, "pendiente": None})
+
+            # Ya hay un turno en curso: este espera detrás y reemplaza al que esperaba
+            if estado["en_curso"]:
+                anterior = estado["pendiente"]
+                estado["pendiente"] = trabajo
+                if anterior:
+                    anterior[0].cancelar()
+                    self.stats["reemplazados"] += 1
+                return True
+
+            if self._en_cola >= self.max_en_cola:
+                self.stats["rechazados"] += 1
+                turno.cancelar()
+                print(f"🚫 Turno rechazado ({call_sid}): {self._en_cola} turnos en cola", flush=True)
+                return False
+
+            estado["en_curso"] = True
+            self._encolar(trabajo)
+
+        self._executor.submit(self._ejecutar, call_sid, trabajo)
+        return True
+
+    def cerrar_llamada(self, call_sid):
+        """Descarta el turno pendiente de una llamada que terminó"""
+        with self._lock:
+            estado = self._llamadas.pop(call_sid, None)
+            if estado and estado["pendiente"]:
+                estado["pendiente"][0].cancelar()
+                self.stats["descartados"] += 1
+
+    def obtener_stats(self):
+        """Profundidad de cola, ocupación y espera de los turnos"""
+        with self._lock:
+            iniciados = self.stats["iniciados"]
+            return {
+                "max_trabajadores": self.max_trabajadores,
+                "max_en_cola": self.max_en_cola,
+                "en_curso": self._en_curso,
+                "en_cola": self._en_cola,
+                "en_cola_max": self.stats["en_cola_max"],
+                "llamadas": len(self._llamadas),
+                "pendientes": sum(1 for e in self._llamadas.values() if e["pendiente"]),
+                "turnos": self.stats["turnos"],
+                "completados": self.stats["completados"],
+                "reemplazados": self.stats["reemplazados"],
+                "rechazados": self.stats["rechazados"],
+                "descartados": self.stats["descartados"],
+                "errores": self.stats["errores"],
+                "espera_media": round(self.stats["espera_total"] / iniciados, 4) if iniciados else 0.0,
+                "espera_max": round(self.stats["espera_max"], 4),
+            }
+
+    def _encolar(self, trabajo):
+        """Marca el momento en que el trabajo entra al pool (llamar con el lock tomado)"""
+        trabajo[3] = time.perf_counter()
+        self._en_cola += 1
+        self.stats["en_cola_max"] = max(self.stats["en_cola_max"], self._en_cola)
+
+    def _ejecutar(self, call_sid, trabajo):
+        turno, funcion, args, encolado = trabajo
+        espera = time.perf_counter() - encolado
+
+        with self._lock:
+            self._en_cola -= 1
+            self._en_curso += 1
+            self.stats["iniciados"] += 1
+            self.stats["espera_total"] += espera
+            self.stats["espera_max"] = max(self.stats["espera_max"], espera)
+
+        try:
+            if turno.activo:
+                funcion(*args)
+            else:
+                with self._lock:
+                    self.stats["descartados"] += 1
+        except Exception as e:
+            with self._lock:
+                self.stats["errores"] += 1
+            print(f"❌ Error en turno de {call_sid}: {e}", flush=True)
+            traceback.print_exc()
+        finally:
+            siguiente = self._terminar(call_sid)
+            if siguiente:
+                self._executor.submit(self._ejecutar, call_sid, siguiente)
+
+    def _terminar(self, call_sid):
+        """Libera la llamada o devuelve su turno pendiente, que pasa a ejecutarse"""
+        with self._lock:
+            self._en_curso -= 1
+            self.stats["completados"] += 1
+
+            estado = self._llamadas.get(call_sid)
+            if not estado:
+                return None
+
+            siguiente = estado["pendiente"]
+            if siguiente:
+                estado["pendiente"] = None
+                self._encolar(siguiente)
+            else:
+                estado["en_curso"] = False
+            return siguiente
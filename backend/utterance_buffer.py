@@ -0,0 +1,99 @@
+from collections import deque
+
+from endpointing import MAX_FRAMES_TURNO
+from vad import FRAMES_PREROLL
+
+# ============================================
+# CONFIGURACIÓN DEL BUFFER DE TURNO (frames mulaw de 20ms)
+# ============================================
+FRAME_BYTES = 160  # 20ms de mulaw a 8kHz
+SILENCIO_MULAW = b'\xff'  # Relleno de frames incompletos (amplitud cero)
+FRAMES_COLA_SILENCIO = 10  # 200ms de silencio final que se entregan al ASR (no cortar la última palabra)
+
+
+class BufferVoz:
+    """
+    Audio mulaw de un turno en memoria reservada de antemano:
+    - antes de que empiece la voz solo se conservan los últimos frames
+      (anillo de pre-roll, por referencia: el silencio no se copia)
+    - al detectar voz, el pre-roll pasa al comienzo del turno y los frames
+      siguientes se escriben a continuación, hasta `max_frames`
+    - tramo() entrega el audio como memoryview, sin unir ni copiar
+
+    Lo entregado por tramo() puede seguir en uso en otro hilo (ASR), así que
+    hay dos buffers que se alternan: limpiar() pasa al otro si se entregó algo,
+    y solo reserva memoria nueva si ese otro todavía tiene vistas vivas.
+    """
+    def __init__(self, max_frames=MAX_FRAMES_TURNO, frames_preroll=FRAMES_PREROLL, frame_bytes=FRAME_BYTES):
+        self.max_frames = max_frames
+        self.frames_preroll = frames_preroll
+        self.frame_bytes = frame_bytes
+        self._preroll = deque(maxlen=frames_preroll)
+        self._actual = bytearray(max_frames * frame_bytes)
+        self._anterior = None  # Buffer del turno previo (se reserva al primer cambio)
+        self._datos = memoryview(self._actual)
+        self._frames = 0
+        self._entregado = False
+
+    def __len__(self):
+        """Frames del turno (pre-roll incluido)"""
+        return self._frames
+
+    def agregar(self, frame):
+        """Agrega un frame al turno; devuelve False si se alcanzó max_frames"""
+        if self._frames >= self.max_frames:
+            return False
+        if len(frame) != self.frame_bytes:
+            frame = self._ajustar(frame)
+        inicio = self._frames * self.frame_bytes
+        self._datos[inicio:inicio + self.frame_bytes] = frame
+        self._frames += 1
+        return True
+
+    def agregar_preroll(self, frame):
+        """Guarda un frame previo a la voz, descartando el más viejo del anillo"""
+        self._preroll.append(frame)
+
+    def iniciar_voz(self):
+        """Empieza el turno con el pre-roll, en orden cronológico"""
+        self._frames = 0
+        for frame in self._preroll:
+            self.agregar(frame)
+        self._preroll.clear()
+
+    def tramo(self, inicio=0, fin=None):
+        """Audio de los frames [inicio, fin) como memoryview (sin copia)"""
+        fin = self._frames if fin is None else min(fin, self._frames)
+        self._entregado = True
+        return self._datos[inicio * self.frame_bytes:fin * self.frame_bytes]
+
+    def limpiar(self):
+        if self._entregado:
+            # Las vistas entregadas mantienen vivo el buffer aunque se libere la propia
+            self._datos.release()
+            self._actual, self._anterior = self._anterior, self._actual
+            if self._actual is None or _tiene_vistas(self._actual):
+                self._actual = bytearray(self.max_frames * self.frame_bytes)
+            self._datos = memoryview(self._actual)
+            self._entregado = False
+        self._frames = 0
+        self._preroll.clear()
+
+    def _ajustar(self, frame):
+        """Recorta o rellena con silencio un frame que no mide frame_bytes (Twilio siempre manda 20ms)"""
+        return bytes(frame[:self.frame_bytes]).ljust(self.frame_bytes, SILENCIO_MULAW)
+
+
+def _tiene_vistas(buffer):
+    """True si queda algún memoryview (o array de numpy) sobre el bytearray: no se puede redimensionar"""
+    try:
+        buffer.append(0)
+    except BufferError:
+        return True
+    del buffer[-1]
+    return False
+
+
+def frames_a_entregar(frames_turno, silent_chunks, frames_cola=FRAMES_COLA_SILENCIO):
+    """Frames del turno sin el silencio final que hizo cortar, salvo una cola corta"""
+    return frames_turno - max(0, silent_chunks - frames_cola)
@@ -0,0 +1,150 @@
+import numpy as np
+
+from mulaw import TABLA_FLOAT
+
+# ============================================
+# CONFIGURACIÓN DE VAD
+# ============================================
+SAMPLE_RATE = 8000  # Twilio usa 8kHz
+SILENCE_THRESHOLD = 700  # Umbral de RMS para considerar voz
+
+FRAMES_HANGOVER = 8  # 160ms: la decisión de voz se mantiene tras el último frame con voz
+FRAMES_PREROLL = 10  # 200ms de audio previo al inicio de voz que se conserva
+
+
+class MotorVAD:
+    """
+    Motor base de detección de voz con estado entre frames.
+    Las subclases solo deciden si un frame individual tiene voz;
+    el hangover (suavizado de la decisión) se aplica aquí.
+    """
+    nombre = "base"
+
+    def __init__(self, umbral=SILENCE_THRESHOLD, frames_hangover=FRAMES_HANGOVER):
+        self.umbral = umbral
+        self.frames_hangover = frames_hangover
+        self.ultimo_rms = 0.0
+        self._hangover_restante = 0
+
+    def procesar(self, audio_pcm):
+        """
+        Procesa un frame PCM 16-bit y devuelve una tupla (voz_cruda, voz):
+        - voz_cruda: el frame en sí supera los criterios de voz
+        - voz: decisión suavizada con hangover
+        """
+        muestras = np.frombuffer(audio_pcm, dtype='<i2', count=len(audio_pcm) // 2)
+        if muestras.size == 0:
+            self.ultimo_rms = 0.0
+            return False, self._aplicar_hangover(False)
+
+        voz_cruda = self._es_voz(muestras.astype(np.float32))
+        return voz_cruda, self._aplicar_hangover(voz_cruda)
+
+    def procesar_mulaw(self, audio_mulaw):
+        """
+        Como procesar(), pero con el frame mulaw tal como llega de Twilio:
+        cada código se traduce a su muestra float32 con una tabla, sin
+        pasar por PCM 16-bit
+        """
+        if not audio_mulaw:
+            self.ultimo_rms = 0.0
+            return False, self._aplicar_hangover(False)
+
+        voz_cruda = self._es_voz(TABLA_FLOAT.take(np.frombuffer(audio_mulaw, dtype=np.uint8)))
+        return voz_cruda, self._aplicar_hangover(voz_cruda)
+
+    def reset(self):
+        """Reinicia el estado entre turnos"""
+        self.ultimo_rms = 0.0
+        self._hangover_restante = 0
+
+    def _aplicar_hangover(self, voz_cruda):
+        if voz_cruda:
+            self._hangover_restante = self.frames_hangover
+            return True
+        if self._hangover_restante > 0:
+            self._hangover_restante -= 1
+            return True
+        return False
+
+    def _rms(self, x):
+        rms = float(np.sqrt(np.dot(x, x) / x.size))
+        self.ultimo_rms = rms
+        return rms
+
+    def _es_voz(self, x):
+        raise NotImplementedError
+
+
+class MotorVADEnergia(MotorVAD):
+    """VAD por energía (RMS). El más barato en CPU."""
+    nombre = "energia"
+
+    def _es_voz(self, x):
+        return self._rms(x) > self.umbral
+
+
+class MotorVADHibrido(MotorVAD):
+    """
+    VAD híbrido: energía + tasa de cruces por cero + proporción de energía
+    en la banda de voz (150-3400 Hz). Rechaza ruido de línea y chasquidos
+    que superan el umbral de energía, a cambio de una FFT por frame.
+    """
+    nombre = "hibrido"
+
+    BANDA_VOZ_HZ = (150, 3400)
+    MIN_RATIO_BANDA = 0.6  # fracción mínima de energía en la banda de voz
+    MAX_ZCR = 0.45  # tasa máxima de cruces por cero (ruido blanco ≈ 0.5)
+    FACTOR_UMBRAL_DEBIL = 0.5  # voz sonora débil: energía menor pero espectro claro
+
+    def __init__(self, umbral=SILENCE_THRESHOLD, frames_hangover=FRAMES_HANGOVER):
+        super().__init__(umbral, frames_hangover)
+        self._ventanas = {}
+        self._mascaras = {}
+
+    def _es_voz(self, x):
+        rms = self._rms(x)
+        if rms <= self.umbral * self.FACTOR_UMBRAL_DEBIL:
+            return False
+
+        zcr = np.count_nonzero(np.signbit(x[1:]) != np.signbit(x[:-1])) / x.size
+        if zcr > self.MAX_ZCR:
+            return False
+
+        espectro = np.abs(np.fft.rfft(x * self._ventana(x.size))) ** 2
+        total = float(espectro.sum())
+        if total <= 0:
+            return False
+        ratio_banda = float(espectro[self._mascara(x.size)].sum()) / total
+
+        if rms > self.umbral:
+            return ratio_banda >= self.MIN_RATIO_BANDA
+        # Por debajo del umbral solo aceptamos voz sonora muy clara
+        return ratio_banda >= 0.8 and zcr < 0.25
+
+    def _ventana(self, n):
+        if n not in self._ventanas:
+            self._ventanas[n] = np.hanning(n).astype(np.float32)
+        return self._ventanas[n]
+
+    def _mascara(self, n):
+        if n not in self._mascaras:
+            freqs = np.fft.rfftfreq(n, d=1.0 / SAMPLE_RATE)
+            bajo, alto = self.BANDA_VOZ_HZ
+            self._mascaras[n] = (freqs >= bajo) & (freqs <= alto)
+        return self._mascaras[n]
+
+
+MOTORES_VAD = {
+    MotorVADEnergia.nombre: MotorVADEnergia,
+    MotorVADHibrido.nombre: MotorVADHibrido,
+}
+
+
+def crear_motor_vad(nombre="energia", **kwargs):
+    """Crea un motor VAD por nombre ('energia' o 'hibrido')"""
+    try:
+        clase = MOTORES_VAD[nombre]
+    except KeyError:
+        raise ValueError(f"Motor VAD desconocido: {nombre} (disponibles: {', '.join(MOTORES_VAD)})")
+    return clase(**kwargs)
@@ -0,0 +1,339 @@
+import mmap
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+
+# ============================================
+# CONFIGURACIÓN DEL CACHE
+# ============================================
+CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', '/app/cache')
+CACHE_MEMORIA_BYTES = int(os.getenv('AUDIO_CACHE_MEMORIA_MB', '64')) * 1024 * 1024
+CACHE_DISCO_BYTES = int(os.getenv('AUDIO_CACHE_DISCO_MB', '512')) * 1024 * 1024
+SEGMENTO_MAX_BYTES = 16 * 1024 * 1024
+
+# Registro en segmento: magic, largo de la clave, largo del audio, clave, audio
+MAGIC = b'ACR1'
+CABECERA = struct.Struct('<4sHI')
+PATRON_SEGMENTO = re.compile(r'^segmento-(\d{6})\.dat$')
+
+
+class _Vuelo:
+    """Petición en curso para una clave (single-flight)"""
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class CacheAudio:
+    """
+    Cache de audio de dos niveles:
+    - Memoria: LRU con presupuesto en bytes
+    - Disco: segmentos append-only que se leen con mmap y sobreviven a reinicios.
+      Cuando se supera el presupuesto se borra el segmento más antiguo.
+    Las peticiones concurrentes de la misma clave se agrupan en una sola
+    llamada al generador (single-flight).
+
+    `_lock` solo protege índices, contadores y offsets; la escritura y lectura
+    de segmentos se hace fuera de él. Las escrituras se serializan entre sí con
+    `_lock_escritura` (siempre se toma antes que `_lock`).
+    """
+    def __init__(self, directorio=CACHE_DIR, max_bytes_memoria=CACHE_MEMORIA_BYTES,
+                 max_bytes_disco=CACHE_DISCO_BYTES, segmento_max_bytes=SEGMENTO_MAX_BYTES):
+        self.directorio = directorio
+        self.max_bytes_memoria = max_bytes_memoria
+        self.max_bytes_disco = max_bytes_disco
+        self.segmento_max_bytes = segmento_max_bytes
+
+        self._lock = threading.Lock()
+        self._lock_escritura = threading.Lock()  # Un solo escritor en el segmento activo
+        self._memoria = OrderedDict()  # clave -> bytes (orden LRU)
+        self._bytes_memoria = 0
+
+        self._indice = {}  # clave -> (id_segmento, offset, largo)
+        self._segmentos = OrderedDict()  # id_segmento -> tamaño (del más antiguo al más nuevo)
+        self._claves_segmento = {}  # id_segmento -> claves escritas en él (para expulsarlas sin recorrer el índice)
+        self._bytes_disco = 0
+        self._mmaps = {}  # id_segmento -> mmap (solo segmentos cerrados)
+        self._activo = None  # (id_segmento, archivo) donde se escribe
+        self._en_vuelo = {}
+
+        self.stats = {
+            "hits_memoria": 0,
+            "hits_disco": 0,
+            "misses": 0,
+            "coalescidas": 0,
+            "generaciones": 0,  # llamadas reales al generador (Google)
+            "evictions_memoria": 0,
+            "evictions_disco": 0,
+            "errores_disco": 0,
+        }
+
+        self._disco_habilitado = self._abrir_disco()
+
+    # ============================================
+    # API PÚBLICA
+    # ============================================
+
+    def obtener(self, clave):
+        """Devuelve el audio cacheado o None"""
+        with self._lock:
+            audio = self._memoria.get(clave)
+            if audio is not None:
+                self._memoria.move_to_end(clave)
+                self.stats["hits_memoria"] += 1
+                return audio
+            ubicacion = self._indice.get(clave)
+            datos = self._mmaps.get(ubicacion[0]) if ubicacion else None
+
+        audio = self._leer_disco(clave, ubicacion, datos) if ubicacion else None
+
+        with self._lock:
+            if audio is not None:
+                self.stats["hits_disco"] += 1
+                self._guardar_memoria(clave, audio)
+            else:
+                self.stats["misses"] += 1
+        return audio
+
+    def obtener_o_generar(self, clave, generar):
+        """
+        Devuelve el audio de `clave`; si no está cacheado llama a `generar()`.
+        Si otra petición ya está generando la misma clave, espera su resultado
+        en lugar de repetir la llamada a Google.
+        """
+        audio = self.obtener(clave)
+        if audio is not None:
+            return audio, True
+
+        with self._lock:
+            vuelo = self._en_vuelo.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._en_vuelo[clave] = _Vuelo()
+            else:
+                self.stats["coalescidas"] += 1
+
+        if not lider:
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado, True
+
+        try:
+            with self._lock:
+                self.stats["generaciones"] += 1
+            audio = generar()
+            self.guardar(clave, audio)
+            vuelo.resultado = audio
+            return audio, False
+        except Exception as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+            vuelo.listo.set()
+
+    def guardar(self, clave, audio):
+        """Guarda el audio en memoria y en disco"""
+        with self._lock:
+            self._guardar_memoria(clave, audio)
+            escribir = self._disco_habilitado and clave not in self._indice
+        if escribir:
+            self._escribir_disco(clave, audio)
+
+    def obtener_stats(self):
+        """Contadores y tamaños actuales del cache"""
+        with self._lock:
+            consultas = self.stats["hits_memoria"] + self.stats["hits_disco"] + self.stats["misses"]
+            hits = self.stats["hits_memoria"] + self.stats["hits_disco"]
+            return dict(
+                self.stats,
+                hit_rate=round(hits / consultas, 4) if consultas else 0.0,
+                entradas_memoria=len(self._memoria),
+                bytes_memoria=self._bytes_memoria,
+                max_bytes_memoria=self.max_bytes_memoria,
+                entradas_disco=len(self._indice),
+                bytes_disco=self._bytes_disco,
+                max_bytes_disco=self.max_bytes_disco,
+                segmentos_disco=len(self._segmentos),
+                disco_habilitado=self._disco_habilitado,
+            )
+
+    # ============================================
+    # NIVEL MEMORIA (LRU)
+    # ============================================
+
+    def _guardar_memoria(self, clave, audio):
+        if len(audio) > self.max_bytes_memoria:
+            return
+        anterior = self._memoria.pop(clave, None)
+        if anterior is not None:
+            self._bytes_memoria -= len(anterior)
+
+        self._memoria[clave] = audio
+        self._bytes_memoria += len(audio)
+
+        while self._bytes_memoria > self.max_bytes_memoria:
+            _, expulsado = self._memoria.popitem(last=False)
+            self._bytes_memoria -= len(expulsado)
+            self.stats["evictions_memoria"] += 1
+
+    # ============================================
+    # NIVEL DISCO (segmentos + mmap)
+    # ============================================
+
+    def _ruta_segmento(self, id_segmento):
+        return os.path.join(self.directorio, f"segmento-{id_segmento:06d}.dat")
+
+    def _abrir_disco(self):
+        """Reconstruye el índice a partir de los segmentos existentes"""
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            ids = sorted(
+                int(m.group(1))
+                for m in (PATRON_SEGMENTO.match(nombre) for nombre in os.listdir(self.directorio))
+                if m
+            )
+            for id_segmento in ids:
+                self._indexar_segmento(id_segmento)
+
+            siguiente = ids[-1] + 1 if ids else 1
+            self._abrir_segmento_activo(siguiente)
+            print(f"💾 Cache en disco: {len(self._indice)} entradas en {len(ids)} segmentos", flush=True)
+            return True
+        except OSError as e:
+            print(f"⚠️ Cache en disco deshabilitado: {e}", flush=True)
+            return False
+
+    def _indexar_segmento(self, id_segmento):
+        ruta = self._ruta_segmento(id_segmento)
+        tamano = os.path.getsize(ruta)
+        if tamano == 0:
+            os.unlink(ruta)
+            return
+
+        with open(ruta, 'rb') as f:
+            datos = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        claves = []
+        pos = 0
+        while pos + CABECERA.size <= tamano:
+            magic, largo_clave, largo_audio = CABECERA.unpack_from(datos, pos)
+            fin = pos + CABECERA.size + largo_clave + largo_audio
+            if magic != MAGIC or fin > tamano:
+                # Registro incompleto (p. ej. el proceso murió escribiendo): se ignora el resto
+                break
+            inicio_clave = pos + CABECERA.size
+            clave = datos[inicio_clave:inicio_clave + largo_clave].decode()
+            self._indice[clave] = (id_segmento, inicio_clave + largo_clave, largo_audio)
+            claves.append(clave)
+            pos = fin
+
+        self._mmaps[id_segmento] = datos
+        self._segmentos[id_segmento] = tamano
+        self._claves_segmento[id_segmento] = claves
+        self._bytes_disco += tamano
+
+    def _abrir_segmento_activo(self, id_segmento):
+        archivo = open(self._ruta_segmento(id_segmento), 'ab')
+        with self._lock:
+            self._activo = (id_segmento, archivo)
+            self._segmentos[id_segmento] = 0
+            self._claves_segmento[id_segmento] = []
+
+    def _rotar_segmento(self):
+        """Cierra el segmento activo (pasa a leerse por mmap) y abre uno nuevo. Requiere _lock_escritura"""
+        id_segmento, archivo = self._activo
+        archivo.close()
+        if self._segmentos[id_segmento] > 0:
+            with open(self._ruta_segmento(id_segmento), 'rb') as f:
+                datos = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            with self._lock:
+                self._mmaps[id_segmento] = datos
+        self._abrir_segmento_activo(id_segmento + 1)
+
+    def _escribir_disco(self, clave, audio):
+        clave_bytes = clave.encode()
+        registro = CABECERA.pack(MAGIC, len(clave_bytes), len(audio)) + clave_bytes
+
+        with self._lock_escritura:
+            if clave in self._indice:
+                return  # La escribió otro hilo mientras se esperaba el turno
+            id_segmento, archivo = self._activo
+            try:
+                # tell() y no el tamaño contado: una escritura fallida puede haber dejado bytes a medias
+                offset = archivo.tell() + len(registro)
+                archivo.write(registro)
+                archivo.write(audio)
+                archivo.flush()
+            except OSError as e:
+                with self._lock:
+                    self.stats["errores_disco"] += 1
+                print(f"⚠️ Error escribiendo cache en disco: {e}", flush=True)
+                return
+
+            with self._lock:
+                tamano = offset + len(audio)
+                self._bytes_disco += tamano - self._segmentos[id_segmento]
+                self._segmentos[id_segmento] = tamano
+                self._indice[clave] = (id_segmento, offset, len(audio))
+                self._claves_segmento[id_segmento].append(clave)
+                expulsados = self._expulsar_segmentos()
+
+            try:
+                for id_expulsado, datos in expulsados:
+                    if datos is not None:
+                        datos.close()
+                    os.unlink(self._ruta_segmento(id_expulsado))
+                if tamano >= self.segmento_max_bytes:
+                    self._rotar_segmento()
+            except OSError as e:
+                with self._lock:
+                    self.stats["errores_disco"] += 1
+                print(f"⚠️ Error rotando cache en disco: {e}", flush=True)
+
+    def _leer_disco(self, clave, ubicacion, datos):
+        """Lee fuera de _lock: `datos` es el mmap del segmento, o None si es el activo"""
+        id_segmento, offset, largo = ubicacion
+        try:
+            if datos is not None:
+                return datos[offset:offset + largo]
+
+            # Segmento activo: todavía crece, se lee directamente
+            with open(self._ruta_segmento(id_segmento), 'rb') as f:
+                f.seek(offset)
+                return f.read(largo)
+        except (OSError, ValueError) as e:
+            # ValueError: el segmento se expulsó (mmap cerrado) mientras se leía
+            with self._lock:
+                self.stats["errores_disco"] += 1
+                if self._indice.get(clave) == ubicacion:
+                    del self._indice[clave]
+            print(f"⚠️ Error leyendo cache en disco: {e}", flush=True)
+            return None
+
+    def _expulsar_segmentos(self):
+        """
+        Quita del índice los segmentos más antiguos mientras se supere el presupuesto.
+        Requiere _lock; devuelve [(id_segmento, mmap)] para cerrar y borrar fuera de él.
+        """
+        id_activo = self._activo[0]
+        expulsados = []
+        while self._bytes_disco > self.max_bytes_disco:
+            id_segmento = next(iter(self._segmentos))
+            if id_segmento == id_activo:
+                break
+
+            self._bytes_disco -= self._segmentos.pop(id_segmento)
+            expulsados.append((id_segmento, self._mmaps.pop(id_segmento, None)))
+
+            for c in self._claves_segmento.pop(id_segmento):
+                # La clave pudo reescribirse en un segmento más nuevo
+                if self._indice.get(c, (None,))[0] == id_segmento:
+                    del self._indice[c]
+                    self.stats["evictions_disco"] += 1
+        return expulsados
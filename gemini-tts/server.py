@@ -3,6 +3,8 @@ from google.cloud import texttospeech_v1beta1 as texttospeech
 from google.oauth2 import service_account
 import hashlib
 import re
+import struct
+from audio_cache import CacheAudio
 
 app = Flask(__name__)
 
@@ -12,8 +14,17 @@ credentials = service_account.Credentials.from_service_account_file(
 )
 client = texttospeech.TextToSpeechClient(credentials=credentials)
 
-# Cache
-audio_cache = {}
+# Cache (LRU en memoria + segmentos en disco, con single-flight)
+audio_cache = CacheAudio()
+
+# Formatos de salida soportados: encoding de Google, sample rate por defecto, mimetype, sample rates admitidos
+SAMPLE_RATES_PCM = (8000, 16000, 22050, 24000, 44100, 48000)
+FORMATOS_AUDIO = {
+    "mp3": (texttospeech.AudioEncoding.MP3, 24000, "audio/mpeg", SAMPLE_RATES_PCM),
+    "mulaw": (texttospeech.AudioEncoding.MULAW, 8000, "audio/basic", (8000,)),  # listo para Twilio (G.711 siempre es 8kHz)
+    "linear16": (texttospeech.AudioEncoding.LINEAR16, 8000, "audio/L16", SAMPLE_RATES_PCM),
+}
+FORMATO_DEFECTO = "mp3"
 
 print("✅ Servidor de Gemini TTS iniciado", flush=True)
 
@@ -29,61 +40,81 @@ def synthesize():
         if not text:
             return jsonify({"error": "No text provided"}), 400
         
-        print(f"🎤 Generando audio: {text[:50]}...", flush=True)
+        # Formato de salida solicitado (por defecto MP3 24kHz, compatible con clientes antiguos)
+        formato = str(data.get('format', FORMATO_DEFECTO)).lower()
+        if formato not in FORMATOS_AUDIO:
+            return jsonify({"error": f"Formato no soportado: {formato}"}), 400
         
-        # Sanitizar texto (evitar errores de contenido)
-        text = sanitizar_texto(text)
+        audio_encoding, sample_rate, mimetype, sample_rates = FORMATOS_AUDIO[formato]
+        sample_rate = data.get('sample_rate_hertz', sample_rate)
+        if isinstance(sample_rate, str) and sample_rate.isdigit():
+            sample_rate = int(sample_rate)
+        if isinstance(sample_rate, bool) or sample_rate not in sample_rates:
+            return jsonify({"error": f"sample_rate_hertz no soportado para {formato}: {sample_rate}",
+                            "soportados": list(sample_rates)}), 400
+        sample_rate = int(sample_rate)
+        if formato == "linear16":
+            mimetype = f"audio/L16;rate={sample_rate}"
         
-        # Hash para cache
-        text_hash = hashlib.md5(text.encode()).hexdigest()
+        headers = {
+            'Content-Type': mimetype,
+            'X-Audio-Format': formato,
+            'X-Sample-Rate': str(sample_rate)
+        }
         
-        # Verificar cache
-        if text_hash in audio_cache:
-            print(f"📦 Cache", flush=True)
-            return Response(
-                audio_cache[text_hash],
-                mimetype='audio/mpeg',
-                headers={'Content-Type': 'audio/mpeg'}
-            )
-        
-        # ✅ SIN PROMPT - Voz natural de Gemini
-        synthesis_input = texttospeech.SynthesisInput(
-            text=text  # ⬅️ SOLO el texto, SIN prompt
-        )
+        print(f"🎤 Generando audio ({formato} {sample_rate}Hz): {text[:50]}...", flush=True)
         
-        # Configurar voz
-        voice = texttospeech.VoiceSelectionParams(
-            language_code="es-ES",
-            name="Achernar",  
-            model_name="gemini-2.5-flash-tts"
-        )
-        
-        # Audio config
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,
-            sample_rate_hertz=24000,
-            speaking_rate=1.05,  # ⬆️ Ligeramente más rápido
-            pitch=0.0
-        )
+        # Sanitizar texto (evitar errores de contenido)
+        text = sanitizar_texto(text)
         
-        # Sintetizar
-        response = client.synthesize_speech(
-            input=synthesis_input,
-            voice=voice,
-            audio_config=audio_config
-        )
+        # Hash para cache (una entrada por formato)
+        text_hash = hashlib.md5(f"{formato}:{sample_rate}:{text}".encode()).hexdigest()
         
-        audio_data = response.audio_content
+        def generar():
+            # ✅ SIN PROMPT - Voz natural de Gemini
+            synthesis_input = texttospeech.SynthesisInput(
+                text=text  # ⬅️ SOLO el texto, SIN prompt
+            )
+            
+            # Configurar voz
+            voice = texttospeech.VoiceSelectionParams(
+                language_code="es-ES",
+                name="Achernar",  
+                model_name="gemini-2.5-flash-tts"
+            )
+            
+            # Audio config
+            audio_config = texttospeech.AudioConfig(
+                audio_encoding=audio_encoding,
+                sample_rate_hertz=sample_rate,
+                speaking_rate=1.05,  # ⬆️ Ligeramente más rápido
+                pitch=0.0
+            )
+            
+            # Sintetizar
+            response = client.synthesize_speech(
+                input=synthesis_input,
+                voice=voice,
+                audio_config=audio_config
+            )
+            
+            # MULAW y LINEAR16 vienen con cabecera WAV: devolver solo los frames crudos
+            if formato != "mp3":
+                return extraer_frames_wav(response.audio_content)
+            return response.audio_content
         
-        # Cache
-        audio_cache[text_hash] = audio_data
+        # Cache: las peticiones simultáneas del mismo texto comparten una sola llamada a Google
+        audio_data, desde_cache = audio_cache.obtener_o_generar(text_hash, generar)
         
-        print(f"✅ {len(audio_data)} bytes", flush=True)
+        if desde_cache:
+            print(f"📦 Cache", flush=True)
+        else:
+            print(f"✅ {len(audio_data)} bytes", flush=True)
         
         return Response(
             audio_data,
-            mimetype='audio/mpeg',
-            headers={'Content-Type': 'audio/mpeg'}
+            mimetype=mimetype,
+            headers=headers
         )
         
     except Exception as e:
@@ -91,6 +122,27 @@ def synthesize():
         return jsonify({"error": str(e)}), 500
 
 
+def extraer_frames_wav(audio):
+    """
+    Devuelve el contenido del chunk 'data' de un WAV (RIFF).
+    Se parsea a mano porque el módulo wave no soporta mulaw.
+    Si no es un WAV, se devuelve tal cual.
+    """
+    if len(audio) < 12 or audio[:4] != b'RIFF' or audio[8:12] != b'WAVE':
+        return audio
+    
+    pos = 12
+    while pos + 8 <= len(audio):
+        chunk_id = audio[pos:pos + 4]
+        (chunk_size,) = struct.unpack('<I', audio[pos + 4:pos + 8])
+        pos += 8
+        if chunk_id == b'data':
+            return audio[pos:pos + chunk_size]
+        pos += chunk_size + (chunk_size & 1)  # los chunks RIFF se alinean a 2 bytes
+    
+    return audio
+
+
 def sanitizar_texto(text):
     """
     Limpia el texto para evitar errores de 'contenido sensible'.
@@ -110,6 +162,12 @@ def sanitizar_texto(text):
     return text
 
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hits, misses, evictions y tamaño del cache (para dimensionarlo)"""
+    return jsonify(audio_cache.obtener_stats())
+
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({